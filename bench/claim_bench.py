@@ -0,0 +1,73 @@
+"""Claim cost with a deep queue: the in-memory scheduler vs claiming straight from SQLite.
+
+    python bench/claim_bench.py [--queued 100000] [--claims 5000] [--workers 64] [--threads 16]
+
+Queues `queued` single-chunk jobs with mixed priorities, then `threads` threads play
+`workers` workers claiming one job per request, the way /next_job claims. Modes:
+  sqlite   ELARA_SCHEDULER=sqlite: every claim selects and updates in one write transaction
+  memory   ELARA_SCHEDULER=memory: heap pop under a lock, status written behind
+Each mode gets its own fresh database in a temp dir; the queue build is not timed.
+"""
+import argparse, importlib, os, random, sys, tempfile, threading, time, shutil
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "server"))
+
+def load_server(base, mode):
+    os.environ.update(ELARA_DB=os.path.join(base, f"{mode}.db"), ELARA_LOG_DIR=os.path.join(base, "logs"),
+                      ELARA_JOIN_SECRET="bench", ELARA_USER_API_KEY="bench",
+                      ELARA_SCHEDULER=mode)
+    sys.modules.pop("server", None)
+    return importlib.import_module("server")
+
+def claim(server, wid):
+    if server.scheduler.enabled: return server.scheduler.claim(wid, 1)
+    with server.db() as c: return server.claim_jobs(c, wid, 1)
+
+def run(mode, base, a):
+    server = load_server(base, mode); rnd = random.Random(1)
+    t = time.perf_counter()
+    with server.db() as c:
+        x = c.cursor(); ts = server.now(); gid = "bench"
+        x.executemany("""INSERT INTO jobs(status,created,updated,scene,start_frame,end_frame,by_step,frame_total,
+                                          group_id,part_index,part_count,priority,deleted)
+                         VALUES('queued',?,?,'a.ma',?,?,1,10,?,?,?,?,0)""",
+                      [(ts, ts, i * 10 + 1, i * 10 + 10, gid, i + 1, a.queued, rnd.randint(0, 9)) for i in range(a.queued)])
+        server.rollup_rebuild(x); c.commit()
+    server.scheduler.load()
+    workers = [server.register_worker({"join_secret": "bench", "name": f"w{i}"})["worker_id"] for i in range(a.workers)]
+    print(f"{mode}: queued {a.queued} in {time.perf_counter() - t:.1f}s")
+
+    lat, lock, free = [], threading.Lock(), list(workers)
+    left = [a.claims]
+    def work():
+        mine = []
+        while True:
+            with lock:
+                if left[0] <= 0 or not free: break
+                left[0] -= 1; wid = free.pop()
+            t = time.perf_counter(); claim(server, wid); mine.append(time.perf_counter() - t)
+            with lock: free.append(wid)
+        with lock: lat.extend(mine)
+    threads = [threading.Thread(target=work) for _ in range(a.threads)]
+    t = time.perf_counter()
+    for th in threads: th.start()
+    for th in threads: th.join()
+    dt = time.perf_counter() - t
+    lat.sort(); pct = lambda p: lat[min(len(lat) - 1, int(p * len(lat)))] * 1000
+    print(f"{mode:<8}mean {sum(lat) / len(lat) * 1000:6.2f} ms   p50 {pct(.5):6.2f} ms   p99 {pct(.99):7.2f} ms"
+          f"   ({len(lat)} claims in {dt:.1f}s)")
+    server.scheduler.flush(); server.pool.close_all()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--queued", type=int, default=100_000); ap.add_argument("--claims", type=int, default=5000)
+    ap.add_argument("--workers", type=int, default=64); ap.add_argument("--threads", type=int, default=16)
+    a = ap.parse_args()
+    base = tempfile.mkdtemp(prefix="elara-claim-")
+    try:
+        for mode in ("sqlite", "memory"): run(mode, base, a)
+    finally: shutil.rmtree(base, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Connection cost per request: the pooled WAL connections of db() vs opening one per request.
+
+    python bench/db_pool_bench.py [--threads 16] [--requests 20000] [--jobs 2000]
+
+Each request does what /job_update does to the database: worker auth, read the job row,
+update it and commit, run from a thread pool like FastAPI's. Modes:
+  per-request      sqlite3.connect() per request, rollback journal (the server before the pool)
+  per-request+WAL  sqlite3.connect() per request on a WAL database (connection setup alone)
+  pooled           db() as shipped: long-lived pooled connections, WAL, statement cache
+Every mode gets its own fresh database in a temp dir.
+"""
+import argparse, importlib, os, sys, sqlite3, tempfile, threading, time, shutil
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "server"))
+
+def load_server(base, mode):
+    os.environ.update(ELARA_DB=os.path.join(base, f"{mode}.db"), ELARA_LOG_DIR=os.path.join(base, "logs"),
+                      ELARA_JOIN_SECRET="bench", ELARA_USER_API_KEY="bench")
+    sys.modules.pop("server", None)
+    return importlib.import_module("server")
+
+def per_request(server, journal):
+    with server.db() as c: c.execute(f"PRAGMA journal_mode={journal}").fetchone()
+    server.pool.close_all()
+    @contextmanager
+    def db():
+        c = sqlite3.connect(server.DB_PATH, check_same_thread=False); c.row_factory = sqlite3.Row
+        try: yield c
+        finally: c.close()
+    server.db = db   # module functions look db() up at call time
+
+def update(server, jid, done):
+    """The job_update round trip: read the row, write the new progress, commit."""
+    with server.db() as c:
+        x = c.cursor(); x.execute("SELECT status,frame_total,frame_done,error_count FROM jobs WHERE id=?", (jid,)); x.fetchone()
+        x.execute("UPDATE jobs SET status='running', frame_done=?, eta_seconds=?, updated=? WHERE id=?", (done, 60, time.time(), jid))
+        c.commit()
+
+def run(mode, base, a):
+    server = load_server(base, mode)
+    w = server.register_worker({"join_secret": "bench", "name": "bench"})
+    with server.db() as c:
+        x = c.cursor(); ts = server.now()
+        x.executemany("""INSERT INTO jobs(status,created,updated,scene,start_frame,end_frame,by_step,frame_total,worker_id,deleted)
+                         VALUES('running',?,?,'a.ma',1,100,1,100,?,0)""", [(ts, ts, w["worker_id"])] * a.jobs)
+        c.commit(); ids = [r[0] for r in x.execute("SELECT id FROM jobs")]
+    if mode == "per-request": per_request(server, "DELETE")
+    elif mode == "per-request+WAL": per_request(server, "WAL")
+
+    lat, lock, nxt = [], threading.Lock(), iter(range(a.requests))
+    def work():
+        mine = []
+        for i in nxt:
+            t = time.perf_counter()
+            server.worker_from_auth(w["worker_id"], w["api_key"]); update(server, ids[i % len(ids)], i // len(ids) % 100)
+            mine.append(time.perf_counter() - t)
+        with lock: lat.extend(mine)
+    threads = [threading.Thread(target=work) for _ in range(a.threads)]
+    t = time.perf_counter()
+    for th in threads: th.start()
+    for th in threads: th.join()
+    dt = time.perf_counter() - t
+    lat.sort(); pct = lambda p: lat[min(len(lat) - 1, int(p * len(lat)))] * 1000
+    print(f"{mode:<17}{len(lat) / dt:9.0f} req/s   p50 {pct(.5):6.2f} ms   p99 {pct(.99):7.2f} ms")
+    server.pool.close_all()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, default=16); ap.add_argument("--requests", type=int, default=20_000)
+    ap.add_argument("--jobs", type=int, default=2000)
+    a = ap.parse_args()
+    base = tempfile.mkdtemp(prefix="elara-pool-")
+    try:
+        for mode in ("per-request", "per-request+WAL", "pooled"): run(mode, base, a)
+    finally: shutil.rmtree(base, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
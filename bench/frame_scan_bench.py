@@ -0,0 +1,65 @@
+"""Output-tree scan cost: rglob (the original list_done_frames) vs FrameDetector.
+
+    python bench/frame_scan_bench.py [--files 100000] [--aovs 20] [--dir PATH]
+
+Builds a tree of empty image files (aovs dirs x files/aovs frames), then times
+  rglob          full walk + per-file type check, what every poll used to cost
+  first scan     FrameDetector on a cold tree (same walk, builds the directory table)
+  rescan         nothing changed: one stat per directory
+  rescan +1      one new frame in one AOV dir
+  resume         new detector from the JSON scan cache (a resumed job)
+"""
+import argparse, os, sys, tempfile, time, shutil
+from pathlib import Path
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "worker"))
+
+def timed(label, fn, repeat=1):
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter(); out = fn(); dt = time.perf_counter() - t
+        best = dt if best is None else min(best, dt)
+    print(f"{label:<14}{best*1000:10.1f} ms   {len(out)} frames")
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=100_000); ap.add_argument("--aovs", type=int, default=20)
+    ap.add_argument("--dir", default=None, help="build the tree here (default: a temp dir, removed afterwards)")
+    a = ap.parse_args()
+    base = Path(a.dir or tempfile.mkdtemp(prefix="elara-scan-")); root = base / "out"
+    os.environ.setdefault("ELARA_LOG_DIR", str(base / "logs"))
+    import worker
+    per = a.files // a.aovs; end = per
+    if not root.exists():
+        t = time.perf_counter()
+        for d in range(a.aovs):
+            p = root / f"aov_{d:02d}"; p.mkdir(parents=True)
+            for f in range(1, per + 1): (p / f"shot_aov{d:02d}.{f:06d}.exr").touch()
+        print(f"built {a.aovs * per} files in {time.perf_counter() - t:.1f}s under {root}")
+    old = time.time() - 3600   # directories older than the timestamp-granularity guard
+    for d in [root, *root.iterdir()]: os.utime(d, (old, old))
+
+    def rglob():
+        out = set()
+        for f in root.rglob("*"):
+            if f.is_file():
+                fr = worker.frame_of(f.name, 1, end)
+                if fr is not None: out.add(fr)
+        return out
+    cache = base / "scan_cache.json"
+    det = worker.FrameDetector(str(root), 1, end, cache=cache)
+    ref = timed("rglob", rglob, 3)
+    assert timed("first scan", det.scan) == ref
+    det.save(force=True)
+    timed("rescan", det.scan, 5)
+    extra = root / "aov_03" / f"shot_aov03.{end:06d}.exr"; extra.unlink()
+    os.utime(root / "aov_03", (old + 1, old + 1)); det.scan()
+    extra.touch(); os.utime(root / "aov_03", (old + 2, old + 2))
+    timed("rescan +1", det.scan)
+    timed("resume", lambda: worker.FrameDetector(str(root), 1, end, cache=cache).scan(), 3)
+    if not a.dir: shutil.rmtree(base, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
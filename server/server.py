@@ -2,17 +2,35 @@
 # ElaraFarm Server v0.9.6 — SSE live + frame grid + resubmit + split-to-frames
 # Adds Pause/Cancel modes (graceful after-frame and immediate) + returns cancel code 0/1/2 to worker
 
-import os, time, json, sqlite3, secrets, asyncio
+import os, re, math, time, json, zlib, sqlite3, secrets, asyncio, threading, queue, heapq
+from contextlib import contextmanager
 from typing import Optional, Dict, Any, List
 from fastapi import FastAPI, Form, HTTPException, Request
-from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+from collections import deque, OrderedDict
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "elarafarm.db")
+DB_PATH = os.environ.get("ELARA_DB") or os.path.join(os.path.dirname(__file__), "elarafarm.db")
 JOIN_SECRET = os.environ.get("ELARA_JOIN_SECRET", "CHANGE_ME")
 USER_API_KEY = os.environ.get("ELARA_USER_API_KEY", "CHANGE_ME")
 LOG_DIR = os.environ.get("ELARA_LOG_DIR", r"C:\ElaraFarm\worker\logs")
 AUTO_RETRY_DEFAULT = 2
+DB_POOL_SIZE = int(os.environ.get("ELARA_DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.environ.get("ELARA_DB_POOL_TIMEOUT", "30"))
+SCHEDULER_MODE = os.environ.get("ELARA_SCHEDULER", "memory")   # 'sqlite': claim straight from the DB (several server processes)
+WRITE_BEHIND_INTERVAL = float(os.environ.get("ELARA_WRITE_BEHIND_INTERVAL", "0.05"))
+LONG_POLL_MAX = float(os.environ.get("ELARA_LONG_POLL_MAX", "30"))
+LEASE_TIMEOUT = float(os.environ.get("ELARA_LEASE_TIMEOUT", "120"))     # no heartbeat and no update for this long => worker is dead
+REAPER_INTERVAL = float(os.environ.get("ELARA_REAPER_INTERVAL", "15"))
+LEASE_TARGET = float(os.environ.get("ELARA_LEASE_TARGET", "300"))       # seconds of rendering one pool lease should hold
+LEASE_MAX_FRAMES = int(os.environ.get("ELARA_LEASE_MAX_FRAMES", "100"))
+LEASE_FIRST_FRAMES = 1   # before anything is measured, lease small
+SPECULATE = os.environ.get("ELARA_SPECULATE", "1")!="0"                # idle workers duplicate straggling parts
+SPEC_FACTOR = float(os.environ.get("ELARA_SPEC_FACTOR", "2"))           # straggler: ETA >= this x the siblings' median
+SPEC_MIN_SECONDS = float(os.environ.get("ELARA_SPEC_MIN_SECONDS", "120"))   # ...and at least this far from done
+SPEC_GAIN = 0.75   # the copy must be expected to need at most this share of the original's ETA
+SPEC_HANDOVER = 3  # cancel code: stop now, the part's speculative copy renders the rest
 
 app = FastAPI(title="ElaraFarm Server", version="0.9.6")
 app.add_middleware(CORSMiddleware,
@@ -20,75 +38,555 @@ app.add_middleware(CORSMiddleware,
     allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 
 def now(): return time.time()
+
+# ---------------- DB access (pooled, WAL) ----------------
+def _connect():
+    # cached_statements: sqlite3 keeps compiled statements per connection, so a
+    # long-lived pooled connection reuses prepared statements across requests.
+    c = sqlite3.connect(DB_PATH, timeout=DB_POOL_TIMEOUT, check_same_thread=False, cached_statements=256)
+    c.row_factory = sqlite3.Row
+    c.execute("PRAGMA journal_mode=WAL")        # readers no longer block the writer
+    c.execute("PRAGMA synchronous=NORMAL")      # safe with WAL, avoids an fsync per commit
+    c.execute(f"PRAGMA busy_timeout={int(DB_POOL_TIMEOUT*1000)}")
+    c.execute("PRAGMA cache_size=-16384")       # ~16 MB page cache per connection
+    c.execute("PRAGMA mmap_size=268435456")     # 256 MB memory-mapped reads
+    c.execute("PRAGMA temp_store=MEMORY")
+    return c
+
+class DbPool:
+    """Bounded pool of long-lived SQLite connections. Connections are opened lazily
+    up to `size`; callers beyond that wait for a free one (503 after timeout)."""
+    def __init__(self, size:int):
+        self.size=max(1,size); self.idle=queue.LifoQueue(); self.created=0; self.lock=threading.Lock()
+    def acquire(self)->sqlite3.Connection:
+        try: return self.idle.get_nowait()
+        except queue.Empty: pass
+        with self.lock:
+            grow = self.created < self.size
+            if grow: self.created+=1
+        if grow:
+            try: return _connect()
+            except Exception:
+                with self.lock: self.created-=1
+                raise
+        try: return self.idle.get(timeout=DB_POOL_TIMEOUT)
+        except queue.Empty: raise HTTPException(503,"database busy")
+    def release(self, c:sqlite3.Connection):
+        try:
+            if c.in_transaction: c.rollback()   # never hand out a connection holding locks
+        except sqlite3.Error:
+            with self.lock: self.created-=1
+            try: c.close()
+            except: pass
+            return
+        self.idle.put(c)
+    def close_all(self):
+        while True:
+            try: c=self.idle.get_nowait()
+            except queue.Empty: break
+            try: c.close()
+            except: pass
+            with self.lock: self.created-=1
+
+pool=DbPool(DB_POOL_SIZE)
+
+@contextmanager
 def db():
-    c = sqlite3.connect(DB_PATH, check_same_thread=False); c.row_factory = sqlite3.Row; return c
+    """Borrow a pooled connection: `with db() as c: ...`. Uncommitted work is rolled back on exit."""
+    c=pool.acquire()
+    try: yield c
+    finally: pool.release(c)
+
+# ---------------- change versions ----------------
+# One monotonically increasing counter in `meta`. It is bumped inside the writing
+# transaction (the UPDATE takes SQLite's write lock), so versions become visible in
+# commit order and a reader holding version V has seen every change <= V.
+def next_version(x)->int:
+    x.execute("UPDATE meta SET value=value+1 WHERE key='version'")
+    x.execute("SELECT value FROM meta WHERE key='version'"); return int(x.fetchone()["value"])
+
+def meta_get(x, key:str, default:int=0)->int:
+    x.execute("SELECT value FROM meta WHERE key=?", (key,)); r=x.fetchone()
+    return int(r["value"]) if r else default
+
+def meta_set(x, key:str, value:int):
+    x.execute("INSERT INTO meta(key,value) VALUES(?,?) ON CONFLICT(key) DO UPDATE SET value=excluded.value", (key,value))
+
+def add_column(x, table:str, col:str, decl:str):
+    x.execute(f"PRAGMA table_info({table})")
+    if col not in {r["name"] for r in x.fetchall()}: x.execute(f"ALTER TABLE {table} ADD COLUMN {col} {decl}")
+
+def etag_matches(request:Request, etag:str)->bool:
+    inm=request.headers.get("if-none-match") or ""
+    return any(t.strip().removeprefix("W/")==etag for t in inm.split(",")) or inm.strip()=="*"
+
+# ---------------- group rollups ----------------
+# job_groups keeps one row per dashboard line (a chunked group, or 'job-<id>' for a
+# single job) so /jobs_summary never has to scan and regroup the jobs table.
+# Rows that disappear stay behind as tombstones (removed=1) so delta readers see them go.
+GROUP_STATUS_SQL = """CASE WHEN running>0 THEN 'running' WHEN failed>0 THEN 'failed'
+    WHEN done>0 AND done=total THEN 'done' ELSE 'queued' END"""
+# A group's ETA: parts without an estimate of their own (not started yet) are costed at the
+# group's mean seconds per frame; the unfinished work is spread over the running parts, but
+# never finishes before the slowest running part does.
+_PART_ETA_SQL = """IFNULL(eta_seconds,(IFNULL(frame_total,0)-IFNULL(frame_done,0))*
+    (SELECT mean FROM render_stats WHERE scope='group' AND key=jobs.group_id))"""
+GROUP_ETA_SQL = f"""CASE WHEN COUNT(CASE WHEN status IN ('queued','running') THEN {_PART_ETA_SQL} END)=0 THEN NULL ELSE
+    MAX(IFNULL(MAX(CASE WHEN status='running' THEN {_PART_ETA_SQL} END),0),
+        IFNULL(SUM(CASE WHEN status IN ('queued','running') THEN {_PART_ETA_SQL} END),0)/MAX(1,SUM(status='running'))) END"""
+_ROLLUP_GROUPS_SQL = f"""INSERT INTO job_groups(gkey,group_id,single_id,label,scene,renderer,start_frame,end_frame,
+        total,done,failed,running,parts,status,updated,version,removed,eta_seconds)
+    SELECT group_id,group_id,NULL,'group '||group_id,scene,renderer,MIN(start_frame),MAX(end_frame),
+        IFNULL(SUM(frame_total),0),IFNULL(SUM(frame_done),0),IFNULL(SUM(frame_failed),0),IFNULL(SUM(frame_running),0),
+        COUNT(1),'queued',MAX(updated),?,0,{GROUP_ETA_SQL}
+    FROM jobs WHERE deleted=0 AND group_id IS NOT NULL {{where}} GROUP BY group_id"""
+_ROLLUP_SINGLES_SQL = """INSERT INTO job_groups(gkey,group_id,single_id,label,scene,renderer,start_frame,end_frame,
+        total,done,failed,running,parts,status,updated,version,removed,eta_seconds)
+    SELECT 'job-'||id,NULL,id,'job '||id,scene,renderer,start_frame,end_frame,
+        IFNULL(frame_total,0),IFNULL(frame_done,0),IFNULL(frame_failed,0),IFNULL(frame_running,0),1,status,updated,?,0,
+        CASE WHEN status IN ('queued','running') THEN eta_seconds END
+    FROM jobs WHERE deleted=0 AND group_id IS NULL {where}"""
+
+def gkey(group_id, job_id)->str: return group_id or f"job-{job_id}"
+
+def job_gkeys(x, ids)->set:
+    ids=[int(i) for i in ids if i]
+    if not ids: return set()
+    x.execute(f"SELECT id,group_id FROM jobs WHERE id IN ({','.join('?'*len(ids))})", ids)
+    return {gkey(r["group_id"],r["id"]) for r in x.fetchall()}
+
+def rollup_refresh(x, keys):
+    """Recompute the rollup rows for the given group keys from their parts (index lookups only)."""
+    keys={k for k in (keys or ()) if k}
+    if not keys: return
+    v=next_version(x)
+    for k in keys:
+        x.execute("DELETE FROM job_groups WHERE gkey=?", (k,))
+        if k.startswith("job-"): x.execute(_ROLLUP_SINGLES_SQL.format(where="AND id=?"), (v,int(k[4:])))
+        else: x.execute(_ROLLUP_GROUPS_SQL.format(where="AND group_id=?"), (v,k))
+        if x.rowcount<=0:
+            x.execute("INSERT INTO job_groups(gkey,updated,version,removed) VALUES(?,?,?,1)", (k,now(),v)); continue
+        if not k.startswith("job-"): x.execute(f"UPDATE job_groups SET status={GROUP_STATUS_SQL} WHERE gkey=?", (k,))
+
+def rollup_delta(x, group_id:str, d_total:int, d_done:int, d_failed:int, d_running:int, ts:float):
+    """Apply a part's counter change to its group row in O(1); falls back to a refresh if missing."""
+    x.execute("""UPDATE job_groups SET total=total+?, done=done+?, failed=failed+?, running=running+?,
+                 updated=MAX(IFNULL(updated,0),?) WHERE gkey=? AND removed=0""", (d_total,d_done,d_failed,d_running,ts,group_id))
+    if x.rowcount==0: rollup_refresh(x, [group_id]); return
+    x.execute(f"UPDATE job_groups SET status={GROUP_STATUS_SQL}, version=? WHERE gkey=?", (next_version(x),group_id))
+
+def rollup_rebuild(x):
+    """Full rebuild; drops tombstones, so delta readers older than this point get a full snapshot."""
+    v=next_version(x); x.execute("DELETE FROM job_groups")
+    x.execute(_ROLLUP_GROUPS_SQL.format(where=""), (v,)); x.execute(_ROLLUP_SINGLES_SQL.format(where=""), (v,))
+    x.execute(f"UPDATE job_groups SET status={GROUP_STATUS_SQL} WHERE group_id IS NOT NULL")
+    meta_set(x, "rollup_floor", v)
+
+# ---------------- frame state (bitmaps) ----------------
+_NOT_ZERO=re.compile(rb"[^\x00]"); _NOT_FULL=re.compile(rb"[^\xff]")
+FRAME_CHANGES_KEEP = 256   # per-job change records kept for frames_status?since=
+
+class FrameState:
+    """Frame states of one job as three bit planes (done, failed, running) over its
+    step-aligned frames, stored as a single BLOB in job_frame_state. set/test are O(1);
+    listing and missing-frame scans skip whole empty/full bytes at C speed."""
+    PLANES={"done":0,"failed":1,"running":2}
+    def __init__(self, start:int, step:int, count:int, bits:Optional[bytes]=None):
+        self.start=int(start); self.step=max(1,int(step or 1)); self.count=max(0,int(count)); self.nb=(self.count+7)//8
+        self.bits=bytearray(bits) if bits and len(bits)==3*self.nb else bytearray(3*self.nb)
+    @classmethod
+    def for_job(cls, j, bits:Optional[bytes]=None)->"FrameState":
+        s=int(j["start_frame"]); e=int(j["end_frame"]); st=max(1,int(j["by_step"] or 1))
+        return cls(s, st, max(0,(e-s)//st+1), bits)
+    def index(self, frame)->int:
+        try: i,r=divmod(int(frame)-self.start, self.step)
+        except (TypeError,ValueError): return -1
+        return i if r==0 and 0<=i<self.count else -1
+    def frame(self, i:int)->int: return self.start+i*self.step
+    def test(self, status:str, frame)->bool:
+        i=self.index(frame)
+        return i>=0 and bool(self.bits[self.PLANES[status]*self.nb+(i>>3)] & (1<<(i&7)))
+    def set(self, frame, status:str)->bool:
+        """Set one frame to done/failed/running/queued (planes are exclusive). False if out of range."""
+        i=self.index(frame)
+        if i<0: return False
+        b=i>>3; m=1<<(i&7)
+        for name,p in self.PLANES.items():
+            if name==status: self.bits[p*self.nb+b]|=m
+            else: self.bits[p*self.nb+b]&=~m&0xFF
+        return True
+    def plane(self, status:str)->bytes:
+        p=self.PLANES[status]; return bytes(self.bits[p*self.nb:(p+1)*self.nb])
+    def frames(self, status:str)->List[int]:
+        pl=self.plane(status); out=[]
+        for m in _NOT_ZERO.finditer(pl):
+            b=m.start(); v=pl[b]
+            for k in range(8):
+                if v>>k&1 and (b<<3)+k<self.count: out.append(self.frame((b<<3)+k))
+        return out
+    def missing(self, limit:int=0)->List[int]:
+        """Frames not done yet, in order (`limit` stops early)."""
+        pl=self.plane("done"); out=[]
+        for m in _NOT_FULL.finditer(pl):
+            b=m.start(); v=pl[b]
+            for k in range(8):
+                i=(b<<3)+k
+                if i<self.count and not v>>k&1:
+                    out.append(self.frame(i))
+                    if limit and len(out)>=limit: return out
+        return out
+    def first_missing(self)->Optional[int]:
+        m=self.missing(1); return m[0] if m else None
+    def total(self, status:str)->int: return bin(int.from_bytes(self.plane(status),"little")).count("1")
+    def apply(self, spec, status:str)->List[int]:
+        """Set frames given as plain numbers and/or [first,last] ranges (clamped to the job).
+        Returns the frames actually set."""
+        out:List[int]=[]
+        for v in spec or ():
+            if isinstance(v,(list,tuple)):
+                try: a,b=int(v[0]),int(v[-1])
+                except (TypeError,ValueError,IndexError): continue
+                a=max(a,self.start); a+=(-(a-self.start))%self.step; b=min(b,self.frame(self.count-1))
+                for fr in range(a,b+1,self.step): self.set(fr,status); out.append(fr)
+            elif self.set(v,status): out.append(int(v))
+        return out
+    def next_free_run(self, limit:int)->Optional[tuple]:
+        """(first,last) of the first run of frames that are neither done, failed nor running,
+        at most `limit` frames long; None when every frame is taken."""
+        n=self.nb; b=self.bits
+        busy=int.from_bytes(b[:n],"little")|int.from_bytes(b[n:2*n],"little")|int.from_bytes(b[2*n:],"little")
+        free=~busy&((1<<self.count)-1)
+        if not free: return None
+        i=(free&-free).bit_length()-1; f=free>>i
+        run=min(max(1,int(limit)), (f^(f+1)).bit_length()-1)   # trailing ones = length of the free run
+        return self.frame(i), self.frame(i+run-1)
+    def ranges(self, status:str)->List[List[int]]:
+        """[[first,last],...] runs of consecutive (step-aligned) frames."""
+        out:List[List[int]]=[]
+        for fr in self.frames(status):
+            if out and fr==out[-1][1]+self.step: out[-1][1]=fr
+            else: out.append([fr,fr])
+        return out
+
+def load_frames_many(x, ids)->Dict[int,FrameState]:
+    ids=sorted({int(i) for i in ids})
+    if not ids: return {}
+    x.execute(f"""SELECT j.id,j.start_frame,j.end_frame,j.by_step,s.bits FROM jobs j
+                  LEFT JOIN job_frame_state s ON s.job_id=j.id WHERE j.id IN ({','.join('?'*len(ids))})""", ids)
+    return {r["id"]:FrameState.for_job(r, r["bits"]) for r in x.fetchall()}
+
+def load_frames(x, job_id:int)->Optional[FrameState]: return load_frames_many(x, [job_id]).get(int(job_id))
+
+def save_frames_many(x, items, version:int):
+    """Persist bitmaps for [(job_id, state, done, failed), ...] with one executemany per table,
+    recording which frames changed at `version` (for since= readers)."""
+    ts=now()
+    x.executemany("""INSERT INTO job_frame_state(job_id,bits,version,updated) VALUES(?,?,?,?)
+                     ON CONFLICT(job_id) DO UPDATE SET bits=excluded.bits, version=excluded.version, updated=excluded.updated""",
+                  [(jid,bytes(st.bits),version,ts) for jid,st,_,_ in items])
+    changed=[(jid,version,json.dumps({"done":list(d),"failed":list(f)})) for jid,_,d,f in items if d or f]
+    if not changed: return
+    x.executemany("INSERT INTO job_frame_changes(job_id,version,data) VALUES(?,?,?)", changed)
+    for jid,_,_ in changed:
+        x.execute("SELECT version FROM job_frame_changes WHERE job_id=? ORDER BY version DESC LIMIT 1 OFFSET ?", (jid,FRAME_CHANGES_KEEP))
+        r=x.fetchone()
+        if r:
+            x.execute("DELETE FROM job_frame_changes WHERE job_id=? AND version<=?", (jid,r["version"]))
+            x.execute("UPDATE job_frame_state SET floor=? WHERE job_id=?", (r["version"],jid))
+
+def save_frames(x, job_id:int, st:FrameState, version:int, done=(), failed=()):
+    save_frames_many(x, [(job_id,st,done,failed)], version)
+
+def drop_frames(x, where:str, args=()):
+    x.execute(f"DELETE FROM job_frame_state WHERE job_id {where}", args)
+    x.execute(f"DELETE FROM job_frame_changes WHERE job_id {where}", args)
+    x.execute(f"DELETE FROM frame_leases WHERE job_id {where}", args)
+    x.execute(f"DELETE FROM frame_stats WHERE job_id {where}", args)
+    x.execute(f"DELETE FROM render_stats WHERE scope='job' AND CAST(key AS INTEGER) {where}", args)
+    x.execute(f"DELETE FROM log_chunks WHERE job_id {where}", args)
+    x.execute(f"DELETE FROM log_terms WHERE job_id {where}", args)
+
+def migrate_job_frames(x):
+    """One-off move of the legacy one-row-per-frame job_frames table into bitmaps."""
+    x.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='job_frames'")
+    if not x.fetchone(): return
+    x.execute("SELECT DISTINCT job_id FROM job_frames"); ids=[r["job_id"] for r in x.fetchall()]
+    v=next_version(x) if ids else 0
+    for jid in ids:
+        st=load_frames(x, jid)
+        if st is None: continue
+        x.execute("SELECT frame,status FROM job_frames WHERE job_id=?", (jid,))
+        for r in x.fetchall():
+            if r["status"] in ("done","failed"): st.set(r["frame"], r["status"])
+        save_frames(x, jid, st, v)
+    x.execute("DROP TABLE job_frames")
 
 def init_db():
-    c=db();x=c.cursor()
-    x.execute("""CREATE TABLE IF NOT EXISTS workers(
-        id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE, api_key TEXT, last_seen REAL)""")
-    x.execute("""CREATE TABLE IF NOT EXISTS jobs(
-        id INTEGER PRIMARY KEY AUTOINCREMENT, status TEXT, created REAL, updated REAL,
-        scene TEXT, project TEXT, output_dir TEXT,
-        start_frame INTEGER, end_frame INTEGER, by_step INTEGER,
-        camera TEXT, width INTEGER, height INTEGER, renderer TEXT, layer TEXT,
-        worker_id INTEGER, log_tail TEXT,
-        group_id TEXT, part_index INTEGER, part_count INTEGER,
-        frame_total INTEGER DEFAULT 0, frame_done INTEGER DEFAULT 0, frame_failed INTEGER DEFAULT 0, frame_running INTEGER DEFAULT 0,
-        eta_seconds REAL, error_count INTEGER DEFAULT 0, priority INTEGER DEFAULT 0,
-        retries INTEGER DEFAULT 0, max_retries INTEGER DEFAULT 2,
-        cancel_requested INTEGER DEFAULT 0, deleted INTEGER DEFAULT 0
-    )""")
-    x.execute("""CREATE TABLE IF NOT EXISTS job_frames(
-        job_id INTEGER, frame INTEGER, status TEXT, tries INTEGER DEFAULT 0, updated REAL,
-        PRIMARY KEY(job_id,frame))""")
-    x.execute("CREATE INDEX IF NOT EXISTS idx_job_frames_job ON job_frames(job_id)")
-    c.commit(); c.close()
+    with db() as c:
+        x=c.cursor()
+        x.execute("""CREATE TABLE IF NOT EXISTS workers(
+            id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE, api_key TEXT, last_seen REAL)""")
+        x.execute("""CREATE TABLE IF NOT EXISTS jobs(
+            id INTEGER PRIMARY KEY AUTOINCREMENT, status TEXT, created REAL, updated REAL,
+            scene TEXT, project TEXT, output_dir TEXT,
+            start_frame INTEGER, end_frame INTEGER, by_step INTEGER,
+            camera TEXT, width INTEGER, height INTEGER, renderer TEXT, layer TEXT,
+            worker_id INTEGER, log_tail TEXT,
+            group_id TEXT, part_index INTEGER, part_count INTEGER,
+            frame_total INTEGER DEFAULT 0, frame_done INTEGER DEFAULT 0, frame_failed INTEGER DEFAULT 0, frame_running INTEGER DEFAULT 0,
+            eta_seconds REAL, error_count INTEGER DEFAULT 0, priority INTEGER DEFAULT 0,
+            retries INTEGER DEFAULT 0, max_retries INTEGER DEFAULT 2,
+            cancel_requested INTEGER DEFAULT 0, deleted INTEGER DEFAULT 0
+        )""")
+        x.execute("CREATE TABLE IF NOT EXISTS meta(key TEXT PRIMARY KEY, value INTEGER)")
+        x.execute("INSERT OR IGNORE INTO meta(key,value) VALUES('version',0)")
+        x.execute("""CREATE TABLE IF NOT EXISTS job_frame_state(
+            job_id INTEGER PRIMARY KEY, bits BLOB, version INTEGER DEFAULT 0, floor INTEGER DEFAULT 0, updated REAL)""")
+        x.execute("""CREATE TABLE IF NOT EXISTS job_frame_changes(
+            job_id INTEGER, version INTEGER, data TEXT, PRIMARY KEY(job_id,version))""")
+        migrate_job_frames(x)
+        add_column(x, "jobs", "pool", "INTEGER DEFAULT 0")   # 1 = frame pool, handed out as leases
+        add_column(x, "jobs", "frame_seconds", "REAL")      # measured seconds per frame (pool lease sizing)
+        x.execute("""CREATE TABLE IF NOT EXISTS frame_leases(
+            id INTEGER PRIMARY KEY AUTOINCREMENT, job_id INTEGER, worker_id INTEGER,
+            first_frame INTEGER, last_frame INTEGER, frames INTEGER, status TEXT,
+            created REAL, expires REAL, finished REAL)""")
+        x.execute("CREATE INDEX IF NOT EXISTS idx_frame_leases_job ON frame_leases(job_id,first_frame)")
+        x.execute("CREATE INDEX IF NOT EXISTS idx_frame_leases_active ON frame_leases(status,expires)")
+        x.execute("CREATE INDEX IF NOT EXISTS idx_frame_leases_worker ON frame_leases(worker_id,status)")
+        add_column(x, "frame_leases", "spec", "INTEGER DEFAULT 0")   # 1 = speculative copy of a running part
+        add_column(x, "workers", "slots", "INTEGER DEFAULT 1")   # concurrent renders the worker runs
+        x.execute("CREATE INDEX IF NOT EXISTS idx_jobs_worker ON jobs(worker_id,status)")
+        x.execute("DROP INDEX IF EXISTS idx_jobs_queue")
+        x.execute("CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(status,deleted,priority DESC,id)")  # matches the claim ORDER BY
+        x.execute("CREATE INDEX IF NOT EXISTS idx_jobs_group ON jobs(group_id)")
+        x.execute("""CREATE TABLE IF NOT EXISTS job_groups(
+            gkey TEXT PRIMARY KEY, group_id TEXT, single_id INTEGER, label TEXT, scene TEXT, renderer TEXT,
+            start_frame INTEGER, end_frame INTEGER,
+            total INTEGER DEFAULT 0, done INTEGER DEFAULT 0, failed INTEGER DEFAULT 0, running INTEGER DEFAULT 0,
+            parts INTEGER DEFAULT 0, status TEXT, updated REAL)""")
+        add_column(x, "job_groups", "version", "INTEGER DEFAULT 0")
+        add_column(x, "job_groups", "removed", "INTEGER DEFAULT 0")
+        add_column(x, "job_groups", "eta_seconds", "REAL")
+        x.execute("""CREATE TABLE IF NOT EXISTS log_chunks(
+            job_id INTEGER, seq INTEGER, raw_start INTEGER, raw_len INTEGER, file_pos INTEGER, comp_len INTEGER,
+            frame INTEGER, frame_end INTEGER, PRIMARY KEY(job_id,seq))""")
+        x.execute("CREATE TABLE IF NOT EXISTS log_terms(term TEXT, job_id INTEGER, seq INTEGER, PRIMARY KEY(term,job_id,seq)) WITHOUT ROWID")
+        x.execute("CREATE INDEX IF NOT EXISTS idx_log_terms_job ON log_terms(job_id)")
+        x.execute("""CREATE TABLE IF NOT EXISTS frame_stats(
+            job_id INTEGER, frame INTEGER, worker_id INTEGER, seconds REAL, peak_mb REAL, finished REAL,
+            PRIMARY KEY(job_id,frame))""")
+        x.execute("CREATE INDEX IF NOT EXISTS idx_frame_stats_worker ON frame_stats(worker_id,finished)")
+        x.execute("""CREATE TABLE IF NOT EXISTS render_stats(
+            scope TEXT, key TEXT, n INTEGER, mean REAL, m2 REAL, ewma REAL, updated REAL, PRIMARY KEY(scope,key))""")
+        x.execute("CREATE INDEX IF NOT EXISTS idx_job_groups_version ON job_groups(version)")
+        x.execute("CREATE INDEX IF NOT EXISTS idx_job_groups_updated ON job_groups(updated)")
+        x.execute("CREATE INDEX IF NOT EXISTS idx_job_groups_status ON job_groups(status,updated)")
+        rollup_rebuild(x)  # self-heal on startup (and migrate DBs created before job_groups existed)
+        c.commit()
 init_db()
 
 # ---------------- SSE bus ----------------
+FRAME_EVENT_WINDOW = float(os.environ.get("ELARA_FRAME_EVENT_WINDOW", "0.25"))
+EVENT_BUFFER = int(os.environ.get("ELARA_EVENT_BUFFER", "256"))   # events held per client before the oldest are dropped
+EVENT_KEEPALIVE = 15.0
+EVENT_REPLAY = int(os.environ.get("ELARA_EVENT_REPLAY", "4096"))   # recent events kept for Last-Event-ID catch-up
+EVENT_COALESCE = {"job": "job_id", "group": "gkey"}   # event type -> field; a newer event with the same value replaces a pending one
+
+class EventClient:
+    """One /events connection: a bounded buffer of already-serialized SSE frames. Keyed frames
+    (the latest state of one job) overwrite their pending predecessor in place; when the buffer
+    is full the oldest frame is dropped and counted so the client can be told to reload."""
+    def __init__(self, maxlen:int, types=None, topics:Dict[str,set]=None):
+        self.buf:"OrderedDict[Any,str]"=OrderedDict(); self.maxlen=maxlen; self.wake=asyncio.Event(); self.seq=0
+        self.types=types; self.topics=topics or {}
+        self.sent=0; self.dropped=0; self.coalesced=0; self.unreported=0; self.peak=0; self.since=time.time()
+    def wants(self, typ, data)->bool:
+        if self.types is not None and typ not in self.types: return False
+        return not self.topics or any(data.get(k) in vals for k,vals in self.topics.items())
+    def push(self, key, frame:str):
+        if key is not None and key in self.buf: self.buf[key]=frame; self.buf.move_to_end(key); self.coalesced+=1   # keeps ids ascending
+        else:
+            if len(self.buf)>=self.maxlen: self.buf.popitem(last=False); self.dropped+=1; self.unreported+=1
+            if key is None: self.seq+=1; key=("#",self.seq)
+            self.buf[key]=frame; self.peak=max(self.peak, len(self.buf))
+        self.wake.set()
+    async def take(self, timeout:float)->Optional[List[str]]:
+        """Everything pending (waits up to `timeout`; None on timeout)."""
+        if not self.buf:
+            self.wake.clear()
+            try: await asyncio.wait_for(self.wake.wait(), timeout)
+            except asyncio.TimeoutError: return None
+        out=list(self.buf.values()); self.buf.clear(); self.sent+=len(out)
+        if self.unreported: out.insert(0, f"event: dropped\ndata: {self.unreported}\n\n"); self.unreported=0
+        return out
+
 class EventBus:
-    def __init__(self): self.clients=[]; self.lock=asyncio.Lock()
-    async def add(self):
-        q=asyncio.Queue()
-        async with self.lock: self.clients.append(q)
-        return q
-    async def remove(self,q):
-        async with self.lock:
-            if q in self.clients: self.clients.remove(q)
+    """Fan-out to SSE clients. Each event is serialized once and the same frame is handed to
+    every client; publishing never waits on a slow client (see EventClient).
+    Clients may subscribe to topics (jobs, groups, workers): those sit in a topic index and are
+    only visited for events of their topics, and clients without topics get everything.
+    Routing only looks at the event data, so publishers put the job's group_id in it.
+    Every event gets the next sequence number as its SSE id and is kept in a ring of the last
+    EVENT_REPLAY events, so a reconnecting client is replayed exactly what it missed. The
+    sequence starts at the boot time in ms, so ids from before a restart look too old."""
+    KINDS = ("job_id", "group_id", "worker_id")
+    def __init__(self, maxlen:int):
+        self.clients:List[EventClient]=[]; self.wild:List[EventClient]=[]; self.maxlen=maxlen; self.published=0; self.bytes=0
+        self.index:Dict[str,Dict[Any,set]]={k:{} for k in self.KINDS}
+        self.seq=int(time.time()*1000); self.ring:deque=deque(maxlen=EVENT_REPLAY); self.replayed=0; self.resets=0
+    def add(self, types=None, topics:Dict[str,set]=None)->EventClient:
+        cl=EventClient(self.maxlen, types, topics); self.clients.append(cl)
+        if not cl.topics: self.wild.append(cl)
+        for k,vals in cl.topics.items():
+            for v in vals: self.index[k].setdefault(v,set()).add(cl)
+        return cl
+    def remove(self, cl:EventClient):
+        if cl in self.clients: self.clients.remove(cl)
+        if cl in self.wild: self.wild.remove(cl)
+        for k,vals in cl.topics.items():
+            for v in vals:
+                subs=self.index[k].get(v)
+                if subs is not None:
+                    subs.discard(cl)
+                    if not subs: del self.index[k][v]
+    def targets(self, typ, data)->List[EventClient]:
+        out=[cl for cl in self.wild if cl.types is None or typ in cl.types]; seen=set()
+        for k in self.KINDS:
+            if not self.index[k]: continue
+            for cl in self.index[k].get(data.get(k),()):
+                if cl not in seen and (cl.types is None or typ in cl.types): seen.add(cl); out.append(cl)
+        return out
+    @staticmethod
+    def frame(ev:list)->str:
+        if ev[3] is None: ev[3]=f"id: {ev[0]}\nevent: msg\ndata: {json.dumps({'type':ev[1],'data':ev[2]})}\n\n"
+        return ev[3]
     async def publish(self, typ, data):
-        payload=json.dumps({"type":typ,"data":data})
-        async with self.lock:
-            for q in list(self.clients):
-                try: q.put_nowait(payload)
-                except: pass
-bus=EventBus()
+        if not isinstance(data,dict): return
+        self.seq+=1; self.published+=1
+        ev=[self.seq, typ, data, None]; self.ring.append(ev)   # serialized on first use
+        targets=self.targets(typ, data)
+        if not targets: return
+        frame=self.frame(ev); f=EVENT_COALESCE.get(typ); key=(typ, data.get(f)) if f else None
+        self.bytes+=len(frame)
+        for cl in targets: cl.push(key, frame)
+    def replay(self, cl:EventClient, last:int)->Optional[List[str]]:
+        """Frames after `last` that `cl` would have received, or None when the ring no longer
+        reaches back that far (or `last` is not from this server run): the client must resync."""
+        if last>self.seq or (last<self.seq and (not self.ring or self.ring[0][0]>last+1)): self.resets+=1; return None
+        out=[self.frame(ev) for ev in self.ring if ev[0]>last and cl.wants(ev[1], ev[2])]
+        self.replayed+=len(out); self.bytes+=sum(map(len,out))
+        return out
+    def stats(self)->Dict[str,Any]:
+        now=time.time()
+        return {"clients":len(self.clients),"buffer":self.maxlen,"published":self.published,"bytes":self.bytes,
+                "seq":self.seq,"ring":len(self.ring),"replayed":self.replayed,"resets":self.resets,
+                "depth":sum(len(c.buf) for c in self.clients),"dropped":sum(c.dropped for c in self.clients),
+                "coalesced":sum(c.coalesced for c in self.clients),
+                "topics":{k[:-3]+"s":len(v) for k,v in self.index.items()},
+                "per_client":[{"depth":len(c.buf),"peak":c.peak,"sent":c.sent,"dropped":c.dropped,"coalesced":c.coalesced,
+                               "age":round(now-c.since,1),"types":sorted(c.types) if c.types else None,
+                               "topics":{k[:-3]+"s":sorted(map(str,v)) for k,v in c.topics.items()}} for c in self.clients]}
+bus=EventBus(EVENT_BUFFER)
+
+class FrameEventBatcher:
+    """Merges frame updates from all workers over a short window and then publishes one
+    'frame' event per changed job, instead of one event per /frame_update request."""
+    def __init__(self, window:float): self.window=window; self.pending:Dict[int,Dict[str,Any]]={}; self.task=None
+    def add(self, jid:int, done, failed, current_frame=None, group_id=None, worker_id=None):
+        p=self.pending.setdefault(jid, {"done":set(),"failed":set(),"current_frame":None,"group_id":group_id,"worker_id":None})
+        for fr in done: p["done"].add(fr); p["failed"].discard(fr)
+        for fr in failed: p["failed"].add(fr); p["done"].discard(fr)
+        if current_frame is not None: p["current_frame"]=current_frame
+        if worker_id is not None: p["worker_id"]=worker_id
+        if self.task is None: self.task=asyncio.get_running_loop().create_task(self._flush_later())
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        pending, self.pending, self.task = self.pending, {}, None
+        for jid,p in pending.items():
+            await bus.publish("frame", {"job_id":jid,"frames_done":sorted(p["done"]),"frames_failed":sorted(p["failed"]),
+                                        "current_frame":p["current_frame"],"group_id":p["group_id"],"worker_id":p["worker_id"]})
+frame_events=FrameEventBatcher(FRAME_EVENT_WINDOW)
+
+GROUP_FEED_INTERVAL = float(os.environ.get("ELARA_GROUP_FEED_INTERVAL", "0.5"))
+
+class GroupFeed:
+    """Turns job_groups rollup changes, whatever wrote them, into 'group' events carrying the
+    changed summary rows ({"gkey","removed":true} for removed ones), so dashboards patch rows
+    instead of polling /jobs_summary. One version-indexed read per tick serves every viewer;
+    while nobody is connected nothing is read and the next tick catches up. When the change
+    log no longer reaches back a 'group_reset' event tells clients to reload the snapshot."""
+    def __init__(self): self.version:Optional[int]=None
+    def changes(self)->tuple:
+        with db() as c:
+            x=c.cursor(); x.execute("BEGIN")
+            x.execute("SELECT IFNULL(MAX(version),0) AS v FROM job_groups"); ver=x.fetchone()["v"]; floor=meta_get(x,"rollup_floor")
+            if self.version is None: return max(ver,floor), []
+            if ver<=self.version: return self.version, []
+            if self.version<floor: return ver, None
+            x.execute("SELECT * FROM job_groups WHERE version>? ORDER BY version", (self.version,))
+            return ver, [{"gkey":r["gkey"],"group_id":r["group_id"],"version":r["version"],"removed":True} if r["removed"]
+                         else _summary_row(r) for r in x.fetchall()]
+    async def run(self):
+        while True:
+            await asyncio.sleep(GROUP_FEED_INTERVAL)
+            if self.version is not None and not bus.clients: continue
+            try: ver,rows=await run_in_threadpool(self.changes)
+            except Exception as e: print("[server] group feed error:", e); continue
+            if rows is None: await bus.publish("group_reset", {"version":ver})
+            for r in rows or (): await bus.publish("group", r)
+            self.version=ver
+group_feed=GroupFeed()
+
+def _id_set(v:Optional[str], conv=str)->set:
+    out=set()
+    for p in (v or "").split(","):
+        p=p.strip()
+        if p:
+            try: out.add(conv(p))
+            except ValueError: raise HTTPException(400, f"bad id: {p}")
+    return out
 
 @app.get("/events")
-async def events():
+async def events(request:Request, jobs:Optional[str]=None, groups:Optional[str]=None, workers:Optional[str]=None,
+                 types:Optional[str]=None, last_id:Optional[int]=None):
+    """Live job/frame events ('msg' frames of {"type","data"}). A client that fell too far behind
+    gets a 'dropped' event with the number of frames it lost and should reload its view.
+    jobs/groups/workers (comma separated ids) limit the stream to events of any of those,
+    types (e.g. "frame,job") to those event types; without filters everything is sent.
+    Events carry ids: on reconnect (Last-Event-ID, or last_id= taken from the X-Event-Seq of a
+    snapshot) the missed ones are replayed first. If that gap is no longer in the ring a
+    'reset' event is sent instead and the client should reload its snapshot."""
+    hdr=request.headers.get("last-event-id") or ""
+    if hdr.isdigit(): last_id=int(hdr)
+    topics={k:v for k,v in (("job_id",_id_set(jobs,int)),("group_id",_id_set(groups)),("worker_id",_id_set(workers,int))) if v}
+    kinds=_id_set(types) or None
     async def gen():
-        q=await bus.add()
+        cl=bus.add(kinds, topics)
+        backlog=bus.replay(cl, last_id) if last_id is not None else []   # no await in between: nothing missed or sent twice
         try:
-            yield "event: ping\ndata: 1\n\n"
+            yield "retry: 2000\nevent: ping\ndata: 1\n\n"
+            if backlog is None: yield f"event: reset\ndata: {bus.seq}\n\n"
+            for i in range(0, len(backlog or ()), 256): yield "".join(backlog[i:i+256])
             while True:
-                try:
-                    d=await q.get()
-                    yield f"event: msg\ndata: {d}\n\n"
-                except asyncio.CancelledError:
-                    break
-                except:
-                    yield "event: ping\ndata: 1\n\n"
-        finally:
-            await bus.remove(q)
-    return HTMLResponse(gen(), media_type="text/event-stream")
+                out=await cl.take(EVENT_KEEPALIVE)
+                yield "".join(out) if out else ": keepalive\n\n"
+        finally: bus.remove(cl)
+    return StreamingResponse(gen(), media_type="text/event-stream", headers={"Cache-Control":"no-cache"})
+
+@app.get("/events_stats")
+def events_stats():
+    """Event bus health: connected clients, buffered depth, drops and coalesced updates."""
+    return bus.stats()
 
 def require_user_api_key(k:str):
     if not k or k!=USER_API_KEY: raise HTTPException(401,"Invalid USER_API_KEY")
 
 def worker_from_auth(worker_id:int, api_key:str):
-    c=db();x=c.cursor();x.execute("SELECT 1 FROM workers WHERE id=? AND api_key=?", (worker_id,api_key))
-    if not x.fetchone(): c.close(); raise HTTPException(401,"Invalid worker auth")
-    c.close()
+    with db() as c:
+        x=c.cursor();x.execute("SELECT 1 FROM workers WHERE id=? AND api_key=?", (worker_id,api_key))
+        ok=x.fetchone()
+    if not ok: raise HTTPException(401,"Invalid worker auth")
 
 # ---------------- UI ----------------
 @app.get("/", response_class=HTMLResponse)
@@ -115,10 +613,8 @@ table{border-collapse:collapse;width:100%} th,td{border:1px solid var(--br);padd
 .btn-sm{padding:4px 8px;font-size:11px;border-radius:5px}
 .subrow td{background:#fcfcfc}
 .gridwrap{padding:8px 0}
-.framegrid{display:grid;grid-auto-rows:12px;gap:2px}
-.frame{width:12px;height:12px;border:1px solid #ddd;background:#f0f0f0;cursor:pointer}
-.frame.q{background:#eee} .frame.r{background:#f6c445} .frame.d{background:#21bf73} .frame.f{background:#e55353}
-.frame.sel{outline:2px solid #2c7be5}
+.gridscroll{max-height:360px;overflow:auto}
+.gridscroll canvas{position:sticky;top:0;display:block;cursor:pointer;user-select:none}
 .toolbar{display:flex;gap:8px;align-items:center;margin:6px 0}
 .mono{font-family:Consolas,monospace}
 .hide{display:none}
@@ -156,6 +652,7 @@ pre.log{white-space:pre-wrap;border:1px solid #ddd;padding:10px;border-radius:6p
       <div><label>End frame</label><input type="number" id="end_frame" name="end_frame" value="1010"></div>
       <div><label>By step</label><input type="number" id="by_step" name="by_step" value="1"></div>
       <div><label>Chunk size (0 = none)</label><input type="number" id="chunk_size" name="chunk_size" value="0"></div>
+      <div><label>Frame pool</label><label style="display:flex;align-items:center;gap:6px"><input type="checkbox" id="dynamic" name="dynamic" value="1"> Dynamic leasing (ignores chunk size)</label></div>
     </div>
     <div style="display:flex;gap:12px;flex-wrap:wrap;margin-top:6px">
       <div><label>Width</label><input type="number" id="width" name="width" value="1920"></div>
@@ -173,11 +670,22 @@ pre.log{white-space:pre-wrap;border:1px solid #ddd;padding:10px;border-radius:6p
 <h3>Jobs</h3>
 <div id="jobs"></div>
 
+<h3>Workers</h3>
+<div id="workers"></div>
+
+<h3>Log search</h3>
+<form class="toolbar" onsubmit="searchLogs();return false;">
+  <input type="text" id="logq" placeholder="words from error/warning lines, optionally frame:&lt;n&gt;, e.g. missing texture" style="max-width:520px">
+  <button class="btn btn-ghost btn-sm" type="submit">Search</button>
+</form>
+<div id="logresults"></div>
+
 <!-- Log modal -->
 <dialog id="logdlg">
   <div class="modal-h" id="logtitle">Log</div>
   <div class="modal-b"><pre class="log" id="logtext"></pre></div>
   <div class="modal-f">
+    <button class="btn btn-ghost btn-sm" id="logolder">Older</button>
     <button class="btn btn-ghost btn-sm" id="logrefresh">Refresh</button>
     <button class="btn btn-danger btn-sm" onclick="document.getElementById('logdlg').close()">Close</button>
   </div>
@@ -206,14 +714,97 @@ document.getElementById('jobform').addEventListener('submit', saveForm); loadFor
 function toast(msg){const t=document.getElementById('toast');t.textContent=msg;t.classList.add('show');setTimeout(()=>t.classList.remove('show'),1800);}
 function modalConfirm(message, onok){const d=document.getElementById('confdlg');document.getElementById('confmsg').textContent=message;const ok=document.getElementById('confok');ok.onclick=()=>{d.close();onok&&onok();};d.showModal();}
 
-async function doPost(url, body){const opts=body?{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify(body)}:{method:'POST'};await fetch(url,opts);setTimeout(loadSummary,200);}
+async function doPost(url, body){const opts=body?{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify(body)}:{method:'POST'};await fetch(url,opts);syncSummary();}
 function actConfirm(url,msg,body){modalConfirm(msg,()=>doPost(url,body));}
 
+// Client-side copy of /jobs_summary: a snapshot, then 'group' events from /events patch single
+// rows in place; ?since= deltas after actions and as a rare consistency check (or every 5 s
+// while the stream is down).
+const summary={rows:new Map(), version:null, seq:null, es:null, synced:0};
+const SUMMARY_CHECK=60000;
+const HEAD=`<tr><th>Group / Job</th><th>Status</th><th>Scene</th><th>Frames</th><th>Renderer</th><th>Progress</th><th>Actions</th><th class="right">Updated</th></tr>`;
+
+function rowHtml(g){
+  const donePct=((g.done+g.failed)/Math.max(1,g.total))*100|0;
+  const runPct=((g.running)/Math.max(1,g.total))*100|0;
+  const gid=g.gkey;
+  const act = g.group_id
+   ? `<div style="display:flex;gap:6px;flex-wrap:wrap">
+        <button class="btn btn-ghost btn-sm" onclick="toggleParts('${gid}')">Expand</button>
+        <button class="btn btn-ghost btn-sm" onclick="doPost('/action/retry_failed_group?gid=${gid}')">Retry failed</button>
+        <button class="btn btn-ghost btn-sm" onclick="actConfirm('/action/cancel_group?gid=${gid}','Cancel all parts?')">Cancel group</button>
+        <button class="btn btn-danger btn-sm" onclick="actConfirm('/action/delete_group?gid=${gid}','Delete group?')">Delete group</button>
+      </div>`
+   : `<div style="display:flex;gap:6px;flex-wrap:wrap">
+        <button class="btn btn-ghost btn-sm" onclick="openFrames(${g.single_id})">Frames</button>
+        <button class="btn btn-ghost btn-sm" onclick="openLog(${g.single_id})">Log</button>
+        <button class="btn btn-ghost btn-sm" onclick="doPost('/action/retry_job?id=${g.single_id}')">Retry</button>
+
+        <!-- Pause = immediate stop -->
+        <button class="btn btn-ghost btn-sm" title="Pause immediately (stop now)"
+                onclick="doPost('/action/pause_job?id=${g.single_id}&mode=immediate')">Pause</button>
+
+        <!-- NIMBY = finish current frame then stop -->
+        <button class="btn btn-ghost btn-sm" title="Finish current frame then stop"
+                onclick="doPost('/action/pause_job?id=${g.single_id}&mode=graceful')">NIMBY</button>
+
+        <button class="btn btn-ghost btn-sm" onclick="doPost('/action/resume_job?id=${g.single_id}')">Resume</button>
+
+        <button class="btn btn-danger btn-sm"
+                onclick="actConfirm('/action/cancel_job?id=${g.single_id}&mode=now','Cancel NOW?')">Cancel</button>
+
+        <button class="btn btn-danger btn-sm" onclick="actConfirm('/action/delete_job?id=${g.single_id}','Delete job?')">Delete</button>
+      </div>`;
+  return `
+    <tr id="g-${gid}">
+      <td>${g.label}</td>
+      <td class="status ${(g.status||'').toLowerCase()}">${g.status||""}</td>
+      <td class="mono">${g.scene||""}</td>
+      <td>${g.frames||""}</td>
+      <td>${g.renderer||""}</td>
+      <td>
+        <div class="bar"><div class="done" style="width:${donePct}%"></div><div class="running" style="width:${runPct}%"></div></div>
+        <div class="small">done:${g.done} / fail:${g.failed} / total:${g.total} • parts:${g.parts}${g.eta_seconds!=null?` • eta ${fmtEta(g.eta_seconds)}`:''}</div>
+      </td>
+      <td>${act}</td>
+      <td class="right">${g.updated?new Date(g.updated*1000).toLocaleString():""}</td>
+    </tr>`;
+}
+function partsRow(gid){ return `<tr id="parts-${gid}" class="subrow hide"><td colspan="8"><div id="partsbox-${gid}">Loading...</div></td></tr>`; }
+
+function renderSummary(){
+  const list=[...summary.rows.values()].sort((a,b)=>(b.updated||0)-(a.updated||0));
+  const rows = list.length ? list.map(g=>rowHtml(g)+partsRow(g.gkey)).join("") : `<tr><td colspan="8"><i>No jobs</i></td></tr>`;
+  document.getElementById('jobs').innerHTML = `
+    <div class="small"><b>Purge:</b>
+      <a class="btn btn-ghost btn-sm" href="#" onclick="doPost('/purge_finished?days=7');return false;">Finished &gt; 7 days</a>
+      <a class="btn btn-ghost btn-sm" href="#" onclick="doPost('/purge_finished?days=30');return false;">Finished &gt; 30 days</a>
+      <a class="btn btn-ghost btn-sm" href="#" onclick="doPost('/purge_deleted');return false;">Purge Deleted</a>
+    </div>
+    <table id="jobtable">${HEAD}${rows}</table>`;
+}
+
+function patchRow(g){
+  const tr=document.getElementById('g-'+g.gkey);
+  if(g.removed){
+    if(!summary.rows.delete(g.gkey)) return;
+    if(tr){ tr.remove(); const p=document.getElementById('parts-'+g.gkey); if(p) p.remove(); }
+    if(!summary.rows.size) renderSummary();
+    return;
+  }
+  const old=summary.rows.get(g.gkey); if(old && old.version>g.version) return;
+  summary.rows.set(g.gkey, g);
+  const t=document.getElementById('jobtable');
+  if(tr) tr.outerHTML=rowHtml(g);
+  else if(!t || summary.rows.size===1) renderSummary();
+  else t.rows[0].insertAdjacentHTML('afterend', rowHtml(g)+partsRow(g.gkey));   // new rows go on top
+}
+
 async function loadSummary(){
   const box = document.getElementById('jobs');
-  let data = [];
+  let data = [], r;
   try {
-    const r = await fetch('/jobs_summary', {cache:'no-store'});
+    r = await fetch('/jobs_summary', {cache:'no-cache'});  // revalidates via ETag
     if (!r.ok) throw new Error('HTTP ' + r.status);
     data = await r.json();
   } catch (err) {
@@ -221,74 +812,38 @@ async function loadSummary(){
     box.innerHTML = `
       <div class="small" style="color:#c00">Jobs failed to load: ${String(err)}</div>
       <table>
-        <tr><th>Group / Job</th><th>Status</th><th>Scene</th><th>Frames</th><th>Renderer</th><th>Progress</th><th>Actions</th><th class="right">Updated</th></tr>
+        ${HEAD}
         <tr><td colspan="8"><i>No data</i></td></tr>
       </table>`;
     return;
   }
+  const rows=new Map();
+  for(const g of data||[]){ const cur=summary.rows.get(g.gkey); rows.set(g.gkey, cur&&cur.version>g.version?cur:g); }   // keep rows pushed while fetching
+  summary.rows=rows; summary.version=+r.headers.get('X-Version'); summary.seq=r.headers.get('X-Event-Seq'); summary.synced=Date.now();
+  renderSummary(); summaryStream();
+}
 
-  const rows = (data && data.length)
-    ? data.map(g=>{
-        const donePct=((g.done+g.failed)/Math.max(1,g.total))*100|0;
-        const runPct=((g.running)/Math.max(1,g.total))*100|0;
-        const gid=g.group_id||("job-"+g.single_id);
-        const act = g.group_id
-         ? `<div style="display:flex;gap:6px;flex-wrap:wrap">
-              <button class="btn btn-ghost btn-sm" onclick="toggleParts('${gid}')">Expand</button>
-              <button class="btn btn-ghost btn-sm" onclick="doPost('/action/retry_failed_group?gid=${gid}')">Retry failed</button>
-              <button class="btn btn-ghost btn-sm" onclick="actConfirm('/action/cancel_group?gid=${gid}','Cancel all parts?')">Cancel group</button>
-              <button class="btn btn-danger btn-sm" onclick="actConfirm('/action/delete_group?gid=${gid}','Delete group?')">Delete group</button>
-            </div>`
-         : `<div style="display:flex;gap:6px;flex-wrap:wrap">
-              <button class="btn btn-ghost btn-sm" onclick="openFrames(${g.single_id})">Frames</button>
-              <button class="btn btn-ghost btn-sm" onclick="openLog(${g.single_id})">Log</button>
-              <button class="btn btn-ghost btn-sm" onclick="doPost('/action/retry_job?id=${g.single_id}')">Retry</button>
-
-              <!-- Pause = immediate stop -->
-              <button class="btn btn-ghost btn-sm" title="Pause immediately (stop now)"
-                      onclick="doPost('/action/pause_job?id=${g.single_id}&mode=immediate')">Pause</button>
-
-              <!-- NIMBY = finish current frame then stop -->
-              <button class="btn btn-ghost btn-sm" title="Finish current frame then stop"
-                      onclick="doPost('/action/pause_job?id=${g.single_id}&mode=graceful')">NIMBY</button>
-
-              <button class="btn btn-ghost btn-sm" onclick="doPost('/action/resume_job?id=${g.single_id}')">Resume</button>
-
-              <button class="btn btn-danger btn-sm"
-                      onclick="actConfirm('/action/cancel_job?id=${g.single_id}&mode=now','Cancel NOW?')">Cancel</button>
-
-              <button class="btn btn-danger btn-sm" onclick="actConfirm('/action/delete_job?id=${g.single_id}','Delete job?')">Delete</button>
-            </div>`;
-        return `
-          <tr>
-            <td>${g.label}</td>
-            <td class="status ${(g.status||'').toLowerCase()}">${g.status||""}</td>
-            <td class="mono">${g.scene||""}</td>
-            <td>${g.frames||""}</td>
-            <td>${g.renderer||""}</td>
-            <td>
-              <div class="bar"><div class="done" style="width:${donePct}%"></div><div class="running" style="width:${runPct}%"></div></div>
-              <div class="small">done:${g.done} / fail:${g.failed} / total:${g.total} • parts:${g.parts}</div>
-            </td>
-            <td>${act}</td>
-            <td class="right">${g.updated?new Date(g.updated*1000).toLocaleString():""}</td>
-          </tr>
-          <tr id="parts-${gid}" class="subrow hide"><td colspan="8"><div id="partsbox-${gid}">Loading...</div></td></tr>`;
-      }).join("")
-    : `<tr><td colspan="8"><i>No jobs</i></td></tr>`;
-
-  box.innerHTML = `
-    <div class="small"><b>Purge:</b>
-      <a class="btn btn-ghost btn-sm" href="#" onclick="doPost('/purge_finished?days=7');return false;">Finished &gt; 7 days</a>
-      <a class="btn btn-ghost btn-sm" href="#" onclick="doPost('/purge_finished?days=30');return false;">Finished &gt; 30 days</a>
-      <a class="btn btn-ghost btn-sm" href="#" onclick="doPost('/purge_deleted');return false;">Purge Deleted</a>
-    </div>
-    <table>
-      <tr><th>Group / Job</th><th>Status</th><th>Scene</th><th>Frames</th><th>Renderer</th><th>Progress</th><th>Actions</th><th class="right">Updated</th></tr>
-      ${rows}
-    </table>`;
+async function syncSummary(){
+  if(summary.version===null) return loadSummary();
+  try{
+    const r=await fetch('/jobs_summary?since='+summary.version, {cache:'no-cache'}); if(!r.ok) return;
+    const d=await r.json();
+    if(d.full) return loadSummary();
+    for(const k of d.removed) patchRow({gkey:k, removed:true});
+    for(const g of d.rows) patchRow(g);
+    summary.version=d.version; summary.synced=Date.now();
+  }catch(err){}
+}
+
+function summaryStream(){
+  if(summary.es) return;
+  const es=summary.es=new EventSource('/events?types=group,group_reset'+(summary.seq?`&last_id=${summary.seq}`:''));
+  es.addEventListener('msg', (e)=>{ try{ const m=JSON.parse(e.data); if(m.type==='group') patchRow(m.data); else if(m.type==='group_reset') loadSummary(); }catch(err){} });
+  const resync=()=>{ es.close(); summary.es=null; loadSummary(); };   // reopens from the new snapshot's position
+  es.addEventListener('reset', resync); es.addEventListener('dropped', resync);
 }
 
+function fmtEta(s){ s=Math.round(s); if(s<60) return s+'s'; if(s<3600) return Math.floor(s/60)+'m '+(s%60)+'s'; return Math.floor(s/3600)+'h '+Math.floor(s%3600/60)+'m'; }
 
 async function toggleParts(gid){
   const row=document.getElementById('parts-'+gid); row.classList.toggle('hide');
@@ -297,8 +852,9 @@ async function toggleParts(gid){
     box.innerHTML="Loading...";
     const r=await fetch('/group_parts?gid='+encodeURIComponent(gid)); const parts=await r.json();
     const html=parts.map(p=>{
+      if(p.lease_id) return `<div class="small mono" style="padding:3px 4px 3px 18px;border-bottom:1px solid #f3f3f3">${p.spec?`copy of job ${p.id}, lease`:'lease'} #${p.lease_id} • ${p.start_frame}-${p.end_frame} • ${p.status} • done:${p.frame_done}/${p.frame_total} • worker ${p.worker_id}</div>`;
       return `<div style="padding:6px 4px;border-bottom:1px solid #eee">
-        <div class="small mono">${p.start_frame}-${p.end_frame} • ${p.status} • done:${p.frame_done}/${p.frame_total}</div>
+        <div class="small mono">${p.start_frame}-${p.end_frame} • ${p.status} • done:${p.frame_done}/${p.frame_total}${p.frame_seconds?` • ${p.frame_seconds.recent}s/frame`:''}${p.eta_seconds!=null?` • eta ${fmtEta(p.eta_seconds)}`:''}</div>
         <div class="toolbar">
           <button class="btn btn-ghost btn-sm" onclick="openFrames(${p.id})">Frames</button>
           <button class="btn btn-ghost btn-sm" onclick="openLog(${p.id})">Log</button>
@@ -327,56 +883,99 @@ async function toggleParts(gid){
 
 async function openFrames(job_id){
   const el=document.getElementById('frames-'+job_id); if(!el) return;
-  el.classList.toggle('hide'); if(el.classList.contains('hide')) return;
-  const data = await (await fetch('/frames_status?job_id='+job_id)).json();
-  buildGrid(el, data);
+  el.classList.toggle('hide'); if(el.classList.contains('hide')){ if(el._es){ el._es.close(); el._es=null; } return; }
+  const r = await fetch(`/frames_status?job_id=${job_id}&format=ranges`);
+  buildGrid(el, await r.json(), r.headers.get('X-Event-Seq'));
 }
 
-function buildGrid(container, data){
+// Frame grid: one canvas over a Uint8Array of frame states (0 queued, 1 running, 2 done, 3 failed).
+// Only the rows scrolled into view are drawn, and updates just flip array entries and schedule a
+// redraw, so jobs with 100k frames open and update without a DOM node per frame.
+// Click toggles a frame, drag or shift+click selects a range.
+const CELL=12, PITCH=14, GRID_VIEW=360, GRID_COLORS=['#eee','#f6c445','#21bf73','#e55353'];
+
+function buildGrid(container, data, seq){
   container.innerHTML="";
-  const start=data.start_frame, end=data.end_frame;
-  const total = Math.max(0, end-start+1);
-  const cols = Math.min(100, Math.ceil(Math.sqrt(total)));
-  const grid=document.createElement('div'); grid.className='framegrid';
-  grid.style.gridTemplateColumns = `repeat(${cols}, 12px)`;
-  container.appendChild(grid);
-
-  const state = new Map();
-  const sel = new Set();
-
-  function cellClass(st){ if(st==='d') return 'frame d'; if(st==='f') return 'frame f'; if(st==='r') return 'frame r'; return 'frame q'; }
-  function makeCell(fr){
-    const div=document.createElement('div'); div.className=cellClass(state.get(fr)||'q'); div.title=String(fr); div.dataset.frame=String(fr);
-    div.onclick=()=>{ const k=div.dataset.frame; if(sel.has(k)){ sel.delete(k); div.classList.remove('sel'); } else { sel.add(k); div.classList.add('sel'); } };
-    return div;
+  const start=data.start_frame, step=data.by_step||1;
+  const n=Math.max(0, Math.floor((data.end_frame-start)/step)+1), end=start+Math.max(0,n-1)*step;
+  const state=new Uint8Array(n), sel=new Uint8Array(n);
+  const idx=fr=>(fr-start)/step;   // not an integer in [0,n) for frames outside the job
+  function fill(list, v){   // plain frames or [first,last] runs
+    for(const it of list||[]){
+      const a=Array.isArray(it)?it[0]:it, b=Array.isArray(it)?it[1]:it;
+      for(let i=Math.max(0,Math.ceil(idx(a))), j=Math.min(n-1,Math.floor(idx(b))); i<=j; i++) state[i]=v;
+    }
   }
-
-  for(const fr of data.done||[]) state.set(fr,'d');
-  for(const fr of data.failed||[]) state.set(fr,'f');
-  for(let fr=start; fr<=end; fr++) grid.appendChild(makeCell(fr));
+  function runs(arr, v){   // [[first,last],...] frame runs where arr[i]===v
+    const out=[];
+    for(let i=0;i<n;i++){ if(arr[i]!==v) continue; let j=i; while(j+1<n&&arr[j+1]===v) j++; out.push([start+i*step, start+j*step]); i=j; }
+    return out;
+  }
+  fill(data.done,2); fill(data.failed,3);
 
   // toolbar
   const bar=document.createElement('div'); bar.className='toolbar';
-  bar.innerHTML=`<div class="small mono">Job ${data.job_id} • ${start}-${end}</div><div style="flex:1"></div>
+  bar.innerHTML=`<div class="small mono">Job ${data.job_id} • ${start}-${end}</div><div class="small mono" id="gridinfo"></div><div style="flex:1"></div>
     <button class="btn btn-ghost btn-sm" id="retrySel">Retry selected</button>
     <button class="btn btn-ghost btn-sm" id="retryFailed">Retry failed</button>
     <button class="btn btn-ghost btn-sm" id="splitAll">Split to 1-frame parts (all)</button>
     <button class="btn btn-ghost btn-sm" id="splitMissing">Split to 1-frame parts (missing)</button>
     <button class="btn btn-ghost btn-sm" id="clearSel">Clear selection</button>`;
-  container.prepend(bar);
+  container.appendChild(bar);
+  const info=bar.querySelector('#gridinfo');
+
+  const cols=Math.max(1, Math.min(100, Math.ceil(Math.sqrt(n)), Math.floor(((container.clientWidth||1200)-16)/PITCH)));
+  const rows=Math.ceil(n/cols), viewH=Math.min(rows*PITCH, GRID_VIEW), dpr=window.devicePixelRatio||1;
+  const scroller=document.createElement('div'); scroller.className='gridscroll';
+  const canvas=document.createElement('canvas'), spacer=document.createElement('div');
+  canvas.style.width=(cols*PITCH)+'px'; canvas.style.height=viewH+'px'; canvas.width=cols*PITCH*dpr; canvas.height=viewH*dpr;
+  spacer.style.height=(rows*PITCH-viewH)+'px';   // canvas (sticky) + spacer = full grid height
+  scroller.append(canvas, spacer); container.appendChild(scroller);
+  const ctx=canvas.getContext('2d'); ctx.scale(dpr,dpr);
+
+  let pending=false;
+  function draw(){
+    pending=false; const top=scroller.scrollTop; ctx.clearRect(0,0,cols*PITCH,viewH);
+    const r1=Math.min(rows-1, Math.floor((top+viewH)/PITCH));
+    ctx.strokeStyle='#2c7be5'; ctx.lineWidth=2;
+    for(let r=Math.floor(top/PITCH); r<=r1; r++){
+      const y=r*PITCH-top+1;
+      for(let c=0, i=r*cols; c<cols && i<n; c++, i++){
+        ctx.fillStyle=GRID_COLORS[state[i]]; ctx.fillRect(c*PITCH+1, y, CELL, CELL);
+        if(sel[i]) ctx.strokeRect(c*PITCH+2, y+1, CELL-2, CELL-2);
+      }
+    }
+    let d=0, f=0, s=0; for(let i=0;i<n;i++){ if(state[i]===2) d++; else if(state[i]===3) f++; if(sel[i]) s++; }
+    info.textContent=`• done ${d} • failed ${f} • of ${n}`+(s?` • ${s} selected`:'');
+  }
+  function redraw(){ if(!pending){ pending=true; requestAnimationFrame(draw); } }
+  scroller.addEventListener('scroll', redraw);
 
-  bar.querySelector('#retrySel').onclick = async ()=>{
-    const frames=[...sel].map(s=>parseInt(s,10)).sort((a,b)=>a-b);
-    if(!frames.length){ toast('No selection'); return; }
-    await doPost('/action/resubmit_frames', {job_id:data.job_id, frames:frames});
-    toast('Selected frames queued');
-  };
-  bar.querySelector('#retryFailed').onclick = async ()=>{
-    const frames=(data.failed||[]).slice();
-    if(!frames.length){ toast('No failed frames'); return; }
-    await doPost('/action/resubmit_frames', {job_id:data.job_id, frames:frames});
-    toast('Failed frames queued');
-  };
+  function cellAt(e){
+    const b=canvas.getBoundingClientRect(), c=Math.floor((e.clientX-b.left)/PITCH), i=Math.floor((e.clientY-b.top+scroller.scrollTop)/PITCH)*cols+c;
+    return c>=0 && c<cols && i>=0 && i<n ? i : -1;
+  }
+  function setRange(a, b, on){ if(a>b) [a,b]=[b,a]; sel.fill(on, a, b+1); }
+  let anchor=-1, drag=null;   // drag: {from, on, base} with base = selection before the drag
+  canvas.addEventListener('mousedown', (e)=>{
+    const i=cellAt(e); if(i<0) return; e.preventDefault();
+    if(e.shiftKey && anchor>=0){ setRange(anchor, i, 1); redraw(); return; }
+    drag={from:i, on:sel[i]?0:1, base:sel.slice()}; anchor=i; sel[i]=drag.on; redraw();
+    window.addEventListener('mouseup', ()=>{ drag=null; }, {once:true});
+  });
+  canvas.addEventListener('mousemove', (e)=>{
+    const i=cellAt(e); canvas.title=i<0?'':`${start+i*step} • ${['queued','running','done','failed'][state[i]]}`;
+    if(!drag || i<0 || !(e.buttons&1)) return;
+    sel.set(drag.base); setRange(drag.from, i, drag.on); redraw();
+  });
+
+  async function retry(frames, none, done){
+    if(!frames.length){ toast(none); return; }
+    await doPost('/action/resubmit_frames', {job_id:data.job_id, frames:frames});   // [first,last] runs
+    toast(done);
+  }
+  bar.querySelector('#retrySel').onclick = ()=>retry(runs(sel,1), 'No selection', 'Selected frames queued');
+  bar.querySelector('#retryFailed').onclick = ()=>retry(runs(state,3), 'No failed frames', 'Failed frames queued');
   bar.querySelector('#splitAll').onclick = ()=>{
     modalConfirm('Split ALL frames into 1-frame jobs?', async ()=>{
       await doPost('/action/split_job_to_frames', {job_id:data.job_id, only_missing:false});
@@ -389,32 +988,69 @@ function buildGrid(container, data){
       toast('Split missing → queued');
     });
   };
-  bar.querySelector('#clearSel').onclick = ()=>{ sel.clear(); container.querySelectorAll('.frame.sel').forEach(d=>d.classList.remove('sel')); };
+  bar.querySelector('#clearSel').onclick = ()=>{ sel.fill(0); redraw(); };
+  draw();
 
-  function applyUpdate(frames, st){
-    for(const fr of frames||[]){
-      const q=container.querySelector(`.framegrid .frame[data-frame="${fr}"]`);
-      if(q){ q.className = cellClass(st); }
-      state.set(fr, st);
-    }
-  }
-  if(!window._elara_es){
-    const es=new EventSource('/events');
-    es.onmessage=(e)=>{ try{ const msg=JSON.parse(e.data); if(msg.type==='frame'){ const d=msg.data; if(d.job_id!==data.job_id) return; if(d.frames_done)applyUpdate(d.frames_done,'d'); if(d.frames_failed)applyUpdate(d.frames_failed,'f'); if(d.current_frame)applyUpdate([d.current_frame],'r'); } }catch(err){} };
-    window._elara_es=es;
+  function applyUpdate(frames, v){
+    for(const fr of frames||[]){ const i=idx(fr); if(Number.isInteger(i) && i>=0 && i<n) state[i]=v; }
+    redraw();
   }
+  if(container._es) container._es.close();
+  const es=container._es=new EventSource(`/events?jobs=${data.job_id}&types=frame`+(seq?`&last_id=${seq}`:''));
+  const resync=async ()=>{ if(!container.isConnected||container.classList.contains('hide')){ es.close(); return; } const r=await fetch(`/frames_status?job_id=${data.job_id}&format=ranges`); buildGrid(container, await r.json(), r.headers.get('X-Event-Seq')); };
+  es.addEventListener('dropped', resync); es.addEventListener('reset', resync);
+  es.addEventListener('msg', (e)=>{ if(!container.isConnected){ es.close(); return; } try{ const d=JSON.parse(e.data).data; if(d.frames_done)applyUpdate(d.frames_done,2); if(d.frames_failed)applyUpdate(d.frames_failed,3); if(d.current_frame)applyUpdate([d.current_frame],1); }catch(err){} });
 }
 
+let logES=null;
 async function openLog(id){
   const dlg=document.getElementById('logdlg'), pre=document.getElementById('logtext'), title=document.getElementById('logtitle');
+  const older=document.getElementById('logolder'); let start=0;
   title.textContent=`Job ${id} – Log (tail)`;
-  async function fetchTail(){ const r=await fetch('/job_tail?id='+id); pre.textContent=await r.text(); }
+  function paged(r){ start=+(r.headers.get('X-Log-Start')||0); older.disabled=start<=0;
+    const size=r.headers.get('X-Log-Size'); title.textContent=`Job ${id} – Log`+(size?` (from byte ${start}, live)`:' (tail)'); }
+  // the tail once, then new output live from where it ended (the stream resumes by offset on reconnect)
+  async function fetchTail(){
+    if(logES) logES.close();
+    const r=await fetch('/job_tail?id='+id); paged(r); pre.textContent=await r.text(); pre.scrollTop=pre.scrollHeight;
+    logES=new EventSource(`/job_log_stream?id=${id}&offset=${r.headers.get('X-Log-End')||0}`);
+    logES.addEventListener('log', e=>{ const d=JSON.parse(e.data), stick=pre.scrollTop+pre.clientHeight>=pre.scrollHeight-4;
+      pre.textContent+=d.data; if(stick) pre.scrollTop=pre.scrollHeight; });
+  }
+  older.onclick=async()=>{ if(start<=0) return;   // page back 64 KB at a time, keeping the scroll position
+    const r=await fetch(`/job_tail?id=${id}&offset=${start}&limit=65536`); paged(r);
+    const h=pre.scrollHeight; pre.textContent=await r.text()+pre.textContent; pre.scrollTop+=pre.scrollHeight-h; };
   document.getElementById('logrefresh').onclick=fetchTail;
+  dlg.onclose=()=>{ if(logES){ logES.close(); logES=null; } };
   await fetchTail(); dlg.showModal();
 }
 
+async function searchLogs(){
+  const box=document.getElementById('logresults'), q=document.getElementById('logq').value.trim();
+  if(!q){ box.innerHTML=''; return; }
+  const r=await fetch('/log_search?q='+encodeURIComponent(q));
+  if(!r.ok){ box.innerHTML=`<div class="small" style="color:#c00">${r.status}: ${await r.text()}</div>`; return; }
+  const d=await r.json(), esc=t=>t.replace(/[&<>]/g,c=>({'&':'&amp;','<':'&lt;','>':'&gt;'}[c]));
+  const rows=d.hits.map(h=>`<tr><td><a href="#" onclick="openLog(${h.job_id});return false;">job ${h.job_id}</a></td><td>${h.frame??''}</td><td class="mono">${esc(h.line)}</td></tr>`).join("");
+  box.innerHTML=`<div class="small">${d.hits.length} line(s) • ${d.chunks_read} chunk(s) read • ${d.ms} ms</div>
+    <table><tr><th>Job</th><th>Frame</th><th>Line</th></tr>${rows||'<tr><td colspan="3"><i>No matches (running jobs are searchable once archived)</i></td></tr>'}</table>`;
+}
+
+async function loadWorkers(){
+  const box=document.getElementById('workers');
+  try{
+    const ws=await (await fetch('/workers')).json();
+    const rows=ws.map(w=>`<tr><td>${w.name}</td><td class="status ${w.online?'done':'failed'}">${w.online?'online':'offline'}</td>
+      <td>${w.busy} / ${w.slots}${w.leases?` <span class="small">(${w.leases} lease${w.leases>1?'s':''})</span>`:''}</td>
+      <td title="frame time relative to the group average">${w.speed?`${w.speed.mean}× <span class="small">(${w.speed.n} frames)</span>`:''}</td>
+      <td class="right">${w.last_seen?new Date(w.last_seen*1000).toLocaleString():""}</td></tr>`).join("");
+    box.innerHTML=`<table><tr><th>Worker</th><th>Status</th><th>Busy / slots</th><th>Frame time</th><th class="right">Last seen</th></tr>${rows||'<tr><td colspan="5"><i>No workers</i></td></tr>'}</table>`;
+  }catch(err){ box.innerHTML=`<div class="small" style="color:#c00">Workers failed to load: ${String(err)}</div>`; }
+}
+
 // initial & fallback refresh
-loadSummary(); setInterval(loadSummary, 5000);
+loadSummary(); setInterval(()=>{ if(!summary.es||summary.es.readyState!==1||Date.now()-summary.synced>SUMMARY_CHECK) syncSummary(); }, 5000);
+loadWorkers(); setInterval(loadWorkers, 5000);
 </script>
 </body></html>
 """
@@ -427,202 +1063,650 @@ def submit_job(
     camera: Optional[str] = Form(None), layer: Optional[str] = Form(None),
     start_frame: int = Form(1), end_frame: int = Form(1), by_step: int = Form(1),
     width: int = Form(1920), height: int = Form(1080), renderer: str = Form("arnold"),
-    chunk_size: int = Form(0),
+    chunk_size: int = Form(0), dynamic: int = Form(0),
 ):
     require_user_api_key(user_api_key)
     step=max(1,int(by_step)); s0=int(start_frame); e0=int(end_frame)
     if e0<s0: raise HTTPException(400,"end_frame must be >= start_frame")
-    c=db();x=c.cursor()
-    def ins(s,e,gid,idx,cnt):
-        ft=((e-s)//step)+1
-        x.execute("""INSERT INTO jobs(status,created,updated,scene,project,output_dir,
-           start_frame,end_frame,by_step,camera,width,height,renderer,layer,
-           group_id,part_index,part_count,frame_total,frame_done,frame_failed,frame_running,
-           eta_seconds,error_count,priority,retries,max_retries,cancel_requested,deleted)
-           VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
-           ("queued",now(),now(),scene,project,output_dir,s,e,step,camera,width,height,renderer,layer,
-            gid,idx,cnt,ft,0,0,0,None,0,0,0,AUTO_RETRY_DEFAULT,0,0))
-    cs=int(chunk_size) if chunk_size else 0
-    if cs>0:
-        gid=secrets.token_hex(4); total=((e0-s0+1)+cs-1)//cs; a=s0; idx=1
-        while a<=e0:
-            b=min(a+cs-1,e0); ins(a,b,gid,idx,total); a=b+1; idx+=1
-    else:
-        ins(s0,e0,None,None,None)
-    c.commit(); c.close()
+    with db() as c:
+        x=c.cursor()
+        def ins(s,e,gid,idx,cnt):
+            ft=((e-s)//step)+1
+            x.execute("""INSERT INTO jobs(status,created,updated,scene,project,output_dir,
+               start_frame,end_frame,by_step,camera,width,height,renderer,layer,
+               group_id,part_index,part_count,frame_total,frame_done,frame_failed,frame_running,
+               eta_seconds,error_count,priority,retries,max_retries,cancel_requested,deleted)
+               VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
+               ("queued",now(),now(),scene,project,output_dir,s,e,step,camera,width,height,renderer,layer,
+                gid,idx,cnt,ft,0,0,0,None,0,0,0,AUTO_RETRY_DEFAULT,0,0))
+        cs=int(chunk_size) if chunk_size else 0
+        if dynamic:
+            # one pool job; workers lease frames from it (see lease_frames)
+            gid=secrets.token_hex(4); ins(s0,e0,gid,1,1); x.execute("UPDATE jobs SET pool=1 WHERE id=?", (x.lastrowid,))
+        elif cs>0:
+            gid=secrets.token_hex(4); total=((e0-s0+1)+cs-1)//cs; a=s0; idx=1
+            while a<=e0:
+                b=min(a+cs-1,e0); ins(a,b,gid,idx,total); a=b+1; idx+=1
+        else:
+            gid=None; ins(s0,e0,None,None,None)
+        jid=x.lastrowid; rollup_refresh(x, [gkey(gid, jid)])
+        c.commit()
+        if gid: scheduler.sync(x, "group_id=?", (gid,))
+        else: scheduler.sync_ids(x, [jid])
     return HTMLResponse('<meta http-equiv="refresh" content="0;url=/" />')
 
+def _summary_row(r)->Dict[str,Any]:
+    return {"gkey":r["gkey"],"group_id":r["group_id"],"label":r["label"],"scene":r["scene"],"renderer":r["renderer"],
+            "frames":f"{r['start_frame']}-{r['end_frame']}","total":r["total"],"done":r["done"],"failed":r["failed"],
+            "running":r["running"],"parts":r["parts"],"status":r["status"],"updated":r["updated"],
+            "single_id":r["single_id"],"version":r["version"],
+            "eta_seconds":r["eta_seconds"] if r["status"] in ("queued","running") else None}
+
 @app.get("/jobs_summary")
-def jobs_summary():
-    c=db();x=c.cursor();x.execute("SELECT * FROM jobs WHERE deleted=0 ORDER BY created DESC")
-    rows=[dict(r) for r in x.fetchall()]; c.close()
-    groups={}; singles=[]
-    for j in rows:
-        ft=int(j.get("frame_total") or 0); fd=int(j.get("frame_done") or 0); ff=int(j.get("frame_failed") or 0); fr=int(j.get("frame_running") or 0)
-        gid=j.get("group_id"); st=(j.get("status") or "").lower()
-        if gid:
-            g=groups.get(gid) or {"group_id":gid,"label":f"group {gid}","scene":j.get("scene"),"renderer":j.get("renderer"),
-                                  "start":j.get("start_frame"),"end":j.get("end_frame"),
-                                  "total":0,"done":0,"failed":0,"running":0,"parts":0,"status":"queued","updated":j.get("updated")}
-            g["total"]+=ft; g["done"]+=fd; g["failed"]+=ff; g["running"]+=fr; g["parts"]+=1
-            try:g["end"]=max(g["end"],int(j.get("end_frame") or g["end"]))
-            except:pass
-            try:g["start"]=min(g["start"],int(j.get("start_frame") or g["start"]))
-            except:pass
-            g["updated"]=max(g["updated"] or 0, j.get("updated") or 0)
-            if g["running"]>0:g["status"]="running"
-            elif g["failed"]>0:g["status"]="failed"
-            elif g["done"]>0 and g["done"]==g["total"] and g["total"]>0:g["status"]="done"
-            else:g["status"]="queued"
-            groups[gid]=g
-        else:
-            singles.append({**j,"frame_total":ft,"frame_done":fd,"frame_failed":ff,"frame_running":fr})
-    out=[]
-    for g in groups.values():
-        out.append({"group_id":g["group_id"],"label":g["label"],"scene":g["scene"],"renderer":g["renderer"],
-                    "frames":f"{g['start']}-{g['end']}","total":g["total"],"done":g["done"],"failed":g["failed"],
-                    "running":g["running"],"parts":g["parts"],"status":g["status"],"updated":g["updated"],"single_id":None})
-    for j in singles:
-        out.append({"group_id":None,"label":f"job {j['id']}","scene":j.get("scene"),"renderer":j.get("renderer"),
-                    "frames":f"{j.get('start_frame')}-{j.get('end_frame')}","total":int(j.get("frame_total") or 0),
-                    "done":int(j.get("frame_done") or 0),"failed":int(j.get("frame_failed") or 0),
-                    "running":int(j.get("frame_running") or 0),"parts":1,"status":j.get("status"),
-                    "updated":j.get("updated"),"single_id":j["id"]})
-    out.sort(key=lambda x:(x["updated"] or 0), reverse=True)
-    return JSONResponse(out)
+def jobs_summary(request:Request, limit:int=0, offset:int=0, status:str="", since:Optional[int]=None):
+    """Reads the job_groups rollups only. Optional paging (limit/offset) and a
+    comma-separated status filter; X-Total-Count carries the unpaged row count.
+    ETag is the newest rollup version (304 on If-None-Match). With since=<version>
+    the reply is {"version","full","rows","removed"} holding only rows changed after it;
+    full=true means `since` was too old and rows is a complete snapshot. With a status
+    filter, rows that changed to a status outside it are listed in `removed` too."""
+    where="WHERE removed=0"; args:List[Any]=[]; seq=bus.seq   # read first: later events may repeat, none are missed
+    sts=[v.strip().lower() for v in (status or "").split(",") if v.strip()]
+    gone="removed=1"   # delta rows to drop: tombstones, and rows that left the filter
+    if sts: where+=f" AND status IN ({','.join('?'*len(sts))})"; gone+=f" OR status NOT IN ({','.join('?'*len(sts))})"; args+=sts
+    with db() as c:
+        x=c.cursor(); x.execute("BEGIN")  # one read snapshot for version + rows
+        x.execute("SELECT IFNULL(MAX(version),0) AS v FROM job_groups"); ver=x.fetchone()["v"]
+        etag=f'"g{ver}"'; hdr={"ETag":etag,"X-Version":str(ver),"X-Event-Seq":str(seq),"Cache-Control":"no-cache"}
+        if etag_matches(request, etag): return Response(status_code=304, headers=hdr)
+        if since is not None:
+            full=since<meta_get(x,"rollup_floor")
+            if full: x.execute(f"SELECT * FROM job_groups {where} ORDER BY updated DESC", args); removed=[]
+            else:
+                x.execute(f"SELECT gkey FROM job_groups WHERE version>? AND ({gone})", [since]+sts); removed=[r["gkey"] for r in x.fetchall()]
+                x.execute(f"SELECT * FROM job_groups {where} AND version>? ORDER BY updated DESC", args+[since])
+            rows=[_summary_row(r) for r in x.fetchall()]
+            return JSONResponse({"version":ver,"full":full,"rows":rows,"removed":removed}, headers=hdr)
+        x.execute(f"SELECT COUNT(1) AS n FROM job_groups {where}", args); total=x.fetchone()["n"]
+        page=" LIMIT ? OFFSET ?" if limit and limit>0 else ""
+        x.execute(f"SELECT * FROM job_groups {where} ORDER BY updated DESC{page}", args+([int(limit),max(0,int(offset))] if page else []))
+        out=[_summary_row(r) for r in x.fetchall()]
+    hdr["X-Total-Count"]=str(total)
+    return JSONResponse(out, headers=hdr)
 
 @app.get("/group_parts")
 def group_parts(gid:str="", job_id:int=0):
-    c=db();x=c.cursor()
-    if gid and gid.startswith("job-"):
-        try: jid=int(gid.split("-",1)[1])
-        except: jid=0
-        x.execute("SELECT * FROM jobs WHERE id=? AND deleted=0",(jid,)); parts=[dict(x.fetchone() or {})]
-    elif gid:
-        x.execute("SELECT * FROM jobs WHERE group_id=? AND deleted=0 ORDER BY start_frame ASC",(gid,)); parts=[dict(r) for r in x.fetchall()]
-    elif job_id:
-        x.execute("SELECT * FROM jobs WHERE id=? AND deleted=0",(job_id,)); parts=[dict(x.fetchone() or {})]
-    else: parts=[]
-    c.close()
+    with db() as c:
+        x=c.cursor()
+        if gid and gid.startswith("job-"):
+            try: jid=int(gid.split("-",1)[1])
+            except: jid=0
+            x.execute("SELECT * FROM jobs WHERE id=? AND deleted=0",(jid,)); parts=[dict(x.fetchone() or {})]
+        elif gid:
+            x.execute("SELECT * FROM jobs WHERE group_id=? AND deleted=0 ORDER BY start_frame ASC",(gid,)); parts=[dict(r) for r in x.fetchall()]
+        elif job_id:
+            x.execute("SELECT * FROM jobs WHERE id=? AND deleted=0",(job_id,)); parts=[dict(x.fetchone() or {})]
+        else: parts=[]
+        ids=[p["id"] for p in parts if p.get("id")]; leases=[]
+        if ids:   # pool leases, and speculative copies of chunked parts
+            x.execute(f"""SELECT * FROM frame_leases WHERE job_id IN ({','.join('?'*len(ids))})
+                          ORDER BY status='active' DESC, id DESC LIMIT ?""", (*ids,LEASES_SHOWN))
+            leases=sorted((dict(r) for r in x.fetchall()), key=lambda l:(l["job_id"],l["first_frame"]))
+            states=load_frames_many(x, {l["job_id"] for l in leases})
+        fstats=stats_get(x, "job", [p["id"] for p in parts if p.get("id")])
     out=[]
     for p in parts:
         tail=(p.get("log_tail") or "").strip()
-        last=""
-        if tail:
+        last=logs.last_line(p["id"]) if p.get("status")=="running" else ""
+        if tail and not last:
             lines=[ln for ln in tail.splitlines() if ln.strip()]
             if lines: last=lines[-1]
         out.append({"id":p.get("id"),"status":p.get("status"),"start_frame":p.get("start_frame"),
                     "end_frame":p.get("end_frame"),"part_index":p.get("part_index"),"part_count":p.get("part_count"),
                     "frame_total":p.get("frame_total") or 0,"frame_done":p.get("frame_done") or 0,
                     "frame_failed":p.get("frame_failed") or 0,"frame_running":p.get("frame_running") or 0,
-                    "error_count":p.get("error_count") or 0,"updated":p.get("updated"),"last_line":last})
+                    "error_count":p.get("error_count") or 0,"updated":p.get("updated"),"last_line":last,
+                    "worker_id":p.get("worker_id"),"eta_seconds":p.get("eta_seconds") if p.get("status") in ("queued","running") else None,
+                    "frame_seconds":stats_row(fstats.get(str(p.get("id"))))})
+    for l in leases:   # pool leases show up as parts of their pool job
+        st=states[l["job_id"]]; span=range(l["first_frame"],l["last_frame"]+1,st.step)
+        out.append({"id":l["job_id"],"lease_id":l["id"],"spec":l["spec"],"worker_id":l["worker_id"],
+                    "status":LEASE_PART_STATUS.get(l["status"],"queued"),
+                    "start_frame":l["first_frame"],"end_frame":l["last_frame"],"part_index":None,"part_count":None,
+                    "frame_total":l["frames"],"frame_done":sum(st.test("done",f) for f in span),
+                    "frame_failed":sum(st.test("failed",f) for f in span),"frame_running":sum(st.test("running",f) for f in span),
+                    "error_count":0,"updated":l["finished"] or l["created"],"last_line":""})
     return JSONResponse(out)
 
 # --------------- Frame grid API ---------------
 @app.post("/frame_update")
 async def frame_update(payload:Dict[str,Any]):
-    worker_from_auth(payload.get("worker_id"), payload.get("api_key"))
-    jid=int(payload.get("job_id") or 0)
-    if not jid: raise HTTPException(400,"job_id required")
-    frames_done = payload.get("frames_done") or []
-    frames_failed = payload.get("frames_failed") or []
-    current_frame = payload.get("current_frame")
-    ts=now(); c=db();x=c.cursor()
-    for fr in frames_done:
-        try: x.execute("""INSERT INTO job_frames(job_id,frame,status,tries,updated) 
-                          VALUES(?,?,?,?,?) ON CONFLICT(job_id,frame) DO UPDATE SET status='done',updated=?""",
-                          (jid,int(fr),'done',0,ts,ts))
-        except: pass
-    for fr in frames_failed:
-        try: x.execute("""INSERT INTO job_frames(job_id,frame,status,tries,updated) 
-                          VALUES(?,?,?,?,?) ON CONFLICT(job_id,frame) DO UPDATE SET status='failed',updated=?""",
-                          (jid,int(fr),'failed',0,ts,ts))
-        except: pass
-    c.commit(); c.close()
-    await bus.publish("frame", {"job_id":jid,"frames_done":frames_done,"frames_failed":frames_failed,"current_frame":current_frame})
-    return {"ok":True}
+    """Either one job (job_id, frames_done, frames_failed, current_frame) or a batch of
+    such objects under `updates`. Frame lists may mix plain numbers and [first,last] ranges."""
+    await run_in_threadpool(worker_from_auth, payload.get("worker_id"), payload.get("api_key"))
+    batch=payload.get("updates") if isinstance(payload.get("updates"),list) else [payload]
+    n,events=await run_in_threadpool(apply_frame_updates, batch, payload.get("worker_id"))
+    for e in events: frame_events.add(*e, worker_id=payload.get("worker_id"))
+    return {"ok":True,"jobs":n}
+
+def frame_list(v, field:str)->list:
+    """frames_done/frames_failed as sent: a list of frame numbers and [first,last] runs, else a 400."""
+    if v is None: return []
+    isint=lambda f: isinstance(f,int) and not isinstance(f,bool)
+    if isinstance(v,list) and all(isint(f) or (isinstance(f,list) and len(f)==2 and all(map(isint,f))) for f in v): return v
+    raise HTTPException(400,f"{field} must be a list of frame numbers and [first,last] runs")
+
+def apply_frame_updates(batch, worker_id:Optional[int]=None)->tuple:
+    """Write a batch of per-job frame updates in one transaction. Returns (jobs, events), events
+    being (job_id, done, failed, current_frame, group_id) for frame_events.add.
+    An update may carry `stats` [{frame, seconds, peak_mb}] for frames the worker timed."""
+    ups=[]
+    for u in batch:
+        try: jid=int(u.get("job_id") or 0)
+        except (TypeError,ValueError): jid=0
+        if jid: ups.append((jid,u,frame_list(u.get("frames_done"),"frames_done"),frame_list(u.get("frames_failed"),"frames_failed")))
+    if not ups: raise HTTPException(400,"job_id required")
+    ts=now(); items=[]; events=[]; stats=[]
+    with db() as c:
+        x=c.cursor(); v=next_version(x)  # write first: holds the lock across the bitmap read-modify-write
+        states=load_frames_many(x, [jid for jid,*_ in ups])
+        if not states: raise HTTPException(404,"job not found")
+        x.execute(f"SELECT id,group_id FROM jobs WHERE id IN ({','.join('?'*len(states))})", list(states))
+        groups={r["id"]:r["group_id"] for r in x.fetchall()}   # carried in the events for routing
+        for jid,u,fd,ff in ups:
+            st=states.get(jid)
+            if st is None: continue
+            done=st.apply(fd,"done"); failed=st.apply(ff,"failed")
+            items.append((jid,st,done,failed)); events.append((jid,done,failed,u.get("current_frame"),groups.get(jid)))
+            for fs in u.get("stats") or ():
+                try: f=int(fs["frame"]); sec=float(fs["seconds"])
+                except (KeyError,TypeError,ValueError): continue
+                if sec>0 and st.index(f)>=0: stats.append((jid,f,sec,fs.get("peak_mb")))
+        save_frames_many(x, items, v); spec_progress(x, states, ts)
+        if stats:
+            keys=record_frame_stats(x, worker_id, stats, ts)
+            refresh_eta(x, {jid:st.count-st.total("done") for jid,st,*_ in items})
+            rollup_refresh(x, keys)
+        ids=[(ts,jid) for jid,*_ in items]
+        x.executemany("UPDATE jobs SET updated=? WHERE id=?", ids)
+        x.executemany("UPDATE job_groups SET updated=?, version=? WHERE gkey IN (SELECT IFNULL(group_id,'job-'||id) FROM jobs WHERE id=?)",
+                      [(ts,v,jid) for _,jid in ids])
+        c.commit()
+    return len(items), events
+
+# --------------- Render statistics / ETA ---------------
+# frame_stats keeps one row per timed frame (wall time, worker, peak memory). render_stats
+# holds running aggregates, each updated in O(1) per frame: count, mean and M2 (Welford,
+# for the spread) plus an EWMA that follows recent frames.
+#   job/<id>     seconds per frame of one job (or pool)
+#   group/<gid>  seconds per frame across a chunked group's parts
+#   worker/<id>  worker speed: its frame time over the group mean at the time (1 = average)
+STATS_ALPHA = float(os.environ.get("ELARA_STATS_ALPHA", "0.2"))
+STATS_MIN_SAMPLES = 3    # frames before a worker's speed factor is trusted
+_STAT_ADD_SQL = f"""INSERT INTO render_stats(scope,key,n,mean,m2,ewma,updated) VALUES(?,?,1,?,0,?,?)
+    ON CONFLICT(scope,key) DO UPDATE SET n=n+1, mean=mean+(excluded.mean-mean)/(n+1),
+        m2=m2+(excluded.mean-mean)*(excluded.mean-mean)*n/(n+1),
+        ewma=ewma+{STATS_ALPHA}*(excluded.mean-ewma), updated=excluded.updated"""
+
+def stats_get(x, scope:str, keys)->Dict[str,sqlite3.Row]:
+    keys=[str(k) for k in keys if k is not None]
+    if not keys: return {}
+    x.execute(f"SELECT * FROM render_stats WHERE scope=? AND key IN ({','.join('?'*len(keys))})", (scope,*keys))
+    return {r["key"]:r for r in x.fetchall()}
+
+def worker_speed(r)->float:
+    return min(4.0,max(0.25,r["mean"])) if r and r["n"]>=STATS_MIN_SAMPLES else 1.0
+
+def stats_row(r)->Optional[Dict[str,Any]]:
+    if not r: return None
+    return {"n":r["n"],"mean":round(r["mean"],3),"std":round((r["m2"]/(r["n"]-1))**0.5,3) if r["n"]>1 else 0.0,
+            "recent":round(r["ewma"],3)}
+
+def record_frame_stats(x, worker_id, rows, ts:float)->set:
+    """Store timed frames [(job_id, frame, seconds, peak_mb)] and fold them into the job,
+    group and worker aggregates. Returns the touched group keys."""
+    ids=list({r[0] for r in rows})
+    x.execute(f"SELECT id,group_id FROM jobs WHERE id IN ({','.join('?'*len(ids))})", ids)
+    groups={r["id"]:r["group_id"] for r in x.fetchall()}
+    x.executemany("INSERT OR REPLACE INTO frame_stats(job_id,frame,worker_id,seconds,peak_mb,finished) VALUES(?,?,?,?,?,?)",
+                  [(jid,f,worker_id,sec,mb,ts) for jid,f,sec,mb in rows if jid in groups])
+    base=stats_get(x, "group", {g for g in groups.values() if g})
+    adds=[]
+    for jid,_,sec,_ in rows:
+        if jid not in groups: continue
+        g=groups[jid]; adds.append(("job",str(jid),sec))
+        if g: adds.append(("group",g,sec))
+        ref=base[g]["mean"] if g in base else None
+        if worker_id and ref: adds.append(("worker",str(worker_id),sec/ref))
+    x.executemany(_STAT_ADD_SQL, [(sc,k,v,v,ts) for sc,k,v in adds])
+    return {gkey(g,jid) for jid,g in groups.items()}
+
+def refresh_eta(x, left:Dict[int,int]):
+    """jobs.eta_seconds for {job_id: frames left}: frames left x expected seconds per frame,
+    which is the job's own recent average, else its group's mean scaled by the worker's speed.
+    A pool's frames are shared by its active leases."""
+    if not left: return
+    x.execute(f"""SELECT j.id,j.pool,js.ewma AS own,gs.mean AS grp,ws.n,ws.mean,
+                    (SELECT COUNT(1) FROM frame_leases l WHERE l.job_id=j.id AND l.status='active') AS leases
+                  FROM jobs j LEFT JOIN render_stats js ON js.scope='job' AND js.key=CAST(j.id AS TEXT)
+                  LEFT JOIN render_stats gs ON gs.scope='group' AND gs.key=j.group_id
+                  LEFT JOIN render_stats ws ON ws.scope='worker' AND ws.key=CAST(j.worker_id AS TEXT)
+                  WHERE j.id IN ({','.join('?'*len(left))})""", list(left))
+    ups=[]
+    for r in x.fetchall():
+        per=r["own"] or (r["grp"]*worker_speed(r if r["n"] else None) if r["grp"] else None)
+        eta=max(0,left[r["id"]])*per/(max(1,r["leases"]) if r["pool"] else 1) if per else None
+        ups.append((eta,r["id"]))
+    x.executemany("UPDATE jobs SET eta_seconds=? WHERE id=?", ups)
 
 @app.get("/frames_status")
-def frames_status(job_id:int):
-    c=db();x=c.cursor();x.execute("SELECT start_frame,end_frame FROM jobs WHERE id=?", (job_id,))
-    row=x.fetchone()
-    if not row: c.close(); raise HTTPException(404,"job not found")
-    start=row["start_frame"]; end=row["end_frame"]
-    x.execute("SELECT frame,status FROM job_frames WHERE job_id=?", (job_id,))
-    done=[]; failed=[]
-    for r in x.fetchall():
-        if r["status"]=="done": done.append(r["frame"])
-        elif r["status"]=="failed": failed.append(r["frame"])
-    c.close()
-    return {"job_id":job_id,"start_frame":start,"end_frame":end,"done":sorted(done),"failed":sorted(failed)}
+def frames_status(request:Request, job_id:int, since:Optional[int]=None, format:str="list"):
+    """ETag is the job's frame-state version. since=<version> returns only frames changed
+    after it (a full reply with delta=false when the change log no longer reaches back).
+    format=ranges returns done/failed as [[first,last],...] runs instead of frame lists.
+    X-Event-Seq (here and on /jobs_summary) is the /events position the reply includes."""
+    seq=bus.seq
+    with db() as c:
+        x=c.cursor(); x.execute("BEGIN")
+        x.execute("""SELECT j.start_frame,j.end_frame,j.by_step,s.bits,IFNULL(s.version,0) AS version,IFNULL(s.floor,0) AS floor
+                     FROM jobs j LEFT JOIN job_frame_state s ON s.job_id=j.id WHERE j.id=?""", (job_id,))
+        row=x.fetchone()
+        if not row: raise HTTPException(404,"job not found")
+        ver=row["version"]; etag=f'"f{job_id}-{ver}"'; hdr={"ETag":etag,"X-Version":str(ver),"X-Event-Seq":str(seq),"Cache-Control":"no-cache"}
+        if etag_matches(request, etag): return Response(status_code=304, headers=hdr)
+        st=FrameState.for_job(row, row["bits"])
+        delta=since is not None and since>=row["floor"]
+        if delta:
+            x.execute("SELECT data FROM job_frame_changes WHERE job_id=? AND version>? ORDER BY version", (job_id,since))
+            changed:Dict[int,str]={}
+            for r in x.fetchall():
+                d=json.loads(r["data"])
+                for fr in d.get("done",()): changed[fr]="done"
+                for fr in d.get("failed",()): changed[fr]="failed"
+    out={"job_id":job_id,"start_frame":row["start_frame"],"end_frame":row["end_frame"],"by_step":st.step,"version":ver,"delta":delta}
+    if delta:
+        fs=sorted(changed)
+        out["done"]=[f for f in fs if st.test("done",f)]; out["failed"]=[f for f in fs if st.test("failed",f)]
+    elif format=="ranges": out["done"]=st.ranges("done"); out["failed"]=st.ranges("failed"); out["format"]="ranges"
+    else: out["done"]=st.frames("done"); out["failed"]=st.frames("failed")
+    return JSONResponse(out, headers=hdr)
 
 @app.post("/action/resubmit_frames")
 def resubmit_frames(payload:Dict[str,Any]):
-    job_id=int(payload.get("job_id") or 0); frames:List[int]=payload.get("frames") or []
-    if not job_id or not frames: return {"ok":True}
-    c=db();x=c.cursor();x.execute("SELECT * FROM jobs WHERE id=?", (job_id,))
-    src=x.fetchone(); 
-    if not src: c.close(); raise HTTPException(404,"job not found")
-    scene=src["scene"]; project=src["project"]; output_dir=src["output_dir"]
-    camera=src["camera"]; layer=src["layer"]; width=src["width"]; height=src["height"]; renderer=src["renderer"]; step=1
-    frames=sorted(set(int(f) for f in frames))
-    blocks=[]; a=b=frames[0]
-    for fr in frames[1:]:
-        if fr==b+1: b=fr
-        else: blocks.append((a,b)); a=b=fr
-    blocks.append((a,b))
-    gid=secrets.token_hex(4)
-    for idx,(s,e) in enumerate(blocks,1):
-        ft=(e-s)//step+1
-        x.execute("""INSERT INTO jobs(status,created,updated,scene,project,output_dir,
-            start_frame,end_frame,by_step,camera,width,height,renderer,layer,
-            group_id,part_index,part_count,frame_total,frame_done,frame_failed,frame_running,
-            eta_seconds,error_count,priority,retries,max_retries,cancel_requested,deleted)
-            VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
-            ("queued",now(),now(),scene,project,output_dir,s,e,step,camera,width,height,renderer,layer,
-             gid,idx,len(blocks),ft,0,0,0,None,0,10,0,AUTO_RETRY_DEFAULT,0,0))
-    c.commit(); c.close()
+    """frames may mix plain numbers and [first,last] runs (the frame grid sends runs);
+    anything outside the job's range or off its step is dropped."""
+    try: job_id=int(payload.get("job_id") or 0)
+    except (TypeError,ValueError): raise HTTPException(400,"job_id must be an integer")
+    if not job_id: raise HTTPException(400,"job_id required")
+    frames:List[Any]=payload.get("frames") or []
+    isint=lambda v: isinstance(v,int) and not isinstance(v,bool)
+    if not isinstance(frames,list): raise HTTPException(400,"frames must be a list")
+    runs=[]
+    for f in frames:
+        if isint(f): runs.append((f,f))
+        elif isinstance(f,(list,tuple)) and len(f)==2 and all(map(isint,f)): runs.append(tuple(f))
+        else: raise HTTPException(400,f"bad frame entry {f!r}: expected a frame number or [first,last]")
+    if not runs: return {"ok":True}
+    with db() as c:
+        x=c.cursor();x.execute("SELECT * FROM jobs WHERE id=?", (job_id,))
+        src=x.fetchone()
+        if not src: raise HTTPException(404,"job not found")
+        scene=src["scene"]; project=src["project"]; output_dir=src["output_dir"]
+        camera=src["camera"]; layer=src["layer"]; width=src["width"]; height=src["height"]; renderer=src["renderer"]
+        lo,hi,by=src["start_frame"],src["end_frame"],max(1,int(src["by_step"] or 1))
+        def run(a,b): a=max(lo,a); return range(a+(lo-a)%by, min(hi,b)+1, by)   # clipped to the job's frames
+        frames=sorted(set(fr for a,b in runs for fr in run(a,b)))
+        if not frames: return {"ok":True}
+        blocks=[]; a=b=frames[0]
+        for fr in frames[1:]:   # runs of consecutive frames on the job's step
+            if fr==b+by: b=fr
+            else: blocks.append((a,b)); a=b=fr
+        blocks.append((a,b))
+        gid=secrets.token_hex(4)
+        for idx,(s,e) in enumerate(blocks,1):
+            ft=(e-s)//by+1
+            x.execute("""INSERT INTO jobs(status,created,updated,scene,project,output_dir,
+                start_frame,end_frame,by_step,camera,width,height,renderer,layer,
+                group_id,part_index,part_count,frame_total,frame_done,frame_failed,frame_running,
+                eta_seconds,error_count,priority,retries,max_retries,cancel_requested,deleted)
+                VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
+                ("queued",now(),now(),scene,project,output_dir,s,e,by,camera,width,height,renderer,layer,
+                 gid,idx,len(blocks),ft,0,0,0,None,0,10,0,AUTO_RETRY_DEFAULT,0,0))
+        rollup_refresh(x, [gid]); c.commit()
+        scheduler.sync(x, "group_id=?", (gid,))
     return {"ok":True,"blocks":blocks,"group_id":gid}
 
 @app.post("/action/split_job_to_frames")
 def split_job_to_frames(payload:Dict[str,Any]):
     job_id=int(payload.get("job_id") or 0); only_missing=bool(payload.get("only_missing"))
     if not job_id: return {"ok":True}
-    c=db();x=c.cursor();x.execute("SELECT * FROM jobs WHERE id=?", (job_id,)); j=x.fetchone()
-    if not j: c.close(); raise HTTPException(404,"job not found")
-    s=j["start_frame"]; e=j["end_frame"]; all_frames=list(range(s,e+1))
-    frames=all_frames
-    if only_missing:
-        x.execute("SELECT frame FROM job_frames WHERE job_id=? AND status='done'", (job_id,))
-        done={r["frame"] for r in x.fetchall()}
-        frames=[fr for fr in all_frames if fr not in done]
-    scene=j["scene"]; project=j["project"]; output_dir=j["output_dir"]
-    camera=j["camera"]; layer=j["layer"]; width=j["width"]; height=j["height"]; renderer=j["renderer"]
-    gid=secrets.token_hex(4)
-    for idx,fr in enumerate(frames,1):
-        x.execute("""INSERT INTO jobs(status,created,updated,scene,project,output_dir,
-            start_frame,end_frame,by_step,camera,width,height,renderer,layer,
-            group_id,part_index,part_count,frame_total,frame_done,frame_failed,frame_running,
-            eta_seconds,error_count,priority,retries,max_retries,cancel_requested,deleted)
-            VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
-            ("queued",now(),now(),scene,project,output_dir,fr,fr,1,camera,width,height,renderer,layer,
-             gid,idx,len(frames),1,0,0,0,None,0,10,0,AUTO_RETRY_DEFAULT,0,0))
-    c.commit(); c.close()
+    with db() as c:
+        x=c.cursor();x.execute("SELECT * FROM jobs WHERE id=?", (job_id,)); j=x.fetchone()
+        if not j: raise HTTPException(404,"job not found")
+        s=j["start_frame"]; e=j["end_frame"]; all_frames=list(range(s,e+1))
+        frames=all_frames
+        if only_missing:
+            frames=load_frames(x, job_id).missing()
+        scene=j["scene"]; project=j["project"]; output_dir=j["output_dir"]
+        camera=j["camera"]; layer=j["layer"]; width=j["width"]; height=j["height"]; renderer=j["renderer"]
+        gid=secrets.token_hex(4)
+        for idx,fr in enumerate(frames,1):
+            x.execute("""INSERT INTO jobs(status,created,updated,scene,project,output_dir,
+                start_frame,end_frame,by_step,camera,width,height,renderer,layer,
+                group_id,part_index,part_count,frame_total,frame_done,frame_failed,frame_running,
+                eta_seconds,error_count,priority,retries,max_retries,cancel_requested,deleted)
+                VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
+                ("queued",now(),now(),scene,project,output_dir,fr,fr,1,camera,width,height,renderer,layer,
+                 gid,idx,len(frames),1,0,0,0,None,0,10,0,AUTO_RETRY_DEFAULT,0,0))
+        rollup_refresh(x, [gid]); c.commit()
+        scheduler.sync(x, "group_id=?", (gid,))
     return {"ok":True,"count":len(frames),"group_id":gid}
 
 # --------------- Logs ---------------
-@app.get("/job_tail", response_class=PlainTextResponse)
-def job_tail(id:int):
-    path=os.path.join(LOG_DIR, f"job_{id}.log")
-    if os.path.isfile(path):
+TAIL_BYTES = 6000
+TAIL_MAX_BYTES = 1<<20
+
+def read_log_range(src, end:Optional[int], limit:int)->tuple:
+    """Up to `limit` bytes of the log ending at byte `end` (default: its size), read by seeking,
+    starting on a line boundary unless that reaches the start. `src` is a path or a JobLog.
+    Returns (text, start, end, size)."""
+    with (open(src,"rb") if isinstance(src,str) else src) as f:
+        size=f.seek(0,os.SEEK_END); end=size if end is None else max(0,min(int(end),size))
+        start=max(0,end-limit); f.seek(start); data=f.read(end-start)
+    if start>0:
+        nl=data.find(b"\n")
+        if 0<=nl<len(data)-1: data=data[nl+1:]; start+=nl+1
+    return data.decode("utf-8","replace"), start, end, size
+
+def read_log_from(src, start:int, limit:int)->tuple:
+    """Up to `limit` bytes from byte `start`, cut after the last full line unless it reaches the
+    end of the log. Returns (text, end, size)."""
+    with (open(src,"rb") if isinstance(src,str) else src) as f:
+        size=f.seek(0,os.SEEK_END); start=max(0,min(int(start),size)); f.seek(start); data=f.read(min(limit,size-start))
+    if start+len(data)<size:
+        nl=data.rfind(b"\n")
+        if nl>=0: data=data[:nl+1]
+    return data.decode("utf-8","replace"), start+len(data), size
+
+# Workers send their render output as it is written (`logs` in /worker_update, or /log_append):
+# {job_id, stream, offset, data}. A stream is one render of the job (pool leases and speculative
+# copies render the same job side by side) and `offset` is the byte position of `data` within
+# it, so a resent chunk is dropped and a lost one leaves a marker. Chunks are appended to
+# LOG_STORE/job_<id>.log. Once a job has finished, the archiver moves that file into the
+# compressed archive (below); a job's log is its archived chunks followed by the live file,
+# and offsets into that are what /job_tail and /job_log_stream viewers page and resume by.
+LOG_STORE = os.path.join(LOG_DIR, "live")
+LOG_STREAMS_KEPT = 4096     # acknowledged stream offsets remembered (oldest forgotten first)
+LOG_KEEPALIVE = 15.0
+LOG_CHUNK = 64<<10          # bytes per streamed event
+
+class LogStore:
+    def __init__(self, root:str):
+        self.root=root; self.acked:"OrderedDict[tuple,int]"=OrderedDict()
+        self.waiters:Dict[int,Dict[asyncio.Event,Any]]={}   # jid -> {event: its loop}; appends run off the loop
+        self.lock=threading.Lock()   # concurrent appends, and the archiver taking the live file
+        os.makedirs(root, exist_ok=True); os.makedirs(LOG_ARCHIVE, exist_ok=True)
+    def path(self, jid:int)->str: return os.path.join(self.root, f"job_{int(jid)}.log")
+    def open(self, jid:int)->Optional["JobLog"]:
+        with db() as c:
+            x=c.cursor(); x.execute("SELECT * FROM log_chunks WHERE job_id=? ORDER BY seq", (jid,)); chunks=x.fetchall()
+        path=self.path(jid)
+        return JobLog(jid, chunks, path) if chunks or os.path.isfile(path) else None
+    def append(self, jid:int, stream:str, offset:int, data:str)->int:
+        """Add one chunk; returns the bytes written. Called from the threadpool."""
+        raw=(data or "").encode("utf-8","replace"); key=(jid,stream); end=offset+len(raw)
+        with self.lock:
+            acked=self.acked.get(key, offset)   # an unknown stream (e.g. after a server restart) is taken as is
+            if end<=acked: return 0
+            if offset<acked: raw=raw[acked-offset:]
+            elif offset>acked: raw=f"[... {offset-acked} bytes of log lost ...]\n".encode()+raw
+            with open(self.path(jid),"ab") as f: f.write(raw)
+            self.acked[key]=end; self.acked.move_to_end(key)
+            while len(self.acked)>LOG_STREAMS_KEPT: self.acked.popitem(last=False)
+        for ev,loop in list(self.waiters.get(jid, {}).items()):
+            try: loop.call_soon_threadsafe(ev.set)
+            except RuntimeError: pass   # loop already closed
+        return len(raw)
+    def watch(self, jid:int)->asyncio.Event:
+        ev=asyncio.Event(); self.waiters.setdefault(jid,{})[ev]=asyncio.get_running_loop(); return ev
+    def unwatch(self, jid:int, ev:asyncio.Event):
+        w=self.waiters.get(jid)
+        if w is not None:
+            w.pop(ev, None)
+            if not w: self.waiters.pop(jid, None)
+    def last_line(self, jid:int)->str:
+        """Last line of a running job's live log."""
+        try: text=read_log_range(self.path(jid), None, 1024)[0]
+        except OSError: return ""
+        lines=[ln for ln in text.splitlines() if ln.strip()]
+        return lines[-1] if lines else ""
+    def prune(self, keep):
+        """Remove the live and archived logs of jobs not in `keep`."""
+        for root,pat in ((self.root,r"job_(\d+)\.log"),(LOG_ARCHIVE,r"job_(\d+)\.zlog")):
+            for name in os.listdir(root):
+                m=re.fullmatch(pat, name)
+                if m and int(m.group(1)) not in keep:
+                    try: os.remove(os.path.join(root, name))
+                    except OSError: pass
+
+# ---- archive: compressed, seekable chunks + an inverted index ----
+# A finished job's live log is cut into ~LOG_ARCHIVE_CHUNK byte pieces on line boundaries,
+# each zlib-compressed and appended to LOG_ARCHIVE/job_<id>.zlog; log_chunks maps every
+# piece to its byte range in the log and its place in that file, so a read decompresses only
+# the pieces it covers. log_terms indexes, per piece, the words of error/warning lines and
+# 'frame:<n>' for the frames rendered in it; /log_search intersects those postings and
+# decompresses only the pieces that can match.
+LOG_ARCHIVE = os.path.join(LOG_DIR, "archive")
+LOG_ARCHIVE_AFTER = float(os.environ.get("ELARA_LOG_ARCHIVE_AFTER", "60"))   # seconds after a job finishes
+LOG_ARCHIVE_CHUNK = 256<<10
+LOG_INDEX_LINE = re.compile(r"\b(?:error|warning|warn|fatal|missing|failed|not found)\b|// error", re.I)
+LOG_FRAME = re.compile(r"\bframe\s+(-?\d+)", re.I)
+LOG_TOKEN = re.compile(r"[a-z0-9_]+(?:\.[a-z0-9_]+)*")
+LOG_STOPWORDS = {"the","and","for","with","from","was","not","are","has","have","this","that","into","found"}
+
+def log_tokens(line:str)->set:
+    return {t for t in LOG_TOKEN.findall(line.lower()) if 3<=len(t)<=64 and t not in LOG_STOPWORDS and not t.isdigit()}
+
+class JobLog:
+    """A job's log as one read-only byte stream: its archived chunks, then the live file."""
+    def __init__(self, jid:int, chunks, live:str):
+        self.jid=jid; self.chunks=chunks; self.live=live; self.pos=0
+        self.base=(chunks[-1]["raw_start"]+chunks[-1]["raw_len"]) if chunks else 0
+        try: self.size=self.base+os.path.getsize(live)
+        except OSError: self.size=self.base
+    def __enter__(self): return self
+    def __exit__(self, *a): return False
+    def seek(self, off:int, whence:int=0)->int:
+        self.pos=max(0,min(self.size,(0,self.pos,self.size)[whence]+off)); return self.pos
+    def read(self, n:int=-1)->bytes:
+        end=self.size if n<0 else min(self.size,self.pos+n); out=[]
+        if self.pos<self.base:
+            with open(os.path.join(LOG_ARCHIVE, f"job_{self.jid}.zlog"),"rb") as f:
+                for ch in self.chunks:
+                    a=ch["raw_start"]; b=a+ch["raw_len"]
+                    if b<=self.pos or a>=end: continue
+                    f.seek(ch["file_pos"]); raw=zlib.decompress(f.read(ch["comp_len"]))
+                    out.append(raw[max(0,self.pos-a):min(b,end)-a])
+        if end>self.base:
+            with open(self.live,"rb") as f:
+                f.seek(max(0,self.pos-self.base)); out.append(f.read(end-max(self.pos,self.base)))
+        self.pos=end
+        return b"".join(out)
+
+def _log_pieces(f):
+    """Read a log in ~LOG_ARCHIVE_CHUNK pieces cut on line boundaries (holds two pieces at most)."""
+    buf=b""
+    while True:
+        more=f.read(LOG_ARCHIVE_CHUNK); buf+=more
+        while len(buf)>LOG_ARCHIVE_CHUNK or (buf and not more):
+            cut=len(buf) if len(buf)<=LOG_ARCHIVE_CHUNK else (buf.rfind(b"\n",0,LOG_ARCHIVE_CHUNK)+1 or LOG_ARCHIVE_CHUNK)
+            yield buf[:cut]; buf=buf[cut:]
+        if not more: return
+
+def _restore_live(jid:int):
+    """Put a `.archiving` file back in front of whatever was appended to the live log since."""
+    path=logs.path(jid); tmp=path+".archiving"
+    with logs.lock:
+        if os.path.isfile(path):
+            with open(tmp,"ab") as out, open(path,"rb") as f:
+                for piece in iter(lambda: f.read(LOG_CHUNK), b""): out.write(piece)
+        os.replace(tmp, path)
+
+def archive_log(jid:int)->int:
+    """Move a job's live log into the archive and index it. Returns the chunks written.
+    Pieces are compressed and indexed outside the transaction, which only inserts the rows.
+    On failure the .zlog is cut back and the log returns to the live store."""
+    path=logs.path(jid); tmp=path+".archiving"; zpath=os.path.join(LOG_ARCHIVE, f"job_{jid}.zlog")
+    with logs.lock:   # an append racing this lands in a fresh live file
+        try: os.replace(path, tmp)
+        except OSError: return 0
+    zsize=os.path.getsize(zpath) if os.path.isfile(zpath) else 0
+    try:
+        with db() as c:
+            x=c.cursor(); x.execute("SELECT frame_end FROM log_chunks WHERE job_id=? ORDER BY seq DESC LIMIT 1", (jid,)); fr=x.fetchone()
+        frame=fr["frame_end"] if fr else None; pieces=[]; terms=set(); pos=0   # a rerun continues the frame context
+        with open(tmp,"rb") as f, open(zpath,"ab") as out:
+            for raw in _log_pieces(f):
+                comp=zlib.compress(raw, 6); i=len(pieces); start_frame=frame
+                if frame is not None: terms.add((f"frame:{frame}",i))
+                for line in raw.decode("utf-8","replace").splitlines():
+                    m=LOG_FRAME.search(line)
+                    if m: frame=int(m.group(1)); terms.add((f"frame:{frame}",i))
+                    if LOG_INDEX_LINE.search(line): terms.update((t,i) for t in log_tokens(line))
+                pieces.append((pos,len(raw),out.tell(),len(comp),start_frame,frame)); out.write(comp); pos+=len(raw)
+        with db() as c:
+            x=c.cursor(); x.execute("BEGIN IMMEDIATE")
+            x.execute("SELECT IFNULL(MAX(seq),-1) AS seq, IFNULL(MAX(raw_start+raw_len),0) AS size FROM log_chunks WHERE job_id=?", (jid,))
+            r=x.fetchone(); seq=r["seq"]+1; base=r["size"]
+            x.executemany("""INSERT INTO log_chunks(job_id,seq,raw_start,raw_len,file_pos,comp_len,frame,frame_end)
+                             VALUES(?,?,?,?,?,?,?,?)""", [(jid,seq+i,base+p[0],*p[1:]) for i,p in enumerate(pieces)])
+            x.executemany("INSERT OR IGNORE INTO log_terms(term,job_id,seq) VALUES(?,?,?)", [(t,jid,seq+i) for t,i in terms])
+            c.commit()
+    except BaseException:
         try:
-            with open(path,"r",encoding="utf-8",errors="replace") as f: return f.read()[-6000:]
-        except Exception:
-            try:
-                with open(path,"rb") as f: return f.read().decode("utf-8","replace")[-6000:]
-            except Exception: pass
-    c=db();x=c.cursor();x.execute("SELECT log_tail FROM jobs WHERE id=?", (id,))
-    r=x.fetchone(); c.close(); return (r["log_tail"] if r and r["log_tail"] else "")
+            with open(zpath,"r+b") as z: z.truncate(zsize)
+        except OSError: pass
+        _restore_live(jid)
+        raise
+    os.remove(tmp)   # a crash right before this re-archives the log once more, it is never lost
+    return len(pieces)
+
+def archive_logs()->List[int]:
+    """Archive the live logs of jobs that finished more than LOG_ARCHIVE_AFTER seconds ago.
+    A `.archiving` file left by a crash goes back to the live store first."""
+    names=os.listdir(LOG_STORE)
+    for m in (re.fullmatch(r"job_(\d+)\.log\.archiving", n) for n in names):
+        if m:
+            try: _restore_live(int(m.group(1)))
+            except OSError as e: print(f"[server] restoring log of job {m.group(1)} failed:", e)
+    ids=[int(m.group(1)) for m in (re.fullmatch(r"job_(\d+)\.log", n) for n in os.listdir(LOG_STORE)) if m]
+    if not ids: return []
+    with db() as c:
+        x=c.cursor()
+        x.execute(f"""SELECT id FROM jobs WHERE id IN ({','.join('?'*len(ids))}) AND updated<?
+                      AND status IN ('done','failed','cancelled')""", (*ids,now()-LOG_ARCHIVE_AFTER))
+        done=[r["id"] for r in x.fetchall()]
+    for jid in done:
+        try: archive_log(jid)
+        except Exception as e: print(f"[server] archiving log of job {jid} failed:", e)
+    return done
+logs=LogStore(LOG_STORE)
+
+def append_logs(chunks)->int:
+    n=0
+    for ch in chunks or ():
+        try: n+=logs.append(int(ch["job_id"]), str(ch.get("stream") or ""), int(ch.get("offset") or 0), ch.get("data") or "")
+        except (KeyError,TypeError,ValueError): continue
+    return n
+
+@app.post("/log_append")
+def log_append(payload:Dict[str,Any]):
+    """Log chunks under `logs` (see LogStore); /worker_update carries the same list."""
+    worker_from_auth(payload.get("worker_id"), payload.get("api_key"))
+    return {"ok":True,"bytes":append_logs(payload.get("logs") if isinstance(payload.get("logs"),list) else [payload])}
+
+@app.get("/job_log_stream")
+async def job_log_stream(request:Request, id:int, offset:Optional[int]=None):
+    """SSE of a job's log as it grows. Each 'log' event is {"offset","data"} with the event id
+    set to the byte offset after it, so a reconnecting EventSource (Last-Event-ID) or
+    ?offset= resumes exactly where it stopped. Without either it starts at the tail."""
+    last=request.headers.get("last-event-id") or ""
+    pos=int(last) if last.isdigit() else offset
+    async def gen():
+        nonlocal pos
+        ev=logs.watch(id)
+        try:
+            yield "retry: 2000\n\n"
+            while not await request.is_disconnected():
+                src=await run_in_threadpool(logs.open, id)
+                if src:
+                    if pos is None: text,start,end,size=await run_in_threadpool(read_log_range, src, None, TAIL_BYTES)
+                    else: start=pos; text,end,size=await run_in_threadpool(read_log_from, src, pos, LOG_CHUNK)
+                    pos=end
+                    if text: yield f"id: {end}\nevent: log\ndata: {json.dumps({'offset':start,'data':text})}\n\n"
+                    if end<size: continue
+                try: await asyncio.wait_for(ev.wait(), LOG_KEEPALIVE)
+                except asyncio.TimeoutError: yield ": keepalive\n\n"
+                ev.clear()
+        finally: logs.unwatch(id, ev)
+    return StreamingResponse(gen(), media_type="text/event-stream", headers={"Cache-Control":"no-cache"})
+
+LOG_SEARCH_CHUNKS = 500   # pieces decompressed per search at most
+
+@app.get("/log_search")
+def log_search(q:str, job_id:int=0, group_id:str="", limit:int=100):
+    """Search archived logs. `q` holds words of error/warning lines (all must appear in one line)
+    and optionally frame:<n> (only lines logged while that frame rendered). job_id / group_id
+    narrow it down. Returns the matching lines with job, frame and byte offset, newest jobs
+    first. Only the indexed pieces that hold every term are decompressed."""
+    t0=time.perf_counter(); frames=[int(m) for m in re.findall(r"frame:(-?\d+)", q.lower())]
+    words=log_tokens(re.sub(r"frame:-?\d+", " ", q.lower()))
+    terms=sorted(words)+[f"frame:{f}" for f in frames]
+    if not terms: raise HTTPException(400,"nothing to search for")
+    scope=""; args:List[Any]=[]
+    if job_id: scope=" AND job_id=?"; args=[job_id]
+    elif group_id: scope=" AND job_id IN (SELECT id FROM jobs WHERE group_id=?)"; args=[group_id]
+    sql=" INTERSECT ".join(f"SELECT job_id,seq FROM log_terms WHERE term=?{scope}" for _ in terms)
+    hits=[]; read=0; limit=max(1,min(int(limit or 100),1000))
+    with db() as c:
+        x=c.cursor()
+        x.execute(f"""SELECT c.* FROM log_chunks c JOIN ({sql}) t ON t.job_id=c.job_id AND t.seq=c.seq
+                      ORDER BY c.job_id DESC, c.seq LIMIT ?""", [v for t in terms for v in (t,*args)]+[LOG_SEARCH_CHUNKS])
+        chunks=x.fetchall()
+    for ch in chunks:
+        if len(hits)>=limit: break
+        try:
+            with open(os.path.join(LOG_ARCHIVE, f"job_{ch['job_id']}.zlog"),"rb") as f:
+                f.seek(ch["file_pos"]); raw=zlib.decompress(f.read(ch["comp_len"]))
+        except (OSError,zlib.error): continue
+        read+=1; frame=ch["frame"]; pos=ch["raw_start"]
+        for line in raw.split(b"\n"):
+            text=line.decode("utf-8","replace"); m=LOG_FRAME.search(text)
+            if m: frame=int(m.group(1))
+            if (not frames or frame in frames) and words and LOG_INDEX_LINE.search(text) and words<=log_tokens(text):
+                hits.append({"job_id":ch["job_id"],"frame":frame,"offset":pos,"line":text.rstrip("\r")})
+                if len(hits)>=limit: break
+            elif not words and m and frame in frames:   # frame:<n> alone: where that frame starts
+                hits.append({"job_id":ch["job_id"],"frame":frame,"offset":pos,"line":text.rstrip("\r")})
+                if len(hits)>=limit: break
+            pos+=len(line)+1
+    return {"hits":hits,"chunks_read":read,"chunks_matched":len(chunks),"ms":round((time.perf_counter()-t0)*1000,2)}
+
+@app.get("/job_tail", response_class=PlainTextResponse)
+def job_tail(id:int, offset:Optional[int]=None, limit:int=TAIL_BYTES):
+    """The end of a job's log, read from the end of the file (never all of it). offset=<byte>
+    returns the `limit` bytes before that offset instead, to page back through big logs.
+    X-Log-Start / X-Log-End carry the byte range served, X-Log-Size the file size.
+    Reads the log store (archive + live), else a log file left in LOG_DIR by older versions."""
+    src=logs.open(id)
+    if src is None and os.path.isfile(os.path.join(LOG_DIR, f"job_{id}.log")): src=os.path.join(LOG_DIR, f"job_{id}.log")
+    if src:
+        try: text,start,end,size=read_log_range(src, offset, max(1,min(int(limit or TAIL_BYTES),TAIL_MAX_BYTES)))
+        except OSError: pass
+        else: return PlainTextResponse(text, headers={"X-Log-Start":str(start),"X-Log-End":str(end),"X-Log-Size":str(size)})
+    with db() as c:
+        x=c.cursor();x.execute("SELECT log_tail FROM jobs WHERE id=?", (id,)); r=x.fetchone()
+    return (r["log_tail"] if r and r["log_tail"] else "")
 
 # --------------- Actions / purge ---------------
 def _ok(): return {"ok":True}
@@ -635,29 +1719,44 @@ def cancel_job(id:int, mode:str="now"):
       - 'now': cancel immediately
     cancel_requested: 0 none, 1 immediate, 2 graceful
     """
-    c=db();x=c.cursor();x.execute("SELECT status FROM jobs WHERE id=? AND deleted=0",(id,)); r=x.fetchone()
-    if not r: c.close(); return _ok()
-    st=(r["status"] or "").lower()
-    if st=="queued":
-        x.execute("UPDATE jobs SET status='cancelled', updated=? WHERE id=?", (now(),id))
-    elif st=="running":
-        if mode in ("after_frame","graceful"):
-            x.execute("UPDATE jobs SET cancel_requested=2, status='cancelled' WHERE id=?", (id,))
-        else:
-            x.execute("UPDATE jobs SET cancel_requested=1, status='cancelled' WHERE id=?", (id,))
-    c.commit(); c.close(); return _ok()
+    scheduler.withdraw([id]); scheduler.flush()  # a just-claimed job must read as running, not queued
+    with db() as c:
+        x=c.cursor();x.execute("SELECT status,pool FROM jobs WHERE id=? AND deleted=0",(id,)); r=x.fetchone()
+        if not r: return _ok()
+        st=(r["status"] or "").lower()
+        if st=="queued" and not r["pool"]:   # cancel_requested too: stops a worker that got it anyway
+            x.execute("UPDATE jobs SET status='cancelled', cancel_requested=1, updated=? WHERE id=?", (now(),id))
+        elif st in ("running","queued"):   # a queued pool can still have frames out on lease
+            if mode in ("after_frame","graceful"):
+                x.execute("UPDATE jobs SET cancel_requested=2, status='cancelled' WHERE id=?", (id,))
+            else:
+                x.execute("UPDATE jobs SET cancel_requested=1, status='cancelled' WHERE id=?", (id,))
+        rollup_refresh(x, job_gkeys(x,[id])); c.commit()
+        scheduler.sync_ids(x, [id])
+    return _ok()
 
 @app.post("/action/cancel_group")
 def cancel_group(gid:str):
-    c=db();x=c.cursor()
-    x.execute("UPDATE jobs SET status='cancelled', updated=? WHERE group_id=? AND status='queued' AND deleted=0",(now(),gid))
-    x.execute("UPDATE jobs SET cancel_requested=1 WHERE group_id=? AND status='running' AND deleted=0",(gid,))
-    c.commit(); c.close(); return _ok()
+    with db() as c:
+        x=c.cursor(); x.execute("SELECT id FROM jobs WHERE group_id=? AND status='queued' AND deleted=0",(gid,))
+        scheduler.withdraw([r["id"] for r in x.fetchall()])
+    scheduler.flush()
+    with db() as c:
+        x=c.cursor()
+        x.execute("UPDATE jobs SET status='cancelled', cancel_requested=1, updated=? WHERE group_id=? AND status='queued' AND deleted=0",(now(),gid))
+        x.execute("UPDATE jobs SET cancel_requested=1 WHERE group_id=? AND status='running' AND deleted=0",(gid,))
+        rollup_refresh(x, [gid]); c.commit()
+        scheduler.sync(x, "group_id=?", (gid,))
+    return _ok()
 
 @app.post("/action/retry_job")
 def retry_job(id:int):
-    c=db();x=c.cursor();x.execute("UPDATE jobs SET status='queued', cancel_requested=0, deleted=0, updated=? WHERE id=?",(now(),id))
-    c.commit(); c.close(); return _ok()
+    with db() as c:
+        x=c.cursor();x.execute("UPDATE jobs SET status='queued', cancel_requested=0, deleted=0, updated=? WHERE id=?",(now(),id))
+        pool_retry_failed(x, "id=?", (id,))
+        rollup_refresh(x, job_gkeys(x,[id])); c.commit()
+        scheduler.sync_ids(x, [id])
+    return _ok()
 
 @app.post("/action/pause_job")
 def pause_job(id:int, mode:str="graceful"):
@@ -667,166 +1766,782 @@ def pause_job(id:int, mode:str="graceful"):
       - 'immediate': stop now
     cancel_requested: 0 none, 1 immediate, 2 graceful
     """
-    c=db(); x=c.cursor()
-    x.execute("SELECT status FROM jobs WHERE id=? AND deleted=0", (id,))
-    r=x.fetchone()
-    if not r:
-        c.close(); return _ok()
-    st = (r["status"] or "").lower()
-    if st == "queued":
-        x.execute("UPDATE jobs SET status='paused', updated=? WHERE id=?", (now(), id))
-    elif st == "running":
-        if mode == "immediate":
-            x.execute("UPDATE jobs SET cancel_requested=1, status='paused' WHERE id=?", (id,))
-        else:
-            x.execute("UPDATE jobs SET cancel_requested=2, status='paused' WHERE id=?", (id,))
-    c.commit(); c.close(); return _ok()
+    scheduler.withdraw([id]); scheduler.flush()   # as in cancel_job
+    with db() as c:
+        x=c.cursor()
+        x.execute("SELECT status,pool FROM jobs WHERE id=? AND deleted=0", (id,))
+        r=x.fetchone()
+        if not r: return _ok()
+        st = (r["status"] or "").lower()
+        if st == "queued" and not r["pool"]:
+            x.execute("UPDATE jobs SET status='paused', cancel_requested=1, updated=? WHERE id=?", (now(), id))
+        elif st in ("running", "queued"):
+            if mode == "immediate":
+                x.execute("UPDATE jobs SET cancel_requested=1, status='paused' WHERE id=?", (id,))
+            else:
+                x.execute("UPDATE jobs SET cancel_requested=2, status='paused' WHERE id=?", (id,))
+        rollup_refresh(x, job_gkeys(x,[id])); c.commit()
+        scheduler.sync_ids(x, [id])
+    return _ok()
 
 @app.post("/action/resume_job")
 def resume_job(id:int):
-    c=db(); x=c.cursor()
-    # requeue; clear cancel flag; detach from worker
-    x.execute("UPDATE jobs SET status='queued', cancel_requested=0, worker_id=NULL, updated=? WHERE id=?", (now(), id))
-    c.commit(); c.close(); return _ok()
+    with db() as c:
+        x=c.cursor()
+        # requeue; clear cancel flag; detach from worker
+        x.execute("UPDATE jobs SET status='queued', cancel_requested=0, worker_id=NULL, updated=? WHERE id=?", (now(), id))
+        rollup_refresh(x, job_gkeys(x,[id])); c.commit()
+        scheduler.sync_ids(x, [id])
+    return _ok()
 
 @app.post("/action/retry_failed_group")
 def retry_failed_group(gid:str):
-    c=db();x=c.cursor();x.execute("UPDATE jobs SET status='queued', cancel_requested=0, deleted=0, updated=? WHERE group_id=? AND status='failed'",(now(),gid))
-    c.commit(); c.close(); return _ok()
+    with db() as c:
+        x=c.cursor();x.execute("UPDATE jobs SET status='queued', cancel_requested=0, deleted=0, updated=? WHERE group_id=? AND status='failed'",(now(),gid))
+        pool_retry_failed(x, "group_id=? AND status='queued'", (gid,))
+        rollup_refresh(x, [gid]); c.commit()
+        scheduler.sync(x, "group_id=?", (gid,))
+    return _ok()
 
 @app.post("/action/delete_job")
 def delete_job(id:int):
-    c=db();x=c.cursor();x.execute("SELECT status FROM jobs WHERE id=?", (id,))
-    r=x.fetchone()
-    if not r: c.close(); return _ok()
-    st=(r["status"] or "").lower()
-    if st=="running":
-        # mark as deleted and request cancel; worker will stop and purge later
-        x.execute("UPDATE jobs SET deleted=1, cancel_requested=1 WHERE id=?", (id,))
-    else:
-        x.execute("DELETE FROM jobs WHERE id=?", (id,))
-        x.execute("DELETE FROM job_frames WHERE job_id=?", (id,))
-    c.commit(); c.close(); return _ok()
+    scheduler.withdraw([id]); scheduler.flush()
+    with db() as c:
+        x=c.cursor();x.execute("SELECT status FROM jobs WHERE id=?", (id,))
+        r=x.fetchone()
+        if not r: return _ok()
+        st=(r["status"] or "").lower(); keys=job_gkeys(x,[id])
+        if st=="running":
+            # mark as deleted and request cancel; worker will stop and purge later
+            x.execute("UPDATE jobs SET deleted=1, cancel_requested=1 WHERE id=?", (id,))
+        else:
+            x.execute("DELETE FROM jobs WHERE id=?", (id,))
+            drop_frames(x, "=?", (id,))
+        rollup_refresh(x, keys); c.commit()
+    return _ok()
 
 @app.post("/action/delete_group")
 def delete_group(gid:str):
-    c=db();x=c.cursor();x.execute("SELECT COUNT(1) AS n FROM jobs WHERE group_id=? AND status='running'", (gid,))
-    running=(x.fetchone() or {"n":0})["n"]
-    if running and running>0:
-        x.execute("UPDATE jobs SET deleted=1 WHERE group_id=?", (gid,))
-        x.execute("UPDATE jobs SET cancel_requested=1 WHERE group_id=? AND status='running'", (gid,))
-    else:
-        x.execute("DELETE FROM jobs WHERE group_id=?", (gid,))
-    c.commit(); c.close(); return _ok()
+    with db() as c:
+        x=c.cursor();x.execute("SELECT id FROM jobs WHERE group_id=?", (gid,)); scheduler.withdraw([r["id"] for r in x.fetchall()])
+    scheduler.flush()
+    with db() as c:
+        x=c.cursor()
+        x.execute("SELECT COUNT(1) AS n FROM jobs WHERE group_id=? AND status='running'", (gid,))
+        running=(x.fetchone() or {"n":0})["n"]
+        if running and running>0:
+            x.execute("UPDATE jobs SET deleted=1 WHERE group_id=?", (gid,))
+            x.execute("UPDATE jobs SET cancel_requested=1 WHERE group_id=? AND status='running'", (gid,))
+        else:
+            x.execute("DELETE FROM jobs WHERE group_id=?", (gid,))
+        rollup_refresh(x, [gid]); c.commit()
+    return _ok()
 
 @app.post("/purge_finished")
 def purge_finished(days:int=30):
     cutoff=now()-days*86400
-    c=db();x=c.cursor()
-    x.execute("DELETE FROM jobs WHERE updated<? AND status IN ('done','failed','cancelled')",(cutoff,))
-    x.execute("DELETE FROM job_frames WHERE job_id NOT IN (SELECT id FROM jobs)")
-    c.commit();c.close(); return _ok()
+    with db() as c:
+        x=c.cursor()
+        x.execute("DELETE FROM jobs WHERE updated<? AND status IN ('done','failed','cancelled')",(cutoff,))
+        drop_frames(x, "NOT IN (SELECT id FROM jobs)")
+        rollup_rebuild(x); c.commit(); prune_logs(x)
+    return _ok()
+
+def prune_logs(x):
+    x.execute("SELECT id FROM jobs"); logs.prune({r["id"] for r in x.fetchall()})
 
 @app.post("/purge_deleted")
 def purge_deleted():
-    c=db();x=c.cursor();x.execute("DELETE FROM jobs WHERE deleted=1 AND status!='running'")
-    x.execute("DELETE FROM job_frames WHERE job_id NOT IN (SELECT id FROM jobs)")
-    c.commit();c.close(); return _ok()
+    with db() as c:
+        x=c.cursor();x.execute("DELETE FROM jobs WHERE deleted=1 AND status!='running'")
+        drop_frames(x, "NOT IN (SELECT id FROM jobs)")
+        rollup_rebuild(x); c.commit(); prune_logs(x)
+    return _ok()
 
 # --------------- Worker lifecycle ---------------
 @app.post("/register_worker")
 def register_worker(payload:Dict[str,Any]):
     if payload.get("join_secret")!=JOIN_SECRET: raise HTTPException(401,"Invalid join secret")
     name=payload.get("name") or f"worker-{secrets.token_hex(3)}"; api_key=secrets.token_hex(16)
-    c=db();x=c.cursor()
-    try:
-        x.execute("INSERT INTO workers(name, api_key, last_seen) VALUES(?,?,?)",(name,api_key,now()))
-        c.commit(); wid=x.lastrowid
-    except sqlite3.IntegrityError:
-        x.execute("UPDATE workers SET api_key=?, last_seen=? WHERE name=?", (api_key,now(),name)); c.commit()
-        x.execute("SELECT id FROM workers WHERE name=?", (name,)); wid=x.fetchone()["id"]
-    c.close(); return {"worker_id":wid,"api_key":api_key}
+    try: slots=max(1,int(payload.get("slots") or 1))
+    except (TypeError,ValueError): slots=1
+    with db() as c:
+        x=c.cursor()
+        try:
+            x.execute("INSERT INTO workers(name, api_key, last_seen, slots) VALUES(?,?,?,?)",(name,api_key,now(),slots))
+            c.commit(); wid=x.lastrowid
+        except sqlite3.IntegrityError:
+            c.rollback()
+            x.execute("UPDATE workers SET api_key=?, last_seen=?, slots=? WHERE name=?", (api_key,now(),slots,name)); c.commit()
+            x.execute("SELECT id FROM workers WHERE name=?", (name,)); wid=x.fetchone()["id"]
+    release_worker(wid)
+    return {"worker_id":wid,"api_key":api_key}
+
+@app.get("/workers")
+def list_workers():
+    """Workers with their slot capacity and how many slots are busy (jobs + pool leases)."""
+    scheduler.flush(); ts=now()
+    with db() as c:
+        x=c.cursor()
+        x.execute("""SELECT w.id,w.name,w.slots,w.last_seen,
+                       (SELECT COUNT(1) FROM jobs j WHERE j.worker_id=w.id AND j.status='running' AND j.pool=0) AS jobs,
+                       (SELECT COUNT(1) FROM frame_leases l WHERE l.worker_id=w.id AND l.status='active') AS leases
+                     FROM workers w ORDER BY w.name""")
+        rows=x.fetchall(); speed=stats_get(x, "worker", [r["id"] for r in rows])
+    return JSONResponse([{"id":r["id"],"name":r["name"],"slots":r["slots"] or 1,"busy":r["jobs"]+r["leases"],
+                          "jobs":r["jobs"],"leases":r["leases"],"last_seen":r["last_seen"],
+                          "speed":stats_row(speed.get(str(r["id"]))),
+                          "online":ts-(r["last_seen"] or 0)<LEASE_TIMEOUT} for r in rows])
+
+def worker_capacity(x, wid:int)->int:
+    """Free render slots: slots minus running jobs and active leases."""
+    x.execute("""SELECT slots,
+                   (SELECT COUNT(1) FROM jobs WHERE worker_id=? AND status='running' AND pool=0) +
+                   (SELECT COUNT(1) FROM frame_leases WHERE worker_id=? AND status='active') AS busy
+                 FROM workers WHERE id=?""", (wid,wid,wid))
+    r=x.fetchone()
+    return (int(r["slots"] or 1)-r["busy"]) if r else 0
+
+# --------------- Frame pools (dynamic leasing) ---------------
+# A pool job (jobs.pool=1) is not split at submit time. Each claim leases the next run of
+# unrendered frames, sized from the job's measured seconds per frame so that a lease takes
+# about LEASE_TARGET seconds. The row stays 'queued' while unleased frames remain, so the
+# scheduler keeps handing it out; leases that stop being renewed return to the pool.
+LEASES_SHOWN = 200
+LEASE_PART_STATUS = {"active":"running","done":"done","failed":"failed"}
+
+def lease_size(x, j, worker_id:int)->int:
+    """Per-frame cost is the measured lease time (scene load included), else the per-frame
+    render stats, scaled by the worker's speed."""
+    per=float(j["frame_seconds"] or 0)
+    if per<=0: per=float((stats_get(x,"job",[j["id"]]).get(str(j["id"])) or {"ewma":0})["ewma"] or 0)
+    if per<=0: return LEASE_FIRST_FRAMES
+    per*=worker_speed(stats_get(x,"worker",[worker_id]).get(str(worker_id)))
+    return max(1,min(LEASE_MAX_FRAMES,int(LEASE_TARGET/per)))
+
+def pool_apply(x, j, st:FrameState, ts:float)->str:
+    """Derive a pool job's counters and status from its bitmap (paused/cancelled are kept)."""
+    done=st.total("done"); failed=st.total("failed"); running=st.total("running"); cur=(j["status"] or "").lower()
+    if cur in ("paused","cancelled"): status=cur
+    elif done>=st.count: status="done"
+    elif st.next_free_run(1): status="queued"
+    elif running: status="running"
+    else: status="failed"
+    x.execute("UPDATE jobs SET status=?, frame_total=?, frame_done=?, frame_failed=?, frame_running=?, updated=? WHERE id=?",
+              (status,st.count,done,failed,running,ts,j["id"]))
+    rollup_refresh(x, [gkey(j["group_id"],j["id"])])
+    return status
+
+def lease_frames(c:sqlite3.Connection, jid:int, worker_id:int):
+    """Lease the next free frames of pool job `jid` to `worker_id` and commit.
+    Returns (job dict narrowed to the lease, frames left to lease) or None."""
+    x=c.cursor(); v=next_version(x); ts=now()   # write first: bitmap read-modify-write under the lock
+    x.execute("SELECT * FROM jobs WHERE id=?", (jid,)); j=x.fetchone()
+    if not j or not j["pool"] or j["deleted"] or j["status"]!="queued": c.rollback(); return None
+    st=load_frames(x, jid); run=st.next_free_run(lease_size(x, j, worker_id))
+    if run:
+        frames=st.apply([list(run)],"running")
+        x.execute("""INSERT INTO frame_leases(job_id,worker_id,first_frame,last_frame,frames,status,created,expires)
+                     VALUES(?,?,?,?,?,'active',?,?)""", (jid,worker_id,run[0],run[1],len(frames),ts,ts+LEASE_TIMEOUT))
+        lid=x.lastrowid; save_frames(x, jid, st, v)
+        x.execute("UPDATE jobs SET worker_id=? WHERE id=?", (worker_id,jid))
+    left=pool_apply(x, j, st, ts)=="queued"
+    x.execute("UPDATE workers SET last_seen=? WHERE id=?", (ts,worker_id)); c.commit()
+    if not run: return None
+    job=dict(j); job.update(start_frame=run[0], end_frame=run[1], frame_total=len(frames), frame_done=0, frame_failed=0,
+                            frame_running=len(frames), status="running", worker_id=worker_id, updated=ts, lease_id=lid)
+    return job, left
+
+def lease_close(x, ls, j, st:FrameState, outcome:str, ts:float):
+    """Finish a lease. 'done' marks its frames done; otherwise unfinished frames go back to the
+    pool (failed ones count against the job's retries, then stay failed). The lease's
+    duration feeds the job's seconds-per-frame estimate. Returns (done, failed) frames set.
+    A speculative copy owns no frames (its part's worker does): closing it changes nothing else."""
+    state={"done":"done","failed":"failed","expired":"expired"}.get(outcome,"released")
+    if ls["spec"]:
+        x.execute("UPDATE frame_leases SET status=?, finished=? WHERE id=?", (state,ts,ls["id"]))
+        if int(j["cancel_requested"] or 0)==SPEC_HANDOVER and st.total("done")<st.count:   # the original already stopped
+            x.execute("UPDATE jobs SET status='queued', cancel_requested=0, worker_id=NULL, frame_running=0, updated=? WHERE id=?", (ts,j["id"]))
+            rollup_refresh(x, [gkey(j["group_id"],j["id"])])
+        return [], []
+    span=range(ls["first_frame"], ls["last_frame"]+1, st.step)
+    todo=[fr for fr in span if not st.test("done",fr)]; done:List[int]=[]; failed:List[int]=[]
+    if outcome=="done": new="done"
+    elif outcome=="failed" and not j["cancel_requested"]:
+        new="failed" if int(j["retries"] or 0)>=int(j["max_retries"] or 0) else "queued"
+        if new=="queued": x.execute("UPDATE jobs SET retries=retries+1 WHERE id=?", (j["id"],))
+    else: new="queued"
+    for fr in todo:
+        if st.test("running",fr) or new!="queued": st.set(fr,new)
+        if new=="done": done.append(fr)
+        elif new=="failed": failed.append(fr)
+    rendered=sum(st.test("done",fr) for fr in span)
+    if rendered and outcome=="done":
+        per=(ts-ls["created"])/rendered
+        x.execute("UPDATE jobs SET frame_seconds=CASE WHEN frame_seconds IS NULL THEN ? ELSE frame_seconds*0.7+?*0.3 END WHERE id=?",
+                  (per,per,j["id"]))
+    x.execute("UPDATE frame_leases SET status=?, finished=? WHERE id=?", (state,ts,ls["id"]))
+    return done, failed
+
+def lease_update(jid:int, lid:int, status:str)->Dict[str,Any]:
+    """job_update for one lease: renews it while running; a final status closes it."""
+    ts=now(); done:List[int]=[]; failed:List[int]=[]
+    with db() as c:
+        x=c.cursor(); v=next_version(x)
+        x.execute("SELECT * FROM frame_leases WHERE id=? AND job_id=?", (lid,jid)); ls=x.fetchone()
+        x.execute("SELECT * FROM jobs WHERE id=?", (jid,)); j=x.fetchone()
+        if not ls or not j: raise HTTPException(404,"lease not found")
+        # a lease that was closed under the worker (expired, job purged) must stop rendering
+        cr=int(j["cancel_requested"] or 0) if ls["status"]=="active" else 1
+        if cr==SPEC_HANDOVER: cr=0   # addressed to the original; this copy renders on
+        st=load_frames(x, jid)
+        closed=ls["status"]=="active" and status in ("done","failed","paused","cancelled")
+        if closed:
+            done,failed=lease_close(x, ls, j, st, status, ts); save_frames(x, jid, st, v, done, failed)
+            if ls["spec"] and status=="done" and st.total("done")>=st.count: spec_won(x, j, st, ts)
+        elif ls["status"]=="active":
+            x.execute("UPDATE frame_leases SET expires=? WHERE id=?", (ts+LEASE_TIMEOUT,lid))
+        x.execute("SELECT * FROM jobs WHERE id=?", (jid,)); j=x.fetchone()
+        pool_status=pool_apply(x, j, st, ts) if j["pool"] else j["status"]; c.commit()
+        if closed and (j["pool"] or ls["spec"]): scheduler.sync_ids(x, [jid])
+    return {"cancel":cr,"status":pool_status,"frame_done":st.total("done"),"frame_failed":st.total("failed"),
+            "frame_total":st.count,"done":done,"failed":failed,"group_id":j["group_id"]}
+
+def expire_leases()->List[int]:
+    """Return the frames of leases not renewed within LEASE_TIMEOUT to their pools."""
+    ts=now()
+    with db() as c:
+        x=c.cursor(); x.execute("SELECT * FROM frame_leases WHERE status='active' AND expires<?", (ts,)); rows=x.fetchall()
+        if not rows: return []
+        v=next_version(x); ids=sorted({r["job_id"] for r in rows})
+        x.execute(f"SELECT * FROM jobs WHERE id IN ({','.join('?'*len(ids))})", ids); jobs={r["id"]:r for r in x.fetchall()}
+        states=load_frames_many(x, ids)
+        for r in rows:
+            if r["job_id"] in jobs: lease_close(x, r, jobs[r["job_id"]], states[r["job_id"]], "expired", ts)
+        for jid in jobs:
+            save_frames(x, jid, states[jid], v)
+            if jobs[jid]["pool"]: pool_apply(x, jobs[jid], states[jid], ts)
+        c.commit(); scheduler.sync_ids(x, ids)
+    print(f"[server] reaper returned leases {[r['id'] for r in rows]} to their pools")
+    return [r["id"] for r in rows]
+
+# --------------- Speculative copies ---------------
+# When a worker comes up idle (nothing left to claim) and a chunked part is projected to
+# finish far behind its siblings, the idle worker gets a spec lease on the back of the part's
+# remaining frames, split by the two machines' speeds and never the frame the original is on
+# (same outputs, so either render's frames count for both). When the original has done every
+# frame before the copy's first, it is told SPEC_HANDOVER and stops; the copy's lease then
+# finishes the part, or requeues it if it fails. Once all frames are done, by whichever
+# render, the part is done and the other render is cancelled.
+def _spec_candidate(x, worker_id:int)->Optional[tuple]:
+    """The worst straggler a copy on `worker_id` would beat -> (job row, copy's first frame, its frame count), or None."""
+    speed=worker_speed(stats_get(x, "worker", [worker_id]).get(str(worker_id)))
+    x.execute("""SELECT * FROM jobs j WHERE status='running' AND deleted=0 AND pool=0 AND cancel_requested=0
+                   AND group_id IS NOT NULL AND worker_id<>? AND eta_seconds>=?
+                   AND NOT EXISTS (SELECT 1 FROM frame_leases l WHERE l.job_id=j.id AND l.status='active')
+                 ORDER BY eta_seconds DESC LIMIT 20""", (worker_id,SPEC_MIN_SECONDS))
+    for j in x.fetchall():
+        x.execute("SELECT status,eta_seconds FROM jobs WHERE group_id=? AND id<>? AND deleted=0", (j["group_id"],j["id"]))
+        sib=sorted(0.0 if r["status"]=="done" else r["eta_seconds"] for r in x.fetchall()
+                   if r["status"]=="done" or (r["status"]=="running" and r["eta_seconds"] is not None))
+        if not sib or j["eta_seconds"]<SPEC_FACTOR*sib[len(sib)//2]: continue
+        st=load_frames(x, j["id"]); todo=st.missing()
+        if len(todo)<3: continue   # the original keeps the frame it is on and the next
+        grp=stats_get(x, "group", [j["group_id"]]).get(j["group_id"])
+        mine=(grp["mean"] if grp else j["eta_seconds"]/len(todo))*speed; theirs=j["eta_seconds"]/len(todo)
+        keep=min(len(todo)-1, max(2, math.ceil(len(todo)*mine/(mine+theirs))))   # both halves end together
+        if max(keep*theirs, (len(todo)-keep)*mine)>SPEC_GAIN*j["eta_seconds"]: continue
+        return j,todo[keep],len(todo)-keep
+    return None
+
+def spec_claim(worker_id:int)->Optional[Dict[str,Any]]:
+    """Lease a speculative copy of the worst straggler to `worker_id`, if one pays off.
+    Looked for with a plain read first; only a hit takes the write lock and checks again."""
+    with db() as c:
+        if _spec_candidate(c.cursor(), worker_id) is None: return None
+    scheduler.flush(); ts=now()   # claims still in write-behind are running parts too
+    with db() as c:
+        x=c.cursor(); v=next_version(x)   # write lock: one copy per part even with concurrent idle workers
+        hit=_spec_candidate(x, worker_id)
+        if hit is None: c.rollback(); return None
+        j,first,n=hit
+        x.execute("""INSERT INTO frame_leases(job_id,worker_id,first_frame,last_frame,frames,status,created,expires,spec)
+                     VALUES(?,?,?,?,?,'active',?,?,1)""", (j["id"],worker_id,first,j["end_frame"],n,ts,ts+LEASE_TIMEOUT))
+        lid=x.lastrowid; x.execute("UPDATE job_groups SET version=? WHERE gkey=?", (v,j["group_id"])); c.commit()
+    print(f"[server] speculative copy of job {j['id']} frames {first}-{j['end_frame']} (eta {j['eta_seconds']:.0f}s) → worker {worker_id}, lease {lid}")
+    job=dict(j); job.update(start_frame=first, frame_total=n, frame_done=0, frame_failed=0, frame_running=1,
+                            worker_id=worker_id, updated=ts, lease_id=lid, spec=1)
+    return job
+
+def spec_progress(x, states:Dict[int,FrameState], ts:float):
+    """After frame updates: hand a part over to its copy once the original has done every frame
+    before the copy's first (SPEC_HANDOVER; worker_id is cleared so the original's slot frees up),
+    and finish a part whose frames are all done, closing the copy."""
+    if not states: return
+    x.execute(f"""SELECT l.first_frame,l.status AS lease,j.id,j.group_id,j.cancel_requested FROM frame_leases l JOIN jobs j ON j.id=l.job_id
+                  WHERE l.spec=1 AND l.status IN ('active','done') AND j.status='running' AND j.id IN ({','.join('?'*len(states))})
+                  ORDER BY l.status='active'""", list(states))
+    for r in {r["id"]:r for r in x.fetchall()}.values():   # the active lease, if any, wins
+        st=states[r["id"]]
+        if st.total("done")>=st.count:
+            spec_won(x, r, st, ts)
+            x.execute("UPDATE frame_leases SET status='released', finished=? WHERE job_id=? AND status='active' AND spec=1", (ts,r["id"]))
+        elif r["lease"]=="active" and not r["cancel_requested"] and st.first_missing()>=r["first_frame"]:
+            x.execute("UPDATE jobs SET cancel_requested=?, worker_id=NULL, frame_running=0 WHERE id=?", (SPEC_HANDOVER,r["id"]))
+            print(f"[server] job {r['id']} reached frame {r['first_frame']}: its speculative copy renders the rest")
+
+def spec_won(x, j, st:FrameState, ts:float):
+    """The part's frames are all done: mark it done and cancel whichever render is still on it."""
+    x.execute("""UPDATE jobs SET status='done', frame_total=?, frame_done=?, frame_failed=0, frame_running=0, eta_seconds=0,
+                 cancel_requested=1, updated=? WHERE id=?""", (st.count,st.count,ts,j["id"]))
+    rollup_refresh(x, [gkey(j["group_id"],j["id"])])
+    print(f"[server] job {j['id']} finished with its speculative copy; cancelling the other render")
+
+def pool_retry_failed(x, where:str, args=()):
+    """Retry on a pool job: its failed frames go back into the pool with fresh retries."""
+    x.execute(f"SELECT * FROM jobs WHERE pool=1 AND {where}", args); rows=x.fetchall()
+    if not rows: return
+    v=next_version(x); ts=now(); states=load_frames_many(x, [r["id"] for r in rows])
+    for r in rows:
+        st=states[r["id"]]
+        for fr in st.frames("failed"): st.set(fr,"queued")
+        save_frames(x, r["id"], st, v); x.execute("UPDATE jobs SET retries=0 WHERE id=?", (r["id"],)); pool_apply(x, r, st, ts)
+
+# Single UPDATE ... RETURNING: the row selection and the status flip happen in one
+# statement under SQLite's write lock, so two workers can never claim the same job.
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3,35,0)
+MAX_CLAIM_BATCH = 16
+
+def claim_jobs(c:sqlite3.Connection, worker_id:int, count:int=1)->List[Dict[str,Any]]:
+    """Atomically move up to `count` queued jobs to running for `worker_id` and commit."""
+    n=max(1,min(MAX_CLAIM_BATCH,int(count or 1))); ts=now(); x=c.cursor()
+    if HAS_RETURNING:
+        x.execute("""UPDATE jobs SET status='running', worker_id=?, updated=?, cancel_requested=0
+                     WHERE id IN (SELECT id FROM jobs WHERE status='queued' AND deleted=0 AND pool=0
+                                  ORDER BY priority DESC, id ASC LIMIT ?)
+                     RETURNING *""", (worker_id,ts,n))
+        jobs=[dict(r) for r in x.fetchall()]
+    else:
+        # old SQLite: take the write lock first so select+update cannot interleave
+        if c.in_transaction: c.commit()
+        x.execute("BEGIN IMMEDIATE")
+        x.execute("SELECT id FROM jobs WHERE status='queued' AND deleted=0 AND pool=0 ORDER BY priority DESC, id ASC LIMIT ?", (n,))
+        ids=[r["id"] for r in x.fetchall()]; jobs=[]
+        if ids:
+            q=",".join("?"*len(ids))
+            x.execute(f"UPDATE jobs SET status='running', worker_id=?, updated=?, cancel_requested=0 WHERE id IN ({q})", (worker_id,ts,*ids))
+            x.execute(f"SELECT * FROM jobs WHERE id IN ({q})", ids); jobs=[dict(r) for r in x.fetchall()]
+    x.execute("UPDATE workers SET last_seen=? WHERE id=?", (ts,worker_id))
+    rollup_claimed(x, jobs, ts)
+    c.commit()
+    while len(jobs)<n:   # then leases from frame pools
+        x.execute("SELECT id FROM jobs WHERE status='queued' AND deleted=0 AND pool=1 ORDER BY priority DESC, id ASC LIMIT 1")
+        r=x.fetchone()
+        if not r: break
+        got=lease_frames(c, r["id"], worker_id)
+        if got: jobs.append(got[0])
+    jobs.sort(key=lambda j:(-(j.get("priority") or 0), j["id"]))
+    return jobs
+
+def rollup_claimed(x, jobs, ts:float):
+    rollup_refresh(x, {gkey(None,j["id"]) for j in jobs if not j.get("group_id")})
+    for g in {j["group_id"] for j in jobs if j.get("group_id")}: rollup_delta(x, g, 0,0,0,0, ts)
+
+class Scheduler:
+    """In-process ready queue: a heap of (-priority, id) over queued jobs with lazy deletion,
+    restored from SQLite at startup. Claims pop the heap in O(log n) under a lock, so a job
+    is handed out once; the status change is persisted by a write-behind thread. SQLite
+    stays the authority: a popped job whose row is no longer queued is skipped.
+    Anything that moves jobs into or out of 'queued' calls sync() after committing, which
+    also wakes long-polling /next_job requests (one per newly queued job)."""
+    def __init__(self, enabled:bool):
+        self.enabled=enabled; self.lock=threading.Lock(); self.heap:List[tuple]=[]; self.ready:Dict[int,int]={}
+        self.inflight:Dict[int,tuple]={}; self.seen:Dict[int,float]={}
+        self.withdrawn:set=set()   # cancelled while a claim may hold them between pop and hand-out
+        self.reserved:set=set(); self.resync:Dict[int,int]={}   # popped by a running claim; pushes seen meanwhile
+        self.flush_lock=threading.Lock(); self.wake=threading.Event(); self.thread=None
+        self.waiters:deque=deque()   # (loop, asyncio.Event) of parked /next_job requests, FIFO
+    def load(self):
+        if not self.enabled: return
+        with db() as c:
+            x=c.cursor(); x.execute("SELECT id,priority FROM jobs WHERE status='queued' AND deleted=0")
+            rows=x.fetchall()
+        with self.lock:
+            self.ready={r["id"]:int(r["priority"] or 0) for r in rows}
+            self.heap=[(-p,i) for i,p in self.ready.items()]; heapq.heapify(self.heap)
+    def _push(self, jid:int, prio:int):
+        self.withdrawn.discard(jid)
+        if jid in self.reserved: self.resync[jid]=prio; return   # the claim holding it re-pushes it if it lets go
+        if jid in self.inflight or self.ready.get(jid)==prio: return
+        self.ready[jid]=prio; heapq.heappush(self.heap,(-prio,jid))
+    def sync(self, x, where:str, args=()):
+        """Re-read the matching jobs (after commit) and add/remove them from the ready queue."""
+        x.execute(f"SELECT id,priority,status,deleted FROM jobs WHERE {where}", args); rows=x.fetchall()
+        queued=[r for r in rows if r["status"]=="queued" and not r["deleted"]]
+        if self.enabled:
+            with self.lock:
+                for r in rows:
+                    if r["status"]=="queued" and not r["deleted"]: self._push(r["id"], int(r["priority"] or 0))
+                    else: self.ready.pop(r["id"],None); self.resync.pop(r["id"],None)
+        self.notify(len(queued))
+    def notify(self, n:int):
+        with self.lock:
+            for _ in range(min(n,len(self.waiters))):
+                loop,ev=self.waiters.popleft()
+                try: loop.call_soon_threadsafe(ev.set)
+                except RuntimeError: pass   # loop already closed
+    async def wait(self, ev:asyncio.Event, timeout:float):
+        try: await asyncio.wait_for(ev.wait(), timeout)
+        except asyncio.TimeoutError: pass
+    def park(self)->asyncio.Event:
+        ev=asyncio.Event()
+        with self.lock: self.waiters.append((asyncio.get_running_loop(),ev))
+        return ev
+    def unpark(self, ev:asyncio.Event):
+        with self.lock:
+            for w in list(self.waiters):
+                if w[1] is ev: self.waiters.remove(w)
+    def sync_ids(self, x, ids):
+        ids=[int(i) for i in ids if i]
+        if ids: self.sync(x, f"id IN ({','.join('?'*len(ids))})", ids)
+    def pending_for(self, worker_id:int)->int:
+        with self.lock: return sum(1 for w,_,_ in self.inflight.values() if w==worker_id)
+    def withdraw(self, ids):
+        """Before cancelling queued jobs: no claim hands them out from here on, including one
+        that already popped them (its claims not yet recorded are dropped)."""
+        if not self.enabled: return
+        with self.lock:
+            for i in map(int,ids):
+                self.ready.pop(i,None); self.resync.pop(i,None)
+                if i in self.reserved: self.withdrawn.add(i)
+    def pending(self, jid:int)->bool:
+        with self.lock: return jid in self.inflight
+    def _pop(self, n:int)->List[int]:
+        """Pop up to n ready ids and reserve them: until the claim releases them, sync() cannot
+        put them back in the queue (the row still reads 'queued' until the write-behind)."""
+        out=[]
+        with self.lock:
+            while self.heap and len(out)<n:
+                p,jid=heapq.heappop(self.heap)
+                if self.ready.get(jid)==-p: del self.ready[jid]; out.append(jid); self.reserved.add(jid)
+        return out
+    def claim(self, worker_id:int, count:int=1)->List[Dict[str,Any]]:
+        n=max(1,min(MAX_CLAIM_BATCH,int(count or 1))); ts=now(); jobs:List[Dict[str,Any]]=[]
+        popped:List[int]=[]; requeue:Dict[int,int]={}
+        with self.lock: self.seen[worker_id]=ts
+        try:
+            while len(jobs)<n:
+                ids=self._pop(n-len(jobs))
+                if not ids: break
+                popped+=ids
+                with db() as c:
+                    x=c.cursor(); x.execute(f"SELECT * FROM jobs WHERE id IN ({','.join('?'*len(ids))})", ids)
+                    rows=[dict(r) for r in x.fetchall()]
+                for j in rows:
+                    if j["status"]!="queued" or j["deleted"]: continue   # stale heap entry
+                    if j["pool"]:
+                        # leases are persisted at once (not write-behind); requeue while frames remain
+                        with db() as c: got=lease_frames(c, j["id"], worker_id)
+                        if got: jobs.append(got[0])
+                        if got and got[1]: requeue[j["id"]]=int(j["priority"] or 0)
+                        continue
+                    j.update(status="running", worker_id=worker_id, updated=ts, cancel_requested=0); jobs.append(j)
+        finally:
+            with self.lock:
+                if self.withdrawn:
+                    gone=[j for j in jobs if not j.get("lease_id") and j["id"] in self.withdrawn]
+                    for j in gone: jobs.remove(j)
+                for j in jobs:
+                    if not j.get("lease_id"): self.inflight[j["id"]]=(worker_id,ts,j.get("group_id")); self.resync.pop(j["id"],None)
+                for jid in popped:   # handed out: inflight until the flush; otherwise back to sync's say
+                    self.reserved.discard(jid); prio=self.resync.pop(jid,None)
+                    if jid in self.withdrawn: self.withdrawn.discard(jid)
+                    elif jid in requeue: self._push(jid, requeue[jid])
+                    elif prio is not None and jid not in self.inflight: self._push(jid, prio)
+        self._kick()
+        jobs.sort(key=lambda j:(-(j.get("priority") or 0), j["id"]))
+        return jobs
+    def _kick(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread=threading.Thread(target=self._run, name="elara-write-behind", daemon=True); self.thread.start()
+        self.wake.set()
+    def _run(self):
+        while True:
+            self.wake.wait(); time.sleep(WRITE_BEHIND_INTERVAL); self.wake.clear()
+            try: self.flush()
+            except Exception as e: print("[server] write-behind error:", e)
+    def flush(self):
+        """Persist pending claims and worker last_seen stamps (also called before actions read status)."""
+        if not self.enabled: return
+        with self.flush_lock:
+            with self.lock:
+                claims=dict(self.inflight); seen=self.seen; self.seen={}
+            if not claims and not seen: return
+            with db() as c:
+                x=c.cursor()
+                x.executemany("""UPDATE jobs SET status='running', worker_id=?, updated=?, cancel_requested=0
+                                 WHERE id=? AND status='queued' AND deleted=0""", [(w,ts,jid) for jid,(w,ts,_) in claims.items()])
+                x.executemany("UPDATE workers SET last_seen=? WHERE id=?", [(ts,w) for w,ts in seen.items()])
+                if claims:
+                    rollup_claimed(x, [{"id":jid,"group_id":g} for jid,(_,_,g) in claims.items()], max(ts for _,ts,_ in claims.values()))
+                c.commit()
+            with self.lock:
+                for jid in claims: self.inflight.pop(jid,None)
+
+scheduler=Scheduler(SCHEDULER_MODE=="memory")
+scheduler.load()
+
+def _claim(worker_id:int, count:int)->Optional[List[Dict[str,Any]]]:
+    """Claim up to `count` jobs for the worker's free slots; None when it has no free slot."""
+    if scheduler.pending_for(worker_id): scheduler.flush()   # its last claims must count as running
+    with db() as c: free=worker_capacity(c.cursor(), worker_id)
+    if free<=0: return None   # every slot of this worker is busy
+    count=min(int(count or 1), free)
+    if scheduler.enabled: jobs=scheduler.claim(worker_id, count)
+    else:
+        with db() as c: jobs=claim_jobs(c, worker_id, count)
+    if len(jobs)<count and SPECULATE:   # nothing else to do: help a straggler
+        spec=spec_claim(worker_id)
+        if spec: jobs.append(spec)
+    if jobs:
+        # frames already recorded (e.g. by a worker that died) so the rerun resumes instead of restarting
+        with db() as c: states=load_frames_many(c.cursor(), [j["id"] for j in jobs])
+        for j in jobs:
+            st=states.get(j["id"]); j["frames_done"]=st.ranges("done") if st else []
+    return jobs
 
 @app.get("/next_job")
-def next_job(worker_id:int, api_key:str):
-    worker_from_auth(worker_id, api_key)
-    c=db();x=c.cursor();x.execute("SELECT * FROM jobs WHERE status='queued' AND deleted=0 ORDER BY priority DESC, id ASC LIMIT 1")
-    row=x.fetchone()
-    if not row:
-        x.execute("UPDATE workers SET last_seen=? WHERE id=?", (now(),worker_id)); c.commit(); c.close()
-        return JSONResponse({"job":None})
-    jid=row["id"]; x.execute("UPDATE jobs SET status='running', worker_id=?, updated=?, cancel_requested=0 WHERE id=?",(worker_id,now(),jid))
-    c.commit(); x.execute("SELECT * FROM jobs WHERE id=?", (jid,)); job=dict(x.fetchone()); c.close()
-    return {"job":job}
+async def next_job(worker_id:int, api_key:str, count:int=1, wait:float=0):
+    """count>1 lets a multi-slot worker claim several chunks in one round-trip.
+    wait>0 long-polls: an empty queue parks the request (up to ELARA_LONG_POLL_MAX s)
+    until a job is queued, instead of the worker re-polling. A worker with no free slot is
+    answered at once, never parked."""
+    await run_in_threadpool(worker_from_auth, worker_id, api_key)
+    deadline=time.monotonic()+min(max(0.0,float(wait or 0)),LONG_POLL_MAX); woken=False
+    while True:
+        ev=scheduler.park()   # park before claiming so a job queued in between still wakes us
+        try:
+            jobs=await run_in_threadpool(_claim, worker_id, count)
+            left=deadline-time.monotonic()
+            if jobs is None or jobs or left<=0: break
+            await scheduler.wait(ev, left); woken=ev.is_set()
+        finally: scheduler.unpark(ev)
+    if jobs is None:   # no free slot: a wakeup taken meanwhile belongs to a worker that can claim
+        scheduler.notify(woken+ev.is_set()); jobs=[]
+    if count and int(count)>1: return {"job":jobs[0] if jobs else None,"jobs":jobs}
+    return {"job":jobs[0] if jobs else None}
 
 @app.post("/job_update")
 async def job_update(payload:Dict[str,Any]):
-    worker_from_auth(payload.get("worker_id"), payload.get("api_key"))
+    await run_in_threadpool(worker_from_auth, payload.get("worker_id"), payload.get("api_key"))
+    r=await run_in_threadpool(apply_job_update, payload)
+    if r.get("frames"): frame_events.add(*r["frames"], worker_id=payload.get("worker_id"))
+    if r["event"]: await bus.publish("job", {**r["event"], "worker_id":payload.get("worker_id")})
+    return {"ok":True,"cancel":r["cancel"]}
+
+def apply_job_update(payload:Dict[str,Any])->Dict[str,Any]:
+    """One job (or pool lease) status update -> {"cancel": code, "event": bus data, "frames": frame_events.add args or None}."""
     jid=payload.get("job_id"); 
     if not jid: raise HTTPException(400,"job_id required")
     status=payload.get("status"); log_tail=payload.get("log_tail",None)
     ft=payload.get("frame_total"); fd=payload.get("frame_done"); ff=payload.get("frame_failed"); fr=payload.get("frame_running")
     eta=payload.get("eta_seconds"); err=payload.get("error_inc")
-
-    c=db();x=c.cursor();x.execute("""SELECT status,retries,max_retries,cancel_requested,
-                                     frame_total,frame_done,frame_failed,frame_running,error_count
-                                     FROM jobs WHERE id=?""",(jid,))
-    row=x.fetchone(); 
-    if not row: c.close(); raise HTTPException(404,"job not found")
-
-    def ival(v,d):
-        try:
-            if v is None: return d
-            return int(v)
-        except:
-            return d
-    new_total=ival(ft, row["frame_total"] or 0); new_done=ival(fd, row["frame_done"] or 0)
-    new_fail=ival(ff, row["frame_failed"] or 0); new_run=ival(fr, row["frame_running"] or 0)
-    hi=new_total if new_total>0 else 999999
-    new_done=max(0,min(hi,new_done)); new_fail=max(0,min(hi,new_fail)); new_run=max(0,min(hi,new_run))
-
-    cur_status = (row["status"] or "").lower()
-    cancel_req_int = int(row["cancel_requested"] or 0)
-    cancel_req = (cancel_req_int != 0)
-
-    # Keep explicit paused/cancelled stable against worker's 'running/failed' while cancel is requested
-    if cancel_req and (status or "").lower() in ("running","failed"):
-        if cur_status in ("paused","cancelled"):
-            status = cur_status
-
-    sets=["updated=?"]; vals=[now()]
-    if status:
-        if cur_status in ("paused","cancelled") and (status or "").lower()=="running":
-            pass  # ignore running while paused/cancelled
-        else:
-            sets.append("status=?"); vals.append(status)
-
-    # Do not clear cancel_requested here; worker must read it.
-
-    if log_tail is not None: sets.append("log_tail=?"); vals.append((log_tail or "")[-4000:])
-    sets+=["frame_total=?","frame_done=?","frame_failed=?","frame_running=?"]; vals+=[new_total,new_done,new_fail,new_run]
-    if eta is not None:
-        try: eta_f=float(eta); sets.append("eta_seconds=?"); vals.append(eta_f)
-        except: pass
-    if err:
-        try: inc=int(err); cur=int(row["error_count"] or 0); sets.append("error_count=?"); vals.append(cur+inc)
-        except: pass
-
-    vals.append(jid); x.execute(f"UPDATE jobs SET {', '.join(sets)} WHERE id=?", vals); c.commit()
-
-    # auto-retry if failed (only when not user-cancelled)
-    if (status or "").lower()=="failed" and not cancel_req:
-        retries=int(row["retries"] or 0); maxr=int(row["max_retries"] or 0)
-        if retries<maxr:
-            x.execute("UPDATE jobs SET status='queued', retries=?, updated=?, worker_id=NULL WHERE id=?", (retries+1, now(), jid))
-            c.commit()
-
-    x.execute("SELECT cancel_requested FROM jobs WHERE id=?", (jid,))
-    cr = int((x.fetchone() or {"cancel_requested":0})["cancel_requested"] or 0)
-    c.close()
-
-    await bus.publish("job", {"job_id":jid,"status":status,"frame_done":new_done,"frame_failed":new_fail,"frame_total":new_total})
-    return {"ok":True,"cancel":cr}
+    if payload.get("lease_id"):
+        r=lease_update(int(jid), int(payload["lease_id"]), (status or "").lower())
+        return {"cancel":r["cancel"],"frames":(int(jid),r["done"],r["failed"],None,r["group_id"]) if r["done"] or r["failed"] else None,
+                "event":{"job_id":jid,"group_id":r["group_id"],"status":r["status"],"frame_done":r["frame_done"],"frame_failed":r["frame_failed"],
+                         "frame_total":r["frame_total"]}}
+
+    if scheduler.pending(int(jid)): scheduler.flush()   # its claim must be on record before the job moves on
+    with db() as c:
+        x=c.cursor();x.execute("""SELECT status,retries,max_retries,cancel_requested,group_id,
+                                  frame_total,frame_done,frame_failed,frame_running,error_count
+                                  FROM jobs WHERE id=?""",(jid,))
+        row=x.fetchone()
+        if not row: raise HTTPException(404,"job not found")
+
+        def ival(v,d):
+            try:
+                if v is None: return d
+                return int(v)
+            except:
+                return d
+        new_total=ival(ft, row["frame_total"] or 0); new_done=ival(fd, row["frame_done"] or 0)
+        new_fail=ival(ff, row["frame_failed"] or 0); new_run=ival(fr, row["frame_running"] or 0)
+        hi=new_total if new_total>0 else 999999
+        new_done=max(0,min(hi,new_done)); new_fail=max(0,min(hi,new_fail)); new_run=max(0,min(hi,new_run))
+
+        cur_status = (row["status"] or "").lower()
+        cancel_req_int = int(row["cancel_requested"] or 0)
+        cancel_req = (cancel_req_int != 0)
+        if cur_status=="done" and cancel_req:   # a speculative copy finished it first: nothing left to report
+            return {"cancel":cancel_req_int,"frames":None,"event":None}
+        if cancel_req_int==SPEC_HANDOVER:   # the original, stopped for its copy: the copy's lease reports from here
+            return {"cancel":cancel_req_int,"frames":None,"event":None}
+
+        # Keep explicit paused/cancelled stable against worker's 'running/failed' while cancel is requested
+        if cancel_req and (status or "").lower() in ("running","failed"):
+            if cur_status in ("paused","cancelled"):
+                status = cur_status
+        if cur_status=="cancelled": status=None   # only a retry (re-queue) leaves 'cancelled'
+
+        ts=now(); sets=["updated=?"]; vals=[ts]
+        if status:
+            if cur_status in ("paused","cancelled") and (status or "").lower()=="running":
+                pass  # ignore running while paused/cancelled
+            else:
+                sets.append("status=?"); vals.append(status)
+
+        # Do not clear cancel_requested here; worker must read it.
+
+        if log_tail is not None: sets.append("log_tail=?"); vals.append((log_tail or "")[-4000:])
+        sets+=["frame_total=?","frame_done=?","frame_failed=?","frame_running=?"]; vals+=[new_total,new_done,new_fail,new_run]
+        if eta is not None:
+            try: eta_f=float(eta); sets.append("eta_seconds=?"); vals.append(eta_f)
+            except: pass
+        if err:
+            try: inc=int(err); cur=int(row["error_count"] or 0); sets.append("error_count=?"); vals.append(cur+inc)
+            except: pass
+
+        vals.append(jid); x.execute(f"UPDATE jobs SET {', '.join(sets)} WHERE id=?", vals)
+        if (status or "").lower()=="done":   # finished before its speculative copy: that one stops
+            x.execute("UPDATE frame_leases SET status='released', finished=? WHERE job_id=? AND status='active' AND spec=1", (ts,jid))
+
+        # auto-retry if failed (only when not user-cancelled)
+        requeued=False
+        if (status or "").lower()=="failed" and not cancel_req:
+            retries=int(row["retries"] or 0); maxr=int(row["max_retries"] or 0)
+            if retries<maxr:
+                x.execute("UPDATE jobs SET status='queued', retries=?, updated=?, worker_id=NULL WHERE id=?", (retries+1, ts, jid))
+                requeued=True
+
+        if row["group_id"]:
+            rollup_delta(x, row["group_id"], new_total-(row["frame_total"] or 0), new_done-(row["frame_done"] or 0),
+                         new_fail-(row["frame_failed"] or 0), new_run-(row["frame_running"] or 0), ts)
+        else: rollup_refresh(x, [gkey(None,jid)])
+        c.commit()
+        if requeued: scheduler.sync_ids(x, [jid])
+
+        x.execute("SELECT cancel_requested FROM jobs WHERE id=?", (jid,))
+        cr = int((x.fetchone() or {"cancel_requested":0})["cancel_requested"] or 0)
+
+    return {"cancel":cr,"frames":None,
+            "event":{"job_id":jid,"group_id":row["group_id"],"status":status,"frame_done":new_done,"frame_failed":new_fail,"frame_total":new_total}}
+
+@app.post("/heartbeat")
+def heartbeat(payload:Dict[str,Any]):
+    """Liveness ping, separate from job updates. Returns cancel codes for the listed jobs."""
+    wid=payload.get("worker_id"); worker_from_auth(wid, payload.get("api_key"))
+    return {"ok":True,"cancel":touch_worker(wid, payload.get("job_ids"))}
+
+def touch_worker(wid:int, job_ids)->Dict[str,int]:
+    """Mark the worker alive, renew its leases, free lost slots; cancel codes of `job_ids`."""
+    ids=[int(i) for i in (job_ids or []) if str(i).isdigit()]
+    with db() as c:
+        x=c.cursor(); ts=now(); x.execute("UPDATE workers SET last_seen=? WHERE id=?", (ts,wid))
+        x.execute("UPDATE frame_leases SET expires=? WHERE worker_id=? AND status='active'", (ts+LEASE_TIMEOUT,wid))
+        # running on this worker per the DB, but neither reported nor updated for a while: lost, free the slot
+        x.execute("SELECT id,deleted FROM jobs WHERE worker_id=? AND status='running' AND pool=0 AND IFNULL(updated,0)<?",
+                  (wid,ts-LEASE_TIMEOUT))
+        lost=requeue_running(x, [r for r in x.fetchall() if r["id"] not in ids], ts); c.commit()
+        if lost: scheduler.sync_ids(x, lost)
+        cancel={}
+        if ids:
+            x.execute(f"SELECT id,cancel_requested FROM jobs WHERE id IN ({','.join('?'*len(ids))})", ids)
+            # a handover reaches the original through its own update; a copy on the same job listens here
+            cancel={str(r["id"]):(0 if r["cancel_requested"]==SPEC_HANDOVER else int(r["cancel_requested"] or 0)) for r in x.fetchall()}
+    return cancel
+
+@app.post("/worker_update")
+async def worker_update(payload:Dict[str,Any]):
+    """The batched worker channel: liveness, frame updates (`frames`, as for /frame_update),
+    job/lease updates (`jobs`, as for /job_update) and log chunks (`logs`, as for /log_append) in one request. `cancel` maps "<job_id>" and
+    "<job_id>:<lease_id>" to cancel codes for every job carried or listed in `job_ids`."""
+    wid=payload.get("worker_id")
+    cancel,events,results=await run_in_threadpool(apply_worker_update, wid, payload)
+    for e in events: frame_events.add(*e, worker_id=wid)
+    for r in results:
+        if r["event"]: await bus.publish("job", {**r["event"], "worker_id":wid})
+    return {"ok":True,"cancel":cancel}
+
+def apply_worker_update(wid, payload:Dict[str,Any])->tuple:
+    """The database and log work of /worker_update (runs in the threadpool) -> (cancel, frame events, job results)."""
+    worker_from_auth(wid, payload.get("api_key"))
+    frames=payload.get("frames") if isinstance(payload.get("frames"),list) else []
+    jobs=payload.get("jobs") if isinstance(payload.get("jobs"),list) else []
+    events=[]
+    if isinstance(payload.get("logs"),list): append_logs(payload["logs"])
+    if frames:   # frames first: a final status may depend on them
+        try: _,events=apply_frame_updates(frames, wid)
+        except HTTPException: pass   # all of those jobs are gone
+    results=[]
+    for u in jobs:
+        try: r=apply_job_update(u)
+        except HTTPException: r={"cancel":1,"frames":None,"event":None}   # job or lease gone: stop rendering it
+        results.append(r)
+        if r.get("frames"): events.append(r["frames"])
+    cancel=touch_worker(wid, payload.get("job_ids"))
+    for u,r in zip(jobs,results):
+        cancel[f"{u.get('job_id')}:{u['lease_id']}" if u.get("lease_id") else str(u.get("job_id"))]=r["cancel"]
+    return cancel,events,results
+
+# --------------- Reaper ---------------
+def reap_stale()->List[int]:
+    """Requeue running jobs whose worker has neither heartbeated nor updated the job for
+    LEASE_TIMEOUT seconds. frame_done is reset from the frame bitmap, and the frames are
+    handed to the next worker (next_job.frames_done) so it resumes. Deleted ones are closed.
+    Frame pools are not requeued as a whole; their expired leases go back to the pool."""
+    scheduler.flush(); expire_leases()
+    ts=now(); cutoff=ts-LEASE_TIMEOUT
+    with db() as c:
+        x=c.cursor()
+        x.execute("""SELECT j.id,j.deleted FROM jobs j LEFT JOIN workers w ON w.id=j.worker_id
+                     WHERE j.status='running' AND j.pool=0 AND j.cancel_requested<>? AND IFNULL(j.updated,0)<? AND IFNULL(w.last_seen,0)<?""",
+                  (SPEC_HANDOVER,cutoff,cutoff))
+        ids=requeue_running(x, x.fetchall(), ts)
+        if not ids: return []
+        c.commit(); scheduler.sync_ids(x, ids)
+    print(f"[server] reaper requeued jobs {ids} (stale > {LEASE_TIMEOUT:.0f}s)")
+    return ids
+
+def requeue_running(x, rows, ts:float)->List[int]:
+    """Put orphaned running jobs ([{id,deleted}]) back in the queue without committing;
+    frame_done comes from the bitmap. Deleted ones are closed. Returns the requeued ids."""
+    if not rows: return []
+    dead=[r["id"] for r in rows if r["deleted"]]; ids=[r["id"] for r in rows if not r["deleted"]]
+    if dead: x.execute(f"UPDATE jobs SET status='cancelled', frame_running=0, updated=? WHERE id IN ({','.join('?'*len(dead))})", (ts,*dead))
+    states=load_frames_many(x, ids)
+    x.executemany("""UPDATE jobs SET status='queued', worker_id=NULL, cancel_requested=0, frame_running=0,
+                     frame_done=?, updated=? WHERE id=? AND status='running'""",
+                  [(states[i].total("done") if i in states else 0, ts, i) for i in ids])
+    rollup_refresh(x, job_gkeys(x, ids))
+    return ids
+
+def release_worker(wid:int):
+    """A (re)registering worker runs nothing yet: requeue whatever the DB still has on it."""
+    scheduler.flush()
+    with db() as c:
+        x=c.cursor(); x.execute("UPDATE frame_leases SET expires=0 WHERE worker_id=? AND status='active'", (wid,))
+        x.execute("SELECT id,deleted FROM jobs WHERE worker_id=? AND status='running' AND pool=0", (wid,))
+        ids=requeue_running(x, x.fetchall(), now()); c.commit()
+        if ids: scheduler.sync_ids(x, ids)
+    expire_leases()
+
+async def reaper_loop():
+    while True:
+        await asyncio.sleep(REAPER_INTERVAL)
+        try: await run_in_threadpool(reap_stale)
+        except Exception as e: print("[server] reaper error:", e)
+        try: await run_in_threadpool(archive_logs)
+        except Exception as e: print("[server] log archiver error:", e)
+
+@app.on_event("startup")
+async def _start_background():
+    app.state.reaper=asyncio.create_task(reaper_loop())
+    app.state.group_feed=asyncio.create_task(group_feed.run())
+
+@app.on_event("shutdown")
+def _close_pool(): scheduler.flush(); pool.close_all()
 
 if __name__=="__main__":
     import uvicorn
@@ -0,0 +1,49 @@
+"""Shared fixtures. server.py reads its settings from the environment at import time, so
+each test imports a fresh copy pointed at a temporary database and log directory."""
+import os, sys, importlib
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for d in ("server", "worker"):
+    if os.path.join(ROOT, d) not in sys.path: sys.path.insert(0, os.path.join(ROOT, d))
+
+JOIN_SECRET = "test-join"
+USER_API_KEY = "test-key"
+
+@pytest.fixture
+def load_server(tmp_path, monkeypatch):
+    """load_server(**env) -> a freshly imported server module using tmp_path."""
+    loaded = []
+    def load(**env):
+        monkeypatch.setenv("ELARA_DB", str(tmp_path / "elarafarm.db"))
+        monkeypatch.setenv("ELARA_LOG_DIR", str(tmp_path / "logs"))
+        monkeypatch.setenv("ELARA_JOIN_SECRET", JOIN_SECRET)
+        monkeypatch.setenv("ELARA_USER_API_KEY", USER_API_KEY)
+        for k, v in env.items(): monkeypatch.setenv(k, str(v))
+        sys.modules.pop("server", None)
+        mod = importlib.import_module("server"); loaded.append(mod)
+        return mod
+    yield load
+    for mod in loaded:
+        mod.scheduler.flush(); mod.pool.close_all()
+    sys.modules.pop("server", None)
+
+def queue_jobs(server, n, priority=lambda i: 0, frames=1):
+    """Insert n queued single jobs straight into the DB and load them into the scheduler."""
+    with server.db() as c:
+        x = c.cursor(); ts = server.now()
+        x.executemany("""INSERT INTO jobs(status,created,updated,scene,start_frame,end_frame,by_step,frame_total,priority,deleted)
+                         VALUES('queued',?,?,'a.ma',1,?,1,?,?,0)""", [(ts, ts, frames, frames, priority(i)) for i in range(n)])
+        server.rollup_rebuild(x); c.commit()
+    server.scheduler.load()
+
+def job_row(server, jid):
+    with server.db() as c: return c.execute("SELECT * FROM jobs WHERE id=?", (jid,)).fetchone()
+
+@pytest.fixture
+def load_worker(tmp_path, monkeypatch):
+    """A freshly imported worker module whose logs and scan caches live in tmp_path."""
+    monkeypatch.setenv("ELARA_LOG_DIR", str(tmp_path / "worker_logs"))
+    sys.modules.pop("worker", None)
+    yield importlib.import_module("worker")
+    sys.modules.pop("worker", None)
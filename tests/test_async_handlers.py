@@ -0,0 +1,48 @@
+"""The async worker endpoints must do their SQLite writes and log appends in the threadpool,
+never on the event loop, and log viewers must still be woken by appends made off the loop."""
+import asyncio, threading
+from fastapi.testclient import TestClient
+from conftest import JOIN_SECRET, queue_jobs
+
+def test_worker_endpoints_write_off_the_loop(load_server, monkeypatch):
+    server = load_server(ELARA_SPECULATE="0")
+    queue_jobs(server, 1, frames=4)
+    w = server.register_worker({"join_secret": JOIN_SECRET, "name": "w1", "slots": 1})
+    auth = {"worker_id": w["worker_id"], "api_key": w["api_key"]}
+    loop_threads, sync_threads = set(), []
+
+    def spy(name):
+        real = getattr(server, name)
+        def wrapped(*a, **kw):
+            sync_threads.append((name, threading.get_ident())); return real(*a, **kw)
+        monkeypatch.setattr(server, name, wrapped)
+    for name in ("worker_from_auth", "apply_job_update", "apply_frame_updates", "append_logs", "touch_worker"): spy(name)
+    real_add = server.frame_events.add
+    def add(*a, **kw):
+        loop_threads.add(threading.get_ident()); return real_add(*a, **kw)
+    monkeypatch.setattr(server.frame_events, "add", add)
+
+    with TestClient(server.app) as cl:
+        jid = cl.get("/next_job", params=auth).json()["job"]["id"]
+        assert cl.post("/frame_update", json={**auth, "job_id": jid, "frames_done": [1]}).json()["ok"]
+        assert cl.post("/job_update", json={**auth, "job_id": jid, "status": "running", "frame_done": 1}).json()["ok"]
+        assert cl.post("/log_append", json={**auth, "logs": [{"job_id": jid, "stream": "s", "offset": 0, "data": "a\n"}]}).json()["bytes"] == 2
+        r = cl.post("/worker_update", json={**auth, "frames": [{"job_id": jid, "frames_done": [2]}],
+                                            "jobs": [{**auth, "job_id": jid, "status": "running", "frame_done": 2}],
+                                            "logs": [{"job_id": jid, "stream": "s", "offset": 2, "data": "b\n"}]}).json()
+        assert r["ok"] and r["cancel"][str(jid)] == 0
+    assert loop_threads and {n for n, _ in sync_threads} >= {"worker_from_auth", "apply_job_update", "apply_frame_updates",
+                                                               "append_logs", "touch_worker"}
+    assert not [n for n, t in sync_threads if t in loop_threads]
+    assert open(server.logs.path(jid)).read() == "a\nb\n"
+
+def test_append_from_a_thread_wakes_log_viewers(load_server):
+    server = load_server()
+    async def main():
+        ev = server.logs.watch(7)
+        try:
+            threading.Thread(target=server.logs.append, args=(7, "s", 0, "hello\n")).start()
+            await asyncio.wait_for(ev.wait(), 5)
+        finally: server.logs.unwatch(7, ev)
+        assert not server.logs.waiters
+    asyncio.run(main())
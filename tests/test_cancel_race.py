@@ -0,0 +1,65 @@
+"""A job cancelled, paused or deleted while the in-memory scheduler is handing it out must not
+reach a worker."""
+from contextlib import contextmanager
+import pytest
+from conftest import JOIN_SECRET, queue_jobs, job_row
+
+def test_cancel_between_pop_and_handout(load_server):
+    server = load_server(ELARA_SCHEDULER="memory", ELARA_SPECULATE="0")
+    queue_jobs(server, 1)
+    wid = server.register_worker({"join_secret": JOIN_SECRET, "name": "w"})["worker_id"]
+    jid = 1
+
+    real_db = server.db; state = {"hit": False}
+    @contextmanager
+    def db_then_cancel():   # the claim's SELECT still sees 'queued'; the cancel lands right after it
+        with real_db() as c: yield c
+        if not state["hit"]:
+            state["hit"] = True; server.db = real_db; server.cancel_job(jid)
+    server.db = db_then_cancel
+    try: got = server.scheduler.claim(wid, 1)
+    finally: server.db = real_db
+    assert state["hit"]
+    assert got == []   # withdrawn: not handed out
+
+    server.scheduler.flush()
+    r = job_row(server, jid)
+    assert r["status"] == "cancelled" and r["cancel_requested"] == 1
+
+@pytest.mark.parametrize("action", ["pause", "delete"])
+def test_pause_or_delete_between_pop_and_handout(load_server, action):
+    server = load_server(ELARA_SCHEDULER="memory", ELARA_SPECULATE="0")
+    queue_jobs(server, 1)
+    wid = server.register_worker({"join_secret": JOIN_SECRET, "name": "w"})["worker_id"]
+    act = {"pause": lambda: server.pause_job(1), "delete": lambda: server.delete_job(1)}[action]
+
+    real_db = server.db; state = {"hit": False}
+    @contextmanager
+    def db_then_act():
+        with real_db() as c: yield c
+        if not state["hit"]:
+            state["hit"] = True; server.db = real_db; act()
+    server.db = db_then_act
+    try: got = server.scheduler.claim(wid, 1)
+    finally: server.db = real_db
+    assert state["hit"] and got == []
+
+    server.scheduler.flush()
+    r = job_row(server, 1)
+    if action == "delete": assert r is None
+    else: assert r["status"] == "paused" and r["cancel_requested"] == 1 and r["worker_id"] is None
+    assert server.scheduler.claim(wid, 1) == []
+
+def test_cancelled_job_ignores_done_until_retried(load_server):
+    server = load_server(ELARA_SCHEDULER="memory", ELARA_SPECULATE="0")
+    queue_jobs(server, 1)
+    wid = server.register_worker({"join_secret": JOIN_SECRET, "name": "w"})["worker_id"]
+    assert server._claim(wid, 1)[0]["id"] == 1
+    server.cancel_job(1)
+    r = server.apply_job_update({"job_id": 1, "status": "done", "frame_total": 1, "frame_done": 1})
+    assert r["cancel"] == 1
+    assert job_row(server, 1)["status"] == "cancelled"
+    server.retry_job(1)
+    assert server._claim(wid, 1)[0]["id"] == 1
+    server.apply_job_update({"job_id": 1, "status": "done", "frame_total": 1, "frame_done": 1})
+    assert job_row(server, 1)["status"] == "done"
@@ -0,0 +1,38 @@
+"""Events reach group subscribers from the group_id they carry: publishing, routing and
+replaying run on the event loop and must never touch the database."""
+import asyncio, json
+from conftest import JOIN_SECRET
+
+def test_group_routing_never_reads_the_db(load_server, monkeypatch):
+    server = load_server(ELARA_SPECULATE="0", ELARA_FRAME_EVENT_WINDOW="0.01")
+    with server.db() as c:
+        x = c.cursor(); ts = server.now()
+        x.executemany("""INSERT INTO jobs(status,created,updated,scene,start_frame,end_frame,by_step,frame_total,group_id,deleted)
+                         VALUES('queued',?,?,'a.ma',?,?,1,5,?,0)""", [(ts, ts, 1, 5, "g1"), (ts, ts, 6, 10, "g2")])
+        server.rollup_rebuild(x); c.commit()
+    server.scheduler.load()
+    w = server.register_worker({"join_secret": JOIN_SECRET, "name": "w1", "slots": 2})
+    j1, j2 = sorted(j["id"] for j in server._claim(w["worker_id"], 2))
+    _, events = server.apply_frame_updates([{"job_id": j1, "frames_done": [1]}, {"job_id": j2, "frames_done": [6]}], w["worker_id"])
+    r = server.apply_job_update({"job_id": j1, "status": "running", "frame_done": 1})
+    seq = server.bus.seq
+
+    def no_db(): raise AssertionError("event routing touched the database")
+    monkeypatch.setattr(server, "db", no_db)
+
+    async def main():
+        cl = server.bus.add(None, {"group_id": {"g1"}})
+        try:
+            for e in events: server.frame_events.add(*e, worker_id=w["worker_id"])
+            await server.bus.publish("job", r["event"])
+            await asyncio.sleep(0.1)
+            got = [json.loads(f.split("data: ", 1)[1]) for f in await cl.take(1)]
+            late = server.bus.add(None, {"group_id": {"g1"}})
+            replayed = [json.loads(f.split("data: ", 1)[1]) for f in server.bus.replay(late, seq)]
+            server.bus.remove(late)
+        finally: server.bus.remove(cl)
+        return got, replayed
+    got, replayed = asyncio.run(main())
+    assert sorted((m["type"], m["data"]["job_id"]) for m in got) == [("frame", j1), ("job", j1)]
+    assert all(m["data"]["group_id"] == "g1" for m in got)
+    assert sorted(m["data"]["job_id"] for m in replayed) == [j1, j1]
@@ -0,0 +1,100 @@
+"""FrameDetector (cached incremental walk, JSON scan cache, watchdog notifications) must always
+report the same frames as a plain rglob of the output tree, whatever happens to the tree."""
+import os, time
+from pathlib import Path
+import pytest
+
+START, END = 1, 500
+
+def rglob_frames(worker, root):
+    """The original list_done_frames: rglob everything and parse each image name."""
+    out = set()
+    for f in Path(root).rglob("*"):
+        if f.is_file():
+            fr = worker.frame_of(f.name, START, END)
+            if fr is not None: out.add(fr)
+    return out
+
+class Tree:
+    """Mutates an output tree. Every directory it touches is stamped with a fresh mtime in the
+    past, so the detector sees it as changed while untouched directories stay cacheable."""
+    def __init__(self, root):
+        self.root = Path(root); self.stamp = time.time() - 10_000; self.touched = set()
+    def _dir(self, p):
+        self.touched.add(p)
+        while p != self.root: p = p.parent; self.touched.add(p)   # parents of a new dir change too
+    def write(self, rel):
+        p = self.root / rel; new = [d for d in [p.parent, *p.parent.parents] if not d.exists()]
+        p.parent.mkdir(parents=True, exist_ok=True); p.write_bytes(b"")
+        self.touched.add(p.parent)
+        for d in new: self._dir(d)
+    def remove(self, rel):
+        p = self.root / rel
+        if p.is_dir():
+            for f in sorted(p.rglob("*"), reverse=True): f.rmdir() if f.is_dir() else f.unlink()
+            p.rmdir()
+        else: p.unlink()
+        self.touched.add(p.parent)
+    def rename(self, a, b):
+        (self.root / a).rename(self.root / b); self.touched |= {(self.root / a).parent, (self.root / b).parent}
+    def settle(self):
+        self.stamp += 1
+        for d in self.touched:
+            if d.exists(): os.utime(d, (self.stamp, self.stamp))
+        self.touched = set()
+
+STEPS = [
+    ("first frames", lambda t: [t.write(f"beauty/shot.{f:04d}.exr") for f in range(1, 40)]),
+    ("new AOV subdir", lambda t: [t.write(f"aov/diffuse/shot_diffuse.{f:04d}.exr") for f in range(40, 60)]),
+    ("deeper AOV and junk", lambda t: [t.write("aov/spec/v2/shot_spec.0061.png"), t.write("aov/spec/v2/notes.txt"),
+                                       t.write("beauty/shot.9999.exr"), t.write("beauty/readme0100.md")]),
+    ("more frames in a cached dir", lambda t: [t.write(f"beauty/shot.{f:04d}.exr") for f in range(100, 120)]),
+    ("delete frames", lambda t: [t.remove(f"beauty/shot.{f:04d}.exr") for f in range(1, 10)]),
+    ("delete AOV dir", lambda t: t.remove("aov/diffuse")),
+    ("rename temp -> frame", lambda t: [t.write("beauty/shot.0200.exr.tmp"), t.settle(), t.rename("beauty/shot.0200.exr.tmp", "beauty/shot.0200.exr")]),
+    ("dir replaced by same name", lambda t: [t.remove("aov/spec"), t.write("aov/spec/shot_spec.0300.tif")]),
+    ("empty step", lambda t: None),
+]
+
+def test_cached_scan_matches_rglob(load_worker, tmp_path):
+    worker = load_worker; root = tmp_path / "out"; root.mkdir(); tree = Tree(root); tree.touched.add(root)
+    cache = tmp_path / "scan_cache.json"
+    det = worker.FrameDetector(str(root), START, END, cache=cache)
+    for name, step in STEPS:
+        step(tree); tree.settle()
+        expected = rglob_frames(worker, root)
+        assert det.scan() == expected, name
+        assert worker.list_done_frames(str(root), START, END) == expected, name
+        det.save(force=True)   # a resumed job starting from the JSON cache sees the same
+        assert worker.FrameDetector(str(root), START, END, cache=cache).scan() == expected, name
+
+def test_cache_is_reused_for_unchanged_dirs(load_worker, tmp_path):
+    worker = load_worker; root = tmp_path / "out"; tree = Tree(root)
+    for a in range(5):
+        for f in range(1, 20): tree.write(f"aov{a}/shot.{f:04d}.exr")
+    tree.touched.add(root); tree.settle()
+    det = worker.FrameDetector(str(root), START, END); det.scan()
+    listed = []
+    real = det._list
+    det._list = lambda path, mt, old: listed.append(path) or real(path, mt, old)
+    tree.write("aov3/shot.0050.exr"); tree.settle()
+    assert 50 in det.scan()
+    assert listed == [str(root / "aov3")]   # one changed dir relisted, the rest came from the cache
+
+def test_poll_with_notifications_matches_rglob(load_worker, tmp_path):
+    pytest.importorskip("watchdog")
+    worker = load_worker; root = tmp_path / "out"; root.mkdir(); tree = Tree(root)
+    det = worker.FrameDetector(str(root), START, END); det.watch()
+    assert det.observer is not None
+    try:
+        seen = det.poll(full=True)
+        for name, step in STEPS:
+            step(tree); tree.settle()
+            deadline = time.time() + 5
+            expected_new = rglob_frames(worker, root) - det.done()
+            while not expected_new <= seen and time.time() < deadline:   # notifications are asynchronous
+                time.sleep(0.05); seen |= det.poll()
+            assert expected_new <= seen, name
+        assert det.scan() == rglob_frames(worker, root)   # the safety rescan agrees after deletes too
+    finally:
+        det.close()
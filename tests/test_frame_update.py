@@ -0,0 +1,21 @@
+"""/frame_update: frames_done/frames_failed must be lists of frame numbers and [first,last]
+runs; anything else is a 400 and nothing in the batch is applied."""
+import pytest
+from fastapi.testclient import TestClient
+from conftest import JOIN_SECRET, queue_jobs
+
+@pytest.mark.parametrize("bad", [5, "1-3", {"1": 2}, [1.5], [[1, 2.0]], [True], [[1, 2, 3]], [None]])
+def test_malformed_frame_lists_are_rejected(load_server, bad):
+    server = load_server()
+    queue_jobs(server, 1, frames=10)
+    w = server.register_worker({"join_secret": JOIN_SECRET, "name": "w"})
+    auth = {"worker_id": w["worker_id"], "api_key": w["api_key"]}
+    with TestClient(server.app) as cl:
+        r = cl.post("/frame_update", json={**auth, "updates": [{"job_id": 1, "frames_done": [1]},
+                                                              {"job_id": 1, "frames_failed": bad}]})
+        assert r.status_code == 400
+        with server.db() as c: assert server.load_frames(c.cursor(), 1).total("done") == 0
+        r = cl.post("/frame_update", json={**auth, "job_id": 1, "frames_done": [2, [4, 6]], "frames_failed": [9]})
+        assert r.json() == {"ok": True, "jobs": 1}
+    with server.db() as c: st = server.load_frames(c.cursor(), 1)
+    assert st.frames("done") == [2, 4, 5, 6] and st.frames("failed") == [9]
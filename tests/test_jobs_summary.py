@@ -0,0 +1,20 @@
+"""/jobs_summary?since= deltas: with a status filter, a row whose status leaves the filter
+must be reported in `removed`, or a delta-reading dashboard would keep showing it."""
+from fastapi.testclient import TestClient
+from conftest import JOIN_SECRET, queue_jobs
+
+def test_since_with_status_filter_reports_rows_leaving_it(load_server):
+    server = load_server(ELARA_SPECULATE="0")
+    queue_jobs(server, 2)
+    w = server.register_worker({"join_secret": JOIN_SECRET, "name": "w1", "slots": 1})
+    with TestClient(server.app) as cl:
+        snap = cl.get("/jobs_summary", params={"status": "queued"})
+        ver = int(snap.headers["X-Version"]); assert len(snap.json()) == 2
+        jid = server._claim(w["worker_id"], 1)[0]["id"]; server.scheduler.flush()
+
+        d = cl.get("/jobs_summary", params={"status": "queued", "since": ver}).json()
+        assert not d["full"] and d["rows"] == [] and d["removed"] == [f"job-{jid}"]
+        d = cl.get("/jobs_summary", params={"status": "queued,running", "since": ver}).json()
+        assert [r["gkey"] for r in d["rows"]] == [f"job-{jid}"] and d["removed"] == []
+        d = cl.get("/jobs_summary", params={"since": ver}).json()
+        assert [r["status"] for r in d["rows"]] == ["running"] and d["removed"] == []
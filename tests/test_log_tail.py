@@ -0,0 +1,65 @@
+"""Tail and back-paging of multi-GB logs: read by seeking, never the whole file.
+The logs are sparse files (a hole between real line blocks), so they take no disk space."""
+import os, subprocess, sys, textwrap
+from conftest import ROOT
+
+GB = 1 << 30
+
+def make_log(path, size=3 * GB, tail_bytes=4 << 20):
+    """A `size`-byte log: numbered lines in the first MB and in the last `tail_bytes`, a hole between."""
+    def lines(n_bytes, tag):
+        out, i, n = [], 0, 0
+        while n < n_bytes:
+            out.append(f"{tag} line {i:08d} | [mtoa] rendering bucket {i % 97} of frame {i // 500}\n".encode()); n += len(out[-1]); i += 1
+        return b"".join(out)[:n_bytes].rsplit(b"\n", 1)[0] + b"\n"
+    head, tail = lines(1 << 20, "head"), lines(tail_bytes, "tail")
+    with open(path, "wb") as f:
+        f.write(head); f.seek(size - len(tail)); f.write(tail)
+    return size, size - len(tail)
+
+def raw(path, a, b):
+    with open(path, "rb") as f: f.seek(a); return f.read(b - a)
+
+def test_tail_and_paging(load_server):
+    server = load_server()
+    path = server.logs.path(1); size, tail_start = make_log(path)
+    from fastapi.testclient import TestClient
+    with TestClient(server.app) as cl:
+        r = cl.get("/job_tail", params={"id": 1})
+        start, end = int(r.headers["x-log-start"]), int(r.headers["x-log-end"])
+        assert int(r.headers["x-log-size"]) == size and end == size
+        assert size - start <= server.TAIL_BYTES
+        assert r.text.encode() == raw(path, start, end) and r.text.endswith("\n")
+        assert raw(path, start - 1, start) == b"\n"   # starts on a line boundary
+
+        # walk back 256 KiB pages through the tail block and a few pages into the hole
+        pages, offset = [], start
+        while offset > tail_start - (3 << 18):
+            r = cl.get("/job_tail", params={"id": 1, "offset": offset, "limit": 1 << 18})
+            s, e = int(r.headers["x-log-start"]), int(r.headers["x-log-end"])
+            assert e == offset, "gap or overlap between pages"
+            assert 0 < e - s <= 1 << 18
+            pages.append(r.content); offset = s
+        assert b"".join(reversed(pages)) == raw(path, offset, start)
+
+        r = cl.get("/job_tail", params={"id": 1, "offset": 1 << 20, "limit": 10 << 20})   # limit is capped
+        assert int(r.headers["x-log-start"]) == 0 and r.content == raw(path, 0, 1 << 20)
+
+def test_tail_memory_is_bounded(tmp_path):
+    """Tail + 200 pages of a 3 GB log in a fresh process: peak RSS barely moves."""
+    path = tmp_path / "job_1.log"; size, _ = make_log(path)
+    script = textwrap.dedent(f"""
+        import os, sys, resource
+        sys.path.insert(0, {os.path.join(ROOT, 'server')!r})
+        os.environ.update(ELARA_DB={str(tmp_path / 'db.sqlite')!r}, ELARA_LOG_DIR={str(tmp_path / 'logs')!r})
+        import server
+        base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        text, start, end, size = server.read_log_range({str(path)!r}, None, server.TAIL_MAX_BYTES)
+        for _ in range(200): text, start, end, size = server.read_log_range({str(path)!r}, start, server.TAIL_MAX_BYTES)
+        print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base, size - start)
+    """)
+    out = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=120)
+    assert out.returncode == 0, out.stderr
+    grown_kb, walked = map(int, out.stdout.split())
+    assert walked > 199 * (1 << 20)             # really paged ~200 MB back
+    assert grown_kb < 32 * 1024, f"peak RSS grew {grown_kb} KiB"
@@ -0,0 +1,36 @@
+"""/next_job long-polls: a worker whose slots are all busy is answered at once, and a
+wakeup it takes between parking and claiming is passed on to a worker that can claim."""
+import asyncio, time
+from conftest import JOIN_SECRET
+
+def test_busy_worker_passes_on_its_wakeup(load_server, monkeypatch):
+    server = load_server(ELARA_SCHEDULER="memory", ELARA_SPECULATE="0")
+    busy, idle = (server.register_worker({"join_secret": JOIN_SECRET, "name": n, "slots": 1}) for n in ("busy", "idle"))
+    with server.db() as c:
+        ts = server.now()
+        c.execute("""INSERT INTO jobs(status,created,updated,scene,start_frame,end_frame,by_step,frame_total,worker_id,deleted)
+                     VALUES('running',?,?,'a.ma',1,1,1,1,?,0)""", (ts, ts, busy["worker_id"])); c.commit()
+
+    real_claim = server._claim
+    def claim(wid, count):
+        if wid == busy["worker_id"]:   # the busy worker parked first; a job is queued before its claim runs
+            while len(server.scheduler.waiters) < 2: time.sleep(0.01)
+            with server.db() as c:
+                x = c.cursor(); ts = server.now()
+                x.execute("""INSERT INTO jobs(status,created,updated,scene,start_frame,end_frame,by_step,frame_total,deleted)
+                             VALUES('queued',?,?,'a.ma',1,1,1,1,0)""", (ts, ts))
+                c.commit(); server.scheduler.sync_ids(x, [x.lastrowid])   # wakes the first waiter: the busy worker
+        return real_claim(wid, count)
+    monkeypatch.setattr(server, "_claim", claim)
+
+    async def main():
+        a = asyncio.create_task(server.next_job(busy["worker_id"], busy["api_key"], wait=10))
+        while not server.scheduler.waiters: await asyncio.sleep(0.01)
+        b = asyncio.create_task(server.next_job(idle["worker_id"], idle["api_key"], wait=10))
+        t = time.monotonic()
+        ra, rb = await asyncio.wait_for(asyncio.gather(a, b), 8)
+        return ra, rb, time.monotonic() - t
+    ra, rb, took = asyncio.run(main())
+    assert ra == {"job": None}
+    assert rb["job"] and rb["job"]["id"] == 2 and took < 5   # woken, not timed out
+    assert not server.scheduler.waiters
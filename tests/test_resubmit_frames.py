@@ -0,0 +1,37 @@
+"""/action/resubmit_frames: a malformed job_id or entry is a 400, every frame, plain or in a
+run, is clipped to the source job's range and step, and the parts keep that step."""
+import pytest
+from fastapi.testclient import TestClient
+
+def make_job(server):
+    with server.db() as c:
+        x = c.cursor(); ts = server.now()
+        x.execute("""INSERT INTO jobs(status,created,updated,scene,start_frame,end_frame,by_step,frame_total,deleted)
+                     VALUES('done',?,?,'a.ma',1,19,2,10,0)""", (ts, ts))   # frames 1,3,...,19
+        c.commit(); return x.lastrowid
+
+@pytest.mark.parametrize("bad", [[5], [], [1, 2, 3], [1.5, 3], "7", True, None, {"a": 1}])
+def test_malformed_entries_are_rejected(load_server, bad):
+    server = load_server()
+    with TestClient(server.app) as cl:
+        r = cl.post("/action/resubmit_frames", json={"job_id": make_job(server), "frames": [3, bad]})
+    assert r.status_code == 400
+
+@pytest.mark.parametrize("job_id", [None, "abc", [1], 0])
+def test_bad_job_id_is_rejected(load_server, job_id):
+    server = load_server(); make_job(server)
+    with TestClient(server.app) as cl:
+        r = cl.post("/action/resubmit_frames", json={"job_id": job_id, "frames": [3]})
+    assert r.status_code == 400
+
+def test_frames_are_clipped_to_the_job(load_server):
+    server = load_server()
+    jid = make_job(server)
+    with TestClient(server.app) as cl:
+        r = cl.post("/action/resubmit_frames", json={"job_id": jid, "frames": [0, 4, 5, 25, [15, 40], [-10, 2]]}).json()
+        assert r["blocks"] == [[1, 1], [5, 5], [15, 19]]
+        with server.db() as c:
+            parts = c.execute("SELECT start_frame,end_frame,by_step,frame_total FROM jobs WHERE group_id=? ORDER BY part_index",
+                              (r["group_id"],)).fetchall()
+        assert [tuple(p) for p in parts] == [(1, 1, 2, 1), (5, 5, 2, 1), (15, 19, 2, 3)]
+        assert cl.post("/action/resubmit_frames", json={"job_id": jid, "frames": [0, 2, [20, 30]]}).json() == {"ok": True}
@@ -0,0 +1,74 @@
+"""Speculative copies: an idle worker only takes the write lock when a straggler pays off,
+concurrent idle workers still get one copy per part, and the copy takes the back of the
+remaining frames, which the original hands over when it gets there."""
+import threading
+from conftest import JOIN_SECRET, job_row
+
+def make_group(server, eta):
+    w = [server.register_worker({"join_secret": JOIN_SECRET, "name": f"w{i}", "slots": 1})["worker_id"] for i in range(9)]
+    with server.db() as c:
+        x = c.cursor(); ts = server.now()
+        x.execute("""INSERT INTO jobs(status,created,updated,scene,start_frame,end_frame,by_step,frame_total,frame_done,
+                                      group_id,part_index,part_count,eta_seconds,deleted)
+                     VALUES('done',?,?,'a.ma',1,10,1,10,10,'g',1,2,0,0)""", (ts, ts))
+        x.execute("""INSERT INTO jobs(status,created,updated,scene,start_frame,end_frame,by_step,frame_total,frame_done,
+                                      group_id,part_index,part_count,eta_seconds,worker_id,deleted)
+                     VALUES('running',?,?,'a.ma',11,20,1,10,0,'g',2,2,?,?,0)""", (ts, ts, eta, w[0]))
+        server.rollup_rebuild(x); c.commit()
+    return w
+
+def test_no_straggler_no_write_lock(load_server, monkeypatch):
+    server = load_server()
+    w = make_group(server, eta=60)   # below SPEC_MIN_SECONDS
+    calls = []
+    monkeypatch.setattr(server, "next_version", lambda x: calls.append("version"))
+    monkeypatch.setattr(server.scheduler, "flush", lambda: calls.append("flush"))
+    assert server.spec_claim(w[1]) is None and calls == []
+
+def test_one_copy_per_straggler(load_server, monkeypatch):
+    server = load_server()
+    monkeypatch.setattr(server, "SPEC_GAIN", 1.5)   # no timing stats here: a copy is costed like the original
+    w = make_group(server, eta=400)
+    got = []; start = threading.Barrier(len(w) - 1)
+    def idle(wid):
+        start.wait(); got.append(server.spec_claim(wid))
+    threads = [threading.Thread(target=idle, args=(wid,)) for wid in w[1:]]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    copies = [j for j in got if j]
+    assert len(copies) == 1 and copies[0]["spec"] == 1
+    assert copies[0]["start_frame"] == 16 and copies[0]["frame_total"] == 5   # not the frame the original is on
+    with server.db() as c:
+        assert c.execute("SELECT COUNT(1) FROM frame_leases WHERE spec=1 AND status='active'").fetchone()[0] == 1
+
+def copy_of_part(server, monkeypatch):
+    monkeypatch.setattr(server, "SPEC_GAIN", 1.5)
+    w = make_group(server, eta=400)
+    copy = server.spec_claim(w[1])
+    assert (copy["start_frame"], copy["end_frame"]) == (16, 20)
+    return w, copy
+
+def test_original_hands_over_at_the_copys_first_frame(load_server, monkeypatch):
+    server = load_server()
+    w, copy = copy_of_part(server, monkeypatch)
+    server.apply_frame_updates([{"job_id": 2, "frames_done": [[11, 14]]}])
+    assert job_row(server, 2)["cancel_requested"] == 0
+    server.apply_frame_updates([{"job_id": 2, "frames_done": [15]}])
+    r = job_row(server, 2)
+    assert r["status"] == "running" and r["cancel_requested"] == server.SPEC_HANDOVER and r["worker_id"] is None
+    assert server.apply_job_update({"job_id": 2, "status": "failed"})["cancel"] == server.SPEC_HANDOVER   # ignored
+    assert server.touch_worker(w[1], [2]) == {"2": 0}   # the copy's worker keeps rendering
+    assert server.apply_job_update({"job_id": 2, "lease_id": copy["lease_id"], "status": "running"})["cancel"] == 0
+
+    server.apply_frame_updates([{"job_id": 2, "frames_done": [[16, 20]]}])
+    server.apply_job_update({"job_id": 2, "lease_id": copy["lease_id"], "status": "done"})
+    assert job_row(server, 2)["status"] == "done"
+
+def test_failed_copy_after_handover_requeues_the_part(load_server, monkeypatch):
+    server = load_server(ELARA_SCHEDULER="memory")
+    w, copy = copy_of_part(server, monkeypatch)
+    server.apply_frame_updates([{"job_id": 2, "frames_done": [[11, 15]]}])
+    server.apply_job_update({"job_id": 2, "lease_id": copy["lease_id"], "status": "failed"})
+    r = job_row(server, 2)
+    assert r["status"] == "queued" and r["cancel_requested"] == 0 and r["worker_id"] is None
+    assert [j["id"] for j in server.scheduler.claim(w[2], 1)] == [2]
@@ -0,0 +1,14 @@
+"""Uplink: a batch that fails to send is merged back under whatever was queued meanwhile,
+with error increments added up rather than overwritten."""
+import asyncio
+
+def test_failed_send_keeps_error_increments(load_worker, monkeypatch):
+    up = load_worker.Uplink()
+    up.job(7, status="running", frame_done=1, error_inc=2)
+    def post_json(url, payload):   # a newer update lands while the send is in flight, then it fails
+        up.job(7, status="running", frame_done=2, error_inc=3)
+        raise OSError("server away")
+    monkeypatch.setattr(load_worker, "post_json", post_json)
+    asyncio.run(up.flush())
+    u = up.jobs["7"]
+    assert u["frame_done"] == 2 and u["error_inc"] == 5
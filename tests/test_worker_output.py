@@ -0,0 +1,24 @@
+"""Renderer output: a line longer than the stream limit must not fail the render; it is
+passed on in LINE_MAX pieces, and the lines around it arrive intact."""
+import asyncio
+
+def read_all(worker, data, chunk=1000):
+    async def go():   # fed while being read, as from a pipe
+        stream = asyncio.StreamReader(); got = []
+        async def produce():
+            for i in range(0, len(data), chunk): stream.feed_data(data[i:i + chunk]); await asyncio.sleep(0)
+            stream.feed_eof()
+        await asyncio.gather(produce(), worker.read_lines(stream, got.append))
+        return got
+    return asyncio.run(go())
+
+def test_overlong_line_goes_through_in_pieces(load_worker, monkeypatch):
+    monkeypatch.setattr(load_worker, "LINE_MAX", 4096)
+    big = b"x" * 10000
+    got = read_all(load_worker, b"first\n" + big + b"\nlast")
+    assert got[0] == b"first\n" and got[-1] == b"last"
+    assert b"".join(got[1:-1]) == big + b"\n" and max(map(len, got)) <= 4096 + 1
+
+def test_lines_split_across_reads(load_worker):
+    data = b"".join(b"frame %d done\n" % i for i in range(500))
+    assert read_all(load_worker, data, chunk=7) == data.splitlines(keepends=True)
@@ -1,17 +1,38 @@
 # -*- coding: utf-8 -*-
 # ElaraFarm Worker v0.9.8 — Pause (immediate) & NIMBY (after-frame) + resume from first missing frame
 
-import os, re, time, threading, subprocess, shutil
+import os, re, time, json, asyncio, threading, subprocess, shutil
+from collections import deque
 from pathlib import Path
 from typing import Dict, Any, Set, List, Optional
 import requests
+from requests.adapters import HTTPAdapter
+try:   # optional: OS change notifications for frame detection (pip install watchdog)
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer=None; FileSystemEventHandler=object
 
 SERVER      = os.environ.get("ELARA_SERVER", "http://127.0.0.1:8000")
 JOIN_SECRET = os.environ.get("ELARA_JOIN_SECRET", "CHANGE_ME")
 WORKER_NAME = os.environ.get("ELARA_WORKER_NAME", os.environ.get("COMPUTERNAME","worker"))
+LONG_POLL   = float(os.environ.get("ELARA_LONG_POLL", "25"))   # seconds /next_job may park server-side (0 = plain polling)
+HEARTBEAT   = float(os.environ.get("ELARA_HEARTBEAT", "10"))   # seconds between /heartbeat pings
+FULL_RESCAN = float(os.environ.get("ELARA_FULL_RESCAN", "30")) # safety rescan interval while OS notifications are used
+SLOTS       = max(1, int(os.environ.get("ELARA_SLOTS", "1")))  # concurrent renders on this machine
+SLOT_THREADS= int(os.environ.get("ELARA_SLOT_THREADS", "0"))   # CPU threads per render (0 = cores / slots when SLOTS > 1)
+THREAD_FLAGS= {"arnold": os.environ.get("ELARA_ARNOLD_THREADS_FLAG", "-ai:threads")}   # renderer flag taking a thread count
+ENGINE      = os.environ.get("ELARA_ENGINE", "async")            # 'threads': the older thread-per-render loop
+UPLINK_INTERVAL = float(os.environ.get("ELARA_UPLINK_INTERVAL", "1.0"))   # batching window of the status channel
+SCAN_INTERVAL   = float(os.environ.get("ELARA_SCAN_INTERVAL", "2.0"))     # output-tree polls per render
+FALLBACK_SCAN   = float(os.environ.get("ELARA_FALLBACK_SCAN", "10"))      # ...only this often while the log reports frames
+LOG_BUFFER_MAX  = int(os.environ.get("ELARA_LOG_BUFFER_MAX", str(4<<20)))  # unsent log bytes kept per render while the server is away
+LINE_MAX        = 1<<20   # renderer output longer than this without a newline is logged and parsed in pieces
 
 LOG_DIR     = Path(os.environ.get("ELARA_LOG_DIR", r"C:\ElaraFarm\worker\logs"))
 LOG_DIR.mkdir(parents=True, exist_ok=True)
+SCAN_CACHE_DIR = LOG_DIR/"scan_cache"          # per-job directory caches, reused when a job resumes
+SCAN_CACHE_DAYS = float(os.environ.get("ELARA_SCAN_CACHE_DAYS", "7"))
 
 # Try to locate Maya Render.exe
 RENDER_EXE_CANDIDATES = [
@@ -31,29 +52,136 @@ def find_render_exe()->str:
     return "Render.exe"
 RENDER_EXE=find_render_exe()
 
-session=requests.Session()
+session=requests.Session()   # shared by all slots; one keep-alive connection per concurrent request
+session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=SLOTS+2))
+session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=SLOTS+2))
 WORKER_ID=None; API_KEY=None
+ACTIVE_JOBS:Dict[int,int]={}   # slot -> job id currently rendering (reported by the heartbeat)
+
+def slot_threads()->int:
+    if SLOT_THREADS>0: return SLOT_THREADS
+    return max(1,(os.cpu_count() or 1)//SLOTS) if SLOTS>1 else 0
 
 FRAME_RE=re.compile(r"(\d{3,6})")
 IMAGE_EXTS=(".exr",".png",".jpg",".tif",".tiff",".bmp")
 
+def frame_of(name:str, start:int, end:int)->Optional[int]:
+    """Frame number of an image file name (first 3-6 digit token of the stem), if in range."""
+    stem,ext=os.path.splitext(name)
+    if ext.lower() not in IMAGE_EXTS: return None
+    m=FRAME_RE.search(stem)
+    if not m: return None
+    fr=int(m.group(1))
+    return fr if start<=fr<=end else None
+
+class _FrameEvents(FileSystemEventHandler):
+    def __init__(self, det:"FrameDetector"): self.det=det
+    def on_created(self, ev): self._add(ev.src_path, ev.is_directory)
+    def on_moved(self, ev): self._add(ev.dest_path, ev.is_directory)   # written to a temp name, then renamed
+    def _add(self, path:str, is_dir:bool):
+        fr=None if is_dir else frame_of(os.path.basename(path), self.det.start, self.det.end)
+        if fr is not None:
+            with self.det.lock: self.det.pending.add(fr)
+
+class FrameDetector:
+    """Incremental replacement for rglob-ing the output tree on every poll. Each directory's
+    mtime is cached with the files and subdirectories it held, so a rescan costs one stat
+    per unchanged directory, and a changed one only type-checks entries it has not seen.
+    With `cache` the directory table is kept in a JSON file, so a resumed job starts from
+    it instead of walking the whole sequence again. After watch(), files created or renamed
+    into the tree arrive as OS notifications (watchdog) and the cached rescan only runs
+    every FULL_RESCAN s as a safety net for shares that drop events.
+    poll() returns only frames not reported before."""
+    SAVE_EVERY=10.0
+    def __init__(self, root:str, start:int, end:int, cache:Optional[Path]=None):
+        self.root=str(root or ""); self.start=int(start); self.end=int(end)
+        self.dirs:Dict[str,tuple]={}   # path -> (mtime_ns, frames, subdirs, file names)
+        self.reported:Set[int]=set(); self.pending:Set[int]=set(); self.lock=threading.Lock()
+        self.observer=None; self.last_full=0.0
+        self.cache=cache; self.dirty=False; self.saved=0.0
+        if cache: self._load()
+    def _load(self):
+        """Frames are re-derived from the cached names, so one cache serves any frame range of the job."""
+        try:
+            with open(self.cache,"r",encoding="utf-8") as f: d=json.load(f)
+        except (OSError,ValueError): return
+        if d.get("root")!=self.root: return
+        for path,(mt,files,subs) in (d.get("dirs") or {}).items():
+            frames={fr for fr in (frame_of(n,self.start,self.end) for n in files) if fr is not None}
+            self.dirs[path]=(mt,frames,subs,set(files))
+    def save(self, force:bool=False):
+        if not self.cache or not self.dirty or (not force and time.time()-self.saved<self.SAVE_EVERY): return
+        try:
+            self.cache.parent.mkdir(parents=True, exist_ok=True); tmp=self.cache.with_suffix(".tmp")
+            with open(tmp,"w",encoding="utf-8") as f:
+                json.dump({"root":self.root,"dirs":{p:[c[0],sorted(c[3]),c[2]] for p,c in self.dirs.items()}}, f)
+            os.replace(tmp, self.cache); self.dirty=False; self.saved=time.time()
+        except OSError as e: print("[worker] scan cache not saved:", e)
+    def discard(self):
+        """Drop the cache file once the job is finished."""
+        if self.cache:
+            try: self.cache.unlink()
+            except OSError: pass
+    def watch(self):
+        if Observer is None or self.observer is not None or not os.path.isdir(self.root): return
+        try:
+            ob=Observer(); ob.schedule(_FrameEvents(self), self.root, recursive=True); ob.start(); self.observer=ob
+        except Exception as e:
+            print("[worker] file watch unavailable, scanning instead:", e)
+    def close(self):
+        self.save(force=True)
+        if self.observer is None: return
+        try: self.observer.stop(); self.observer.join(timeout=2)
+        except Exception: pass
+        self.observer=None
+    def _list(self, path:str, mtime:int, old:Optional[tuple])->Optional[tuple]:
+        frames:Set[int]=set(); subs:List[str]=[]; files:Set[str]=set()
+        known_files=old[3] if old else set(); known_subs=set(old[2]) if old else set()
+        try:
+            with os.scandir(path) as it:
+                for e in it:
+                    try:
+                        if e.name in known_files: isdir=False          # seen before: no type check needed
+                        elif e.path in known_subs or e.is_dir(): isdir=True
+                        elif e.is_file(): isdir=False
+                        else: continue
+                    except OSError: continue
+                    if isdir: subs.append(e.path); continue
+                    files.add(e.name); fr=frame_of(e.name, self.start, self.end)
+                    if fr is not None: frames.add(fr)
+        except OSError as e:
+            print("[worker] scan error:", e); return None
+        # changed within the timestamp granularity: it may change again with the same mtime, so list it next time too
+        if time.time_ns()-mtime < 2_000_000_000: mtime=-1
+        self.dirty=True
+        return (mtime, frames, subs, files)
+    def scan(self)->Set[int]:
+        """All frames currently in the tree (cached walk)."""
+        out:Set[int]=set(); seen:Dict[str,tuple]={}
+        stack=[self.root] if self.root and os.path.isdir(self.root) else []
+        while stack:
+            path=stack.pop()
+            try: mt=os.stat(path).st_mtime_ns
+            except OSError: continue
+            c=self.dirs.get(path)
+            if c is None or c[0]!=mt:
+                c=self._list(path, mt, c)
+                if c is None: continue
+            seen[path]=c; out|=c[1]; stack.extend(c[2])
+        if len(seen)!=len(self.dirs): self.dirty=True
+        self.dirs=seen; self.last_full=time.time(); self.save()
+        return out
+    def poll(self, full:bool=False)->Set[int]:
+        """Frames that appeared since the last poll (the first poll returns everything present)."""
+        found=self.scan() if full or self.observer is None or time.time()-self.last_full>=FULL_RESCAN else set()
+        with self.lock: found|=self.pending; self.pending=set()
+        new=found-self.reported; self.reported|=new
+        return new
+    def done(self)->Set[int]: return set(self.reported)
+
 def list_done_frames(output_dir:str, start:int, end:int)->Set[int]:
     """Scan output directory and collect frames with numeric token in filename."""
-    root=Path(output_dir or ""); s:Set[int]=set()
-    if not root.exists(): return s
-    try:
-        for f in root.rglob("*"):
-            if not f.is_file(): continue
-            if f.suffix.lower() not in IMAGE_EXTS: continue
-            m=FRAME_RE.search(f.stem)
-            if not m: continue
-            try:
-                fr=int(m.group(1))
-                if start<=fr<=end: s.add(fr)
-            except: pass
-    except Exception as e:
-        print("[worker] rglob error:", e)
-    return s
+    return FrameDetector(output_dir, start, end).scan()
 
 def first_missing(start:int, end:int, step:int, done:Set[int]) -> Optional[int]:
     """Find first missing frame in [start..end] stepping by 'step'. Returns None if all done."""
@@ -65,6 +193,14 @@ def first_missing(start:int, end:int, step:int, done:Set[int]) -> Optional[int]:
         fr += st
     return None
 
+def to_ranges(frames, step:int=1)->List[List[int]]:
+    """Compress sorted frames into [[first,last],...] runs (server expands them by job step)."""
+    out:List[List[int]]=[]; st=max(1,int(step))
+    for fr in sorted(frames):
+        if out and fr==out[-1][1]+st: out[-1][1]=fr
+        else: out.append([fr,fr])
+    return out
+
 def post_json(url:str, payload:Dict[str,Any])->Dict[str,Any]:
     r=session.post(f"{SERVER}{url}", json=payload, timeout=15)
     r.raise_for_status()
@@ -72,33 +208,159 @@ def post_json(url:str, payload:Dict[str,Any])->Dict[str,Any]:
 
 def register():
     global WORKER_ID, API_KEY
-    r=session.post(f"{SERVER}/register_worker", json={"join_secret":JOIN_SECRET,"name":WORKER_NAME}, timeout=10)
+    r=session.post(f"{SERVER}/register_worker", json={"join_secret":JOIN_SECRET,"name":WORKER_NAME,"slots":SLOTS}, timeout=10)
     r.raise_for_status()
     data=r.json()
     WORKER_ID=data["worker_id"]; API_KEY=data["api_key"]
-    print(f"[worker] registered id={WORKER_ID}")
+    print(f"[worker] registered id={WORKER_ID} slots={SLOTS}")
+
+def heartbeat_loop():
+    """Liveness ping on its own thread, so a long frame without updates is not mistaken for a dead worker."""
+    while True:
+        time.sleep(HEARTBEAT)
+        try: post_json("/heartbeat", {"worker_id":WORKER_ID,"api_key":API_KEY,"job_ids":sorted(set(ACTIVE_JOBS.values()))})
+        except Exception as e: print("[worker] heartbeat error:", e)
+
+def expand_ranges(spec, step:int=1)->Set[int]:
+    """Inverse of to_ranges(): plain frames and [first,last] runs -> set of frames."""
+    out:Set[int]=set()
+    for v in spec or ():
+        if isinstance(v,(list,tuple)): out.update(range(int(v[0]), int(v[-1])+1, max(1,int(step))))
+        else: out.add(int(v))
+    return out
 
 def get_next_job():
-    r=session.get(f"{SERVER}/next_job", params={"worker_id":WORKER_ID,"api_key":API_KEY}, timeout=10)
+    r=session.get(f"{SERVER}/next_job", params={"worker_id":WORKER_ID,"api_key":API_KEY,"wait":LONG_POLL}, timeout=LONG_POLL+10)
     r.raise_for_status()
     return r.json().get("job")
 
+# ---------------- renderer log parsing ----------------
+class LogParser:
+    """Live render state from the renderer's output, one line at a time: current frame and
+    its % done, seconds and peak memory of each finished frame, error lines. Subclasses
+    provide the patterns for one renderer (see parser_for); this base matches nothing."""
+    FRAME_START=FRAME_DONE=PERCENT=PEAK_MEM=ERROR=None
+    def __init__(self):
+        self.current:Optional[int]=None; self.percent=0; self.last:Optional[int]=None
+        self.frame_stats:Dict[int,Dict[str,float]]={}; self.finished:List[int]=[]; self.taken=0
+        self.errors=0; self.matched=False
+    def feed(self, line:str)->bool:
+        """True when a frame started or finished (worth reporting right away)."""
+        m=self.FRAME_START.search(line) if self.FRAME_START else None
+        if m:
+            self.current=int(round(float(m.group(1)))); self.percent=0; self.matched=True
+            return True
+        m=self.PERCENT.search(line) if self.PERCENT else None
+        if m: self.percent=min(100,int(m.group(1))); return False
+        m=self.FRAME_DONE.search(line) if self.FRAME_DONE else None
+        if m and self.current is not None:
+            self.frame_stats[self.current]={"seconds":self.seconds(m.group(1))}
+            self.finished.append(self.current); self.last=self.current; self.percent=100
+            return True
+        m=self.PEAK_MEM.search(line) if self.PEAK_MEM else None
+        if m and self.last in self.frame_stats: self.frame_stats[self.last]["peak_mb"]=float(m.group(1)); return False
+        if self.ERROR and self.ERROR.search(line): self.errors+=1
+        return False
+    @staticmethod
+    def seconds(text:str)->float:
+        """'1:02:03.5' / '0:03.512' / '12.5' -> seconds."""
+        out=0.0
+        for part in text.split(":"): out=out*60+float(part)
+        return out
+    def take_stats(self, final:bool=False)->List[Dict[str,Any]]:
+        """Stats of frames finished since the last call, for the server's frame_stats. The newest
+        frame waits for its trailing lines (peak memory) until the next one starts, unless `final`."""
+        end=len(self.finished)-(0 if final or not self.finished or self.finished[-1]!=self.current else 1)
+        out=[{"frame":f, **self.frame_stats[f]} for f in self.finished[self.taken:end]]
+        self.taken=max(self.taken,end)
+        return out
+    def eta(self, remaining:int)->Optional[float]:
+        """Seconds left: recent average frame time x frames left, less the part of the current frame done."""
+        times=[r["seconds"] for r in list(self.frame_stats.values())[-10:]]
+        if not times: return None
+        avg=sum(times)/len(times)
+        return max(0.0, remaining*avg - (avg*self.percent/100 if self.percent<100 else 0))
+
+class ArnoldLogParser(LogParser):
+    # MtoA / Arnold batch output, e.g. "[mtoa] Exporting scene for frame 1001.000 with camera ...",
+    # "|    45% done - 12 rays/pixel", "| render done in 0:03.512", "| peak CPU memory used  1300.10MB"
+    FRAME_START=re.compile(r"(?:Exporting scene for|Rendering) frame (-?\d+(?:\.\d+)?)", re.I)
+    PERCENT=re.compile(r"\b(\d{1,3})% done")
+    FRAME_DONE=re.compile(r"render done in (\d+(?::\d+)*(?:\.\d+)?)")
+    PEAK_MEM=re.compile(r"peak CPU memory used\s+([\d.]+)\s*MB", re.I)
+    ERROR=re.compile(r"\|\s*ERROR\b|// Error:")
+
+PARSERS={"arnold":ArnoldLogParser}
+def parser_for(renderer:str)->LogParser: return PARSERS.get((renderer or "").lower(), LogParser)()
+
+# ---------------- log shipping ----------------
+class LogStream:
+    """One render's output on its way to the server (POST /log_append or the uplink). Bytes are
+    numbered from 0 per stream so the server drops resent chunks and marks lost ones; past
+    LOG_BUFFER_MAX unsent bytes the oldest are dropped. Thread-safe."""
+    def __init__(self, jid:int, lease=None):
+        self.jid=jid; self.id=f"{WORKER_ID}-{jid}-{lease or 0}-{int(time.time()*1000)}"
+        self.offset=0; self.pending:List[str]=[]; self.size=0; self.lock=threading.Lock(); self.closed=False
+    def write(self, text:str):
+        if not text: return
+        with self.lock:
+            self.pending.append(text); self.size+=len(text.encode("utf-8","replace"))
+            while self.size>LOG_BUFFER_MAX and len(self.pending)>1:
+                n=len(self.pending.pop(0).encode("utf-8","replace")); self.offset+=n; self.size-=n
+    def take(self)->Optional[Dict[str,Any]]:
+        """The pending output as one chunk (None if nothing is pending)."""
+        with self.lock:
+            if not self.pending: return None
+            chunk={"job_id":self.jid,"stream":self.id,"offset":self.offset,"data":"".join(self.pending)}
+            self.offset+=self.size; self.pending=[]; self.size=0
+            return chunk
+    def give_back(self, chunk:Dict[str,Any]):
+        """A chunk that could not be sent goes back in front of what came since."""
+        with self.lock:
+            self.pending.insert(0, chunk["data"]); self.offset=chunk["offset"]; self.size+=len(chunk["data"].encode("utf-8","replace"))
+
+def send_log(stream:LogStream):
+    chunk=stream.take()
+    if not chunk: return
+    try: post_json("/log_append", {"worker_id":WORKER_ID,"api_key":API_KEY,"logs":[chunk]})
+    except Exception as e: stream.give_back(chunk); print("[worker] log_append error:", e)
+
+def render_cmd(job:Dict[str,Any], first:int)->List[str]:
+    """Render.exe command line for `job`, starting at frame `first`."""
+    renderer=(job.get("renderer") or "arnold").lower()
+    # Respect Maya file naming: do NOT pass -im/-of (let Maya/Layers handle file names)
+    cmd=[RENDER_EXE,"-r",renderer,"-s",str(first),"-e",str(int(job["end_frame"])),"-b",str(max(1,int(job.get("by_step") or 1))),
+         "-proj",job["project"],"-rd",job["output_dir"],"-x",str(int(job.get("width") or 1920)),"-y",str(int(job.get("height") or 1080))]
+    threads=slot_threads(); flag=THREAD_FLAGS.get(renderer)
+    if threads and flag: cmd+=[flag,str(threads)]   # keep concurrent slots from oversubscribing the CPU
+    if job.get("camera"): cmd+=["-cam",job["camera"]]
+    if job.get("layer"):  cmd+=["-rl",job["layer"]]
+    return cmd+[job["scene"]]
+
+def plan_render(job:Dict[str,Any]):
+    """Frame detector for the job's output and a scan() over it (plus frames the server already
+    recorded, e.g. rendered before a worker died); returns (det, scan, step-aligned frames done now)."""
+    start=int(job["start_frame"]); end=int(job["end_frame"]); step=max(1,int(job.get("by_step") or 1))
+    known_done = {fr for fr in expand_ranges(job.get("frames_done"), step) if start<=fr<=end}
+    det = FrameDetector(job["output_dir"], start, end, cache=SCAN_CACHE_DIR/f"job_{job['id']}.json")
+    def scan(full:bool=False)->Set[int]: det.poll(full); return det.done() | known_done
+    return det, scan, {fr for fr in scan() if (fr - start) % step == 0}
+
 def run_render(job:Dict[str,Any]):
-    jid=job["id"]; scene=job["scene"]; project=job["project"]; output=job["output_dir"]
-    camera=job.get("camera") or ""; layer=job.get("layer") or ""
+    jid=job["id"]
     start=int(job["start_frame"]); end=int(job["end_frame"]); step=max(1,int(job.get("by_step") or 1))
-    width=int(job.get("width") or 1920); height=int(job.get("height") or 1080)
-    renderer=(job.get("renderer") or "arnold").lower()
     frame_total=((end-start)//step)+1
+    lease=job.get("lease_id")   # set when the job is a frame pool: start/end are the leased frames
 
     # --- Resume logic: detect already-rendered frames and start from the first missing one ---
-    existing_done = list_done_frames(output, start, end)
-    aligned_done: Set[int] = {fr for fr in existing_done if (fr - start) % step == 0}
+    det, scan, aligned_done = plan_render(job)
 
     # If everything is already rendered, finish without launching Render.exe
     if len(aligned_done) >= frame_total:
+        det.close()
+        if not lease: det.discard()
         try:
-            post_json("/job_update", {
+            post_json("/job_update", {"lease_id":lease,
                 "worker_id": WORKER_ID, "api_key": API_KEY, "job_id": jid,
                 "status": "done", "frame_total": frame_total,
                 "frame_done": len(aligned_done), "frame_failed": 0,
@@ -110,8 +372,10 @@ def run_render(job:Dict[str,Any]):
 
     resume_start = first_missing(start, end, step, aligned_done)
     if resume_start is None:  # safety (same as all-done)
+        det.close()
+        if not lease: det.discard()
         try:
-            post_json("/job_update", {
+            post_json("/job_update", {"lease_id":lease,
                 "worker_id": WORKER_ID, "api_key": API_KEY, "job_id": jid,
                 "status": "done", "frame_total": frame_total,
                 "frame_done": len(aligned_done), "frame_failed": 0,
@@ -123,39 +387,37 @@ def run_render(job:Dict[str,Any]):
 
     print(f"[worker] resume start → frame {resume_start} (was {start})")
 
-    log_path=LOG_DIR/f"job_{jid}.log"; tail:List[str]=[]
+    log_path=LOG_DIR/f"job_{jid}.log"; tail:List[str]=[]   # pool leases append to the pool's log
 
     def push_tail(line:str):
         if not line: return
         tail.append(line.rstrip("\n"))
         if len(tail)>200: del tail[:len(tail)-200]
 
-    # Respect Maya file naming: do NOT pass -im/-of (let Maya/Layers handle file names)
-    cmd=[RENDER_EXE,"-r",renderer,"-s",str(resume_start),"-e",str(end),"-b",str(step),
-         "-proj",project,"-rd",output,"-x",str(width),"-y",str(height)]
-    if camera: cmd+=["-cam",camera]
-    if layer:  cmd+=["-rl",layer]
-    cmd+=[scene]
+    cmd=render_cmd(job, resume_start)
 
     print("[worker] launching:", " ".join(cmd))
+    det.watch()
 
-    log_f=open(log_path,"w",encoding="utf-8",errors="replace")
+    log_f=open(log_path,"a" if lease else "w",encoding="utf-8",errors="replace"); stream=LogStream(jid, lease)
+    if lease: log_f.write(f"=== lease {lease}: frames {start}-{end} ===\n"); stream.write(f"=== lease {lease}: frames {start}-{end} ===\n")
     proc=subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
                           text=True, encoding="utf-8", errors="replace")
 
+    parser=parser_for(job.get("renderer")); sent_current=None
     def reader():
         for line in proc.stdout:
-            log_f.write(line); push_tail(line)
+            log_f.write(line); stream.write(line); push_tail(line); parser.feed(line)
         try: proc.stdout.close()
         except: pass
     t=threading.Thread(target=reader,daemon=True); t.start()
 
     # initial update
     try:
-        post_json("/job_update", {"worker_id":WORKER_ID,"api_key":API_KEY,"job_id":jid,
+        post_json("/job_update", {"lease_id":lease,"worker_id":WORKER_ID,"api_key":API_KEY,"job_id":jid,
                                   "status":"running","frame_total":frame_total,
                                   "frame_done":len(aligned_done),
-                                  "frame_failed":0,"frame_running":1,"log_tail":"\n".join(tail)})
+                                  "frame_failed":0,"frame_running":1})
     except Exception as e:
         print("[worker] first update failed:", e)
 
@@ -170,24 +432,30 @@ def run_render(job:Dict[str,Any]):
         code = proc.poll()
 
         # scan disk again and align to step
-        cur_done = list_done_frames(output, start, end)
+        cur_done = scan()
         cur_aligned: Set[int] = {fr for fr in cur_done if (fr - start) % step == 0}
         delta = sorted(list(cur_aligned - prev_done))
         prev_done = cur_aligned
         current_done_count = len(cur_aligned)
 
-        if delta:
+        stats=parser.take_stats()
+        if delta or stats or parser.current!=sent_current:
             try:
-                post_json("/frame_update", {"worker_id":WORKER_ID,"api_key":API_KEY,"job_id":jid,"frames_done":delta})
+                post_json("/frame_update", {"worker_id":WORKER_ID,"api_key":API_KEY,"job_id":jid,"frames_done":to_ranges(delta,step),
+                                            "current_frame":parser.current,"stats":stats})
+                sent_current=parser.current
             except Exception as e:
                 print("[worker] frame_update error:", e)
 
+        send_log(stream)   # new output only; the server appends it to the job's log
+
         # periodic job_update → read cancel code
         try:
-            resp = post_json("/job_update", {"worker_id":WORKER_ID,"api_key":API_KEY,"job_id":jid,"status":"running",
+            resp = post_json("/job_update", {"lease_id":lease,"worker_id":WORKER_ID,"api_key":API_KEY,"job_id":jid,"status":"running",
                                              "frame_total":frame_total,"frame_done":current_done_count,"frame_failed":0,
-                                             "frame_running":1,"log_tail":"\n".join(tail)})
-            # parse cancel: 0 none, 1 immediate (Pause), 2 graceful (NIMBY)
+                                             "frame_running":1,
+                                             "eta_seconds":parser.eta(frame_total-current_done_count)})
+            # parse cancel: 0 none, 1 immediate (Pause), 2 graceful (NIMBY), 3 handed over to a speculative copy
             cv = resp.get("cancel", 0)
             try:
                 cancel_code = int(cv) if not isinstance(cv, bool) else (1 if cv else 0)
@@ -205,8 +473,8 @@ def run_render(job:Dict[str,Any]):
 
         # Decide termination
         should_terminate = False
-        if cancel_code == 1:
-            # Pause (immediate): stop now
+        if cancel_code in (1, 3):
+            # Pause (immediate), or the rest of the range is rendered elsewhere: stop now
             print("[worker] Pause (immediate) requested → terminating renderer")
             should_terminate = True
         elif cancel_code == 2:
@@ -235,21 +503,24 @@ def run_render(job:Dict[str,Any]):
     try: t.join(timeout=2)
     except: pass
 
-    final_done = list_done_frames(output, start, end)
+    final_done = scan(full=True); det.close()
     final_aligned: Set[int] = {fr for fr in final_done if (fr - start) % step == 0}
     status = "done" if (proc.returncode == 0 and len(final_aligned) >= frame_total) else "failed"
+    if status == "done" and not lease: det.discard()   # pool leases share the cache with later leases
 
     # flush any last-delta frames
     try:
-        last_delta = sorted(list(final_aligned - prev_done))
-        if last_delta:
-            post_json("/frame_update", {"worker_id":WORKER_ID,"api_key":API_KEY,"job_id":jid,"frames_done":last_delta})
+        last_delta = sorted(list(final_aligned - prev_done)); stats=parser.take_stats(True)
+        if last_delta or stats:
+            post_json("/frame_update", {"worker_id":WORKER_ID,"api_key":API_KEY,"job_id":jid,"frames_done":to_ranges(last_delta,step),
+                                        "stats":stats})
     except Exception:
         pass
 
+    send_log(stream)
     # final job_update (server will preserve paused/cancelled if cancel was requested)
     try:
-        post_json("/job_update", {"worker_id":WORKER_ID,"api_key":API_KEY,"job_id":jid,"status":status,"frame_total":frame_total,
+        post_json("/job_update", {"lease_id":lease,"worker_id":WORKER_ID,"api_key":API_KEY,"job_id":jid,"status":status,"frame_total":frame_total,
                                   "frame_done":len(final_aligned),
                                   "frame_failed":0 if status=='done' else max(0, frame_total - len(final_aligned)),
                                   "frame_running":0,"log_tail":"\n".join(tail)})
@@ -259,17 +530,219 @@ def run_render(job:Dict[str,Any]):
     try: log_f.close()
     except: pass
 
-def main():
-    print("=== Elara Worker ==="); print("SERVER:", SERVER); print("RENDER_EXE:", RENDER_EXE)
-    register()
+# ---------------- async engine ----------------
+class JobCancel:
+    """Latest cancel code for one running job (0 none, 1 immediate, 2 after frame, 3 handed over to a
+    speculative copy: stop now); `event` is set on a change."""
+    def __init__(self): self.code=0; self.event=asyncio.Event()
+    def set(self, code:int):
+        if code!=self.code:
+            self.code=code
+            if code: self.event.set()
+
+def job_key(jid:int, lease=None)->str: return f"{jid}:{lease}" if lease else str(jid)
+
+class Uplink:
+    """The worker's single status channel. Frame and job updates from every slot are merged per
+    job (frames unioned, job fields last-wins) and sent as one /worker_update every
+    UPLINK_INTERVAL, or at once for a final status. The same request is the heartbeat, and the
+    cancel codes in its reply reach the watching renders immediately. A failed send is merged
+    back and retried with the next batch."""
+    def __init__(self):
+        self.frames:Dict[int,Set[int]]={}; self.steps:Dict[int,int]={}; self.current:Dict[int,Optional[int]]={}
+        self.stats:Dict[int,List[Dict[str,Any]]]={}; self.logs:List[LogStream]=[]; self.jobs:Dict[str,Dict[str,Any]]={}
+        self.watchers:Dict[str,JobCancel]={}; self.wake=asyncio.Event(); self.lock=asyncio.Lock(); self.last=0.0
+    def frames_done(self, jid:int, frames, step:int=1, current=None, stats=None):
+        if frames or current is not None or stats:
+            self.frames.setdefault(jid,set()).update(frames); self.steps[jid]=step
+        if current is not None: self.current[jid]=current
+        if stats: self.stats.setdefault(jid,[]).extend(stats)
+    def job(self, jid:int, lease=None, **fields):
+        u=self.jobs.setdefault(job_key(jid,lease), {"job_id":jid,"lease_id":lease})
+        if "error_inc" in fields: fields["error_inc"]+=u.get("error_inc",0)   # increments add up, the rest is last-wins
+        u.update(fields)
+        if fields.get("status") not in (None,"running"): self.wake.set()
+    def log(self, stream:LogStream): self.logs.append(stream)
+    def watch(self, jid:int, lease=None)->JobCancel:
+        return self.watchers.setdefault(job_key(jid,lease), JobCancel())
+    def unwatch(self, jid:int, lease=None): self.watchers.pop(job_key(jid,lease), None)
+    async def flush(self):
+        """Send whatever is pending now; returns when that batch is out (or failed)."""
+        async with self.lock:
+            frames, self.frames = self.frames, {}; jobs, self.jobs = self.jobs, {}; current, self.current = self.current, {}
+            stats, self.stats = self.stats, {}
+            chunks=[(ls,ch) for ls in self.logs for ch in [ls.take()] if ch]
+            self.logs=[ls for ls in self.logs if not ls.closed]   # a finished render's stream goes with its last chunk
+            payload={"worker_id":WORKER_ID,"api_key":API_KEY,"job_ids":sorted(set(ACTIVE_JOBS.values())),
+                     "frames":[{"job_id":j,"frames_done":to_ranges(f,self.steps.get(j,1)),"current_frame":current.get(j),
+                                "stats":stats.get(j,[])} for j,f in frames.items()],
+                     "jobs":list(jobs.values()),"logs":[ch for _,ch in chunks]}
+            try: resp=await asyncio.to_thread(post_json, "/worker_update", payload)
+            except Exception as e:
+                print("[worker] uplink error:", e)
+                for j,f in frames.items(): self.frames.setdefault(j,set()).update(f)
+                for k,u in jobs.items():
+                    newer=self.jobs.get(k,{}); merged={**u, **newer}
+                    if "error_inc" in u or "error_inc" in newer: merged["error_inc"]=u.get("error_inc",0)+newer.get("error_inc",0)
+                    self.jobs[k]=merged
+                for j,c in current.items(): self.current.setdefault(j,c)
+                for j,st in stats.items(): self.stats[j]=st+self.stats.get(j,[])
+                for ls,ch in chunks:
+                    ls.give_back(ch)
+                    if ls not in self.logs: self.logs.append(ls)
+                return
+            self.last=time.time(); cancel=resp.get("cancel") or {}
+            for k,w in list(self.watchers.items()):
+                code=cancel.get(k, cancel.get(k.split(":")[0]))
+                if code is not None: w.set(int(code or 0))
+    async def run(self):
+        while True:
+            try: await asyncio.wait_for(self.wake.wait(), UPLINK_INTERVAL)
+            except asyncio.TimeoutError: pass
+            self.wake.clear()
+            if self.frames or self.jobs or self.watchers or self.logs or time.time()-self.last>=HEARTBEAT: await self.flush()
+
+async def read_lines(stream:asyncio.StreamReader, feed):
+    """Call feed(bytes) per output line. Chunked reads, not readline(): a line past the stream
+    limit would raise there and fail the render; here it goes through in LINE_MAX pieces."""
+    buf=b""
     while True:
+        chunk=await stream.read(1<<16)
+        if not chunk: break
+        buf+=chunk; *lines,buf=buf.split(b"\n")
+        for raw in lines: feed(raw+b"\n")
+        while len(buf)>=LINE_MAX: feed(buf[:LINE_MAX]); buf=buf[LINE_MAX:]
+    if buf: feed(buf)
+
+async def render_job(job:Dict[str,Any], up:Uplink):
+    """run_render on asyncio: the renderer's output streams through a subprocess pipe, status goes
+    through the uplink, and a cancel code acts as soon as the uplink delivers it."""
+    jid=job["id"]; lease=job.get("lease_id")
+    start=int(job["start_frame"]); end=int(job["end_frame"]); step=max(1,int(job.get("by_step") or 1))
+    frame_total=((end-start)//step)+1
+    det, scan, aligned_done = await asyncio.to_thread(plan_render, job)
+    def aligned(full:bool=False)->Set[int]: return {fr for fr in scan(full) if (fr - start) % step == 0}
+
+    resume_start = first_missing(start, end, step, aligned_done)
+    if resume_start is None:   # everything already rendered: finish without launching Render.exe
+        det.close()
+        if not lease: det.discard()
+        up.job(jid, lease, status="done", frame_total=frame_total, frame_done=len(aligned_done), frame_failed=0,
+               frame_running=0, log_tail="resume: all frames already present on disk")
+        await up.flush(); return
+    print(f"[worker] resume start → frame {resume_start} (was {start})")
+
+    cmd=render_cmd(job, resume_start); print("[worker] launching:", " ".join(cmd))
+    det.watch(); cancel=up.watch(jid, lease); tail:deque=deque(maxlen=200)
+    parser=parser_for(job.get("renderer")); logged=asyncio.Event()
+    log_f=open(LOG_DIR/f"job_{jid}.log","a" if lease else "w",encoding="utf-8",errors="replace")
+    stream=LogStream(jid, lease); up.log(stream)
+    if lease: log_f.write(f"=== lease {lease}: frames {start}-{end} ===\n"); stream.write(f"=== lease {lease}: frames {start}-{end} ===\n")
+    proc=await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+
+    def feed(raw:bytes):
+        line=raw.decode("utf-8","replace"); log_f.write(line); stream.write(line)
+        if line.strip(): tail.append(line.rstrip("\r\n"))
+        if parser.feed(line): logged.set()
+    reader=asyncio.create_task(read_lines(proc.stdout, feed)); exited=asyncio.create_task(proc.wait())
+    up.job(jid, lease, status="running", frame_total=frame_total, frame_done=len(aligned_done), frame_failed=0,
+           frame_running=1)
+
+    prev_done=set(aligned_done); graceful_mark=None; finished_mark=0; scanned=(0.0,0); errors=0
+    try:
+        while True:
+            woke=[asyncio.create_task(cancel.event.wait()), asyncio.create_task(logged.wait())]
+            await asyncio.wait({exited, *woke}, timeout=SCAN_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+            for w in woke: w.cancel()
+            cancel.event.clear(); logged.clear()
+            # while the log reports finished frames, only scan when it does (plus a slow safety scan)
+            if not parser.matched or len(parser.finished)!=scanned[1] or time.time()-scanned[0]>=FALLBACK_SCAN or exited.done():
+                cur=await asyncio.to_thread(aligned)
+                # the image can land just after the log line: keep scanning until the disk has caught up
+                scanned=(time.time(), len(parser.finished) if len(cur)-len(aligned_done)>=len(parser.finished) else scanned[1])
+            else: cur=prev_done
+            up.frames_done(jid, sorted(cur-prev_done), step, current=parser.current, stats=parser.take_stats()); prev_done=cur
+            up.job(jid, lease, status="running", frame_total=frame_total, frame_done=len(cur), frame_failed=0,
+                   frame_running=1, eta_seconds=parser.eta(frame_total-len(cur)),
+                   error_inc=parser.errors-errors)
+            errors=parser.errors
+            # Pause (1) stops now; NIMBY (2) stops once one more frame has finished (on disk or per the log)
+            if cancel.code==2 and graceful_mark is None:
+                graceful_mark=len(cur); finished_mark=len(parser.finished); print(f"[worker] NIMBY armed at done={graceful_mark}")
+            if cancel.code in (1,3) or (cancel.code==2 and (len(cur)>graceful_mark or len(parser.finished)>finished_mark)):
+                print(f"[worker] cancel code {cancel.code} → terminating renderer")
+                try:
+                    proc.terminate()
+                    try: await asyncio.wait_for(asyncio.shield(exited), 5)   # graceful exit window
+                    except asyncio.TimeoutError: print("[worker] renderer did not exit in time → kill()"); proc.kill()
+                except ProcessLookupError: pass
+                break
+            if exited.done(): break
+        await exited
+        try: await asyncio.wait_for(reader, 2)
+        except asyncio.TimeoutError: reader.cancel()
+    finally:
+        up.unwatch(jid, lease); stream.closed=True
+
+    final_aligned=await asyncio.to_thread(aligned, True); det.close()
+    status = "done" if (proc.returncode == 0 and len(final_aligned) >= frame_total) else "failed"
+    if status == "done" and not lease: det.discard()   # pool leases share the cache with later leases
+    up.frames_done(jid, sorted(final_aligned-prev_done), step, stats=parser.take_stats(True))
+    # final update (server will preserve paused/cancelled if cancel was requested)
+    up.job(jid, lease, status=status, frame_total=frame_total, frame_done=len(final_aligned),
+           frame_failed=0 if status=="done" else max(0, frame_total-len(final_aligned)), frame_running=0, log_tail="\n".join(tail))
+    await up.flush()
+    try: log_f.close()
+    except: pass
+
+async def slot_task(slot:int, up:Uplink):
+    """slot_loop for the async engine; /next_job long-polls on a pool thread."""
+    while True:
+        t0=time.time()
+        try: job=await asyncio.to_thread(get_next_job)
+        except Exception as e:
+            print(f"[worker] slot {slot} next_job error:", e); await asyncio.sleep(2.0); continue
+        if not job:
+            if time.time()-t0 < 1.0: await asyncio.sleep(2.0)
+            continue
+        print(f"[worker] slot {slot} got job id={job['id']} {job['start_frame']}-{job['end_frame']}"+(f" lease={job['lease_id']}" if job.get("lease_id") else ""))
+        ACTIVE_JOBS[slot]=job["id"]
+        try: await render_job(job, up)
+        except Exception as e:
+            print("[worker] render_job error:", e)
+            total=((int(job["end_frame"])-int(job["start_frame"]))//max(1,int(job.get('by_step') or 1)))+1
+            up.job(job["id"], job.get("lease_id"), status="failed", frame_total=total, frame_done=0, frame_failed=total,
+                   frame_running=0, log_tail=f"worker exception: {e}")
+            await up.flush()
+        finally:
+            ACTIVE_JOBS.pop(slot, None)
+
+async def run_async():
+    up=Uplink()
+    await asyncio.gather(up.run(), *(slot_task(i, up) for i in range(SLOTS)))
+
+def prune_scan_caches():
+    cutoff=time.time()-SCAN_CACHE_DAYS*86400
+    for f in SCAN_CACHE_DIR.glob("job_*.json"):
+        try:
+            if f.stat().st_mtime<cutoff: f.unlink()
+        except OSError: pass
+
+def slot_loop(slot:int):
+    """One render slot: claim a job, render it, repeat. Slots share the HTTP session and the
+    heartbeat; cancel/NIMBY is handled per job inside run_render."""
+    while True:
+        t0=time.time()
         try:
             job = get_next_job()
         except Exception as e:
-            print("[worker] next_job error:", e); time.sleep(2.0); continue
+            print(f"[worker] slot {slot} next_job error:", e); time.sleep(2.0); continue
         if not job:
-            time.sleep(2.0); continue
-        print(f"[worker] got job id={job['id']} {job['start_frame']}-{job['end_frame']}")
+            # long-poll already waited server-side; only back off if the server answered at once
+            if time.time()-t0 < 1.0: time.sleep(2.0)
+            continue
+        print(f"[worker] slot {slot} got job id={job['id']} {job['start_frame']}-{job['end_frame']}"+(f" lease={job['lease_id']}" if job.get("lease_id") else ""))
+        ACTIVE_JOBS[slot]=job["id"]
         try:
             run_render(job)
         except Exception as e:
@@ -277,11 +750,25 @@ def main():
             try:
                 total=((int(job["end_frame"])-int(job["start_frame"]))//max(1,int(job.get('by_step') or 1)))+1
                 post_json("/job_update", {"worker_id":WORKER_ID,"api_key":API_KEY,"job_id":job["id"],"status":"failed",
+                                          "lease_id": job.get("lease_id"),
                                           "frame_total": total,
                                           "frame_done": 0, "frame_failed": total, "frame_running": 0,
                                           "log_tail": f"worker exception: {e}"})
             except Exception:
                 pass
+        finally:
+            ACTIVE_JOBS.pop(slot, None)
+
+def main():
+    print("=== Elara Worker ==="); print("SERVER:", SERVER); print("RENDER_EXE:", RENDER_EXE)
+    prune_scan_caches()
+    register()
+    if ENGINE=="async":
+        asyncio.run(run_async()); return
+    threading.Thread(target=heartbeat_loop, daemon=True).start()
+    for slot in range(1, SLOTS):
+        threading.Thread(target=slot_loop, args=(slot,), name=f"slot-{slot}", daemon=True).start()
+    slot_loop(0)
 
 if __name__=="__main__":
     main()